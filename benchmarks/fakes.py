@@ -0,0 +1,360 @@
+"""Local stand-ins for Shikimori and Discord APIs, so nothing is benchmarked against real services.
+
+    async with FakeBackends(Latency(base=0.05)) as fakes:
+        ...  # fakes.shikimori_url, fakes.discord_url
+
+Only endpoints used by the bot are emulated, with synthetic but consistently shaped data. Every response waits for
+a sampled latency; over rate limit the fake answers 429 with `Retry-After`, like the real one.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import secrets
+
+from abc import ABC, abstractmethod
+
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Any, NamedTuple
+
+from aiohttp import web
+from dlr_light_api.datatypes import DiscordToken
+from shikimori_extended_api.datatypes import ShikiToken
+
+from clients.http import JsonApi
+from clients.shiki import TokenBucket
+
+STATUSES = ('released', 'released', 'released', 'ongoing', 'anons')
+RATE_STATUSES = ('completed', 'completed', 'watching', 'planned', 'dropped')
+
+
+class Latency(NamedTuple):
+    base: float = 0.05
+    jitter: float = 0.02
+    slow_share: float = 0.0  # part of responses which take `slow` seconds instead
+    slow: float = 1.0
+
+    def sample(self, rnd: random.Random) -> float:
+        if self.slow_share and rnd.random() < self.slow_share:
+            return self.slow
+        return max(self.base + rnd.uniform(-self.jitter, self.jitter), 0)
+
+
+class FakeBackend(ABC):
+    unlimited: tuple[str, ...] = ()  # path prefixes not subject to rate limits
+
+    def __init__(self, latency: Latency, buckets: tuple[TokenBucket, ...] = (), seed: int = 0):
+        self.latency = latency
+        self.buckets = buckets
+        self.rnd = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests += 1
+        now = monotonic()
+        buckets = () if request.path.startswith(self.unlimited) else self.buckets
+        if delay := max((bucket.delay(now) for bucket in buckets), default=0):
+            self.rate_limited += 1
+            return web.json_response({'message': 'Retry later'}, status=429, headers={'Retry-After': f'{delay:.3f}'})
+        for bucket in buckets:
+            bucket.consume(now)
+
+        await asyncio.sleep(self.latency.sample(self.rnd))
+        return await handler(request)
+
+    @abstractmethod
+    def app(self) -> web.Application:
+        """Routes of the backend, behind `middleware`."""
+
+    @staticmethod
+    def token() -> dict[str, Any]:
+        return {
+            'access_token': secrets.token_urlsafe(32)[:43],
+            'refresh_token': secrets.token_urlsafe(32)[:43],
+            'expires_in': 86400,
+            'token_type': 'Bearer',
+            'created_at': int(datetime.now().timestamp()),
+        }
+
+
+class FakeShikimori(FakeBackend):
+    """/api/users, /api/animes, /api/users/:id/anime_rates and /oauth/token of shikimori.me"""
+
+    def __init__(self, latency: Latency, rps: int = 5, rpm: int = 90, titles: int = 5000, users: int = 1000, seed=0):
+        super().__init__(latency, (TokenBucket(rps, 1), TokenBucket(rpm, 60)) if rps else (), seed)
+        rnd = random.Random(seed)
+        self.catalog = {i: self._anime(rnd, i) for i in range(1, titles + 1)}
+        self.users = {i: {'id': i, 'nickname': f'user{i}'} for i in range(1, users + 1)}
+        self.rates = {
+            user_id: [self._rate(rnd, user_id * 10_000 + n, anime_id)
+                      for n, anime_id in enumerate(rnd.sample(sorted(self.catalog), min(titles, 200)))]
+            for user_id in self.users
+        }
+
+    @staticmethod
+    def _anime(rnd: random.Random, anime_id: int) -> dict[str, Any]:
+        name = f"Anime {anime_id} {rnd.choice(('Naruto', 'Bleach', 'Monogatari', 'Gintama', 'Mushishi'))}"
+        episodes = rnd.randint(1, 50)
+        return {
+            'id': anime_id,
+            'name': name,
+            'russian': f"Аниме {anime_id}",
+            'japanese': [f"アニメ {anime_id}"],
+            'url': f'/animes/{anime_id}',
+            'image': {'original': f'/system/animes/original/{anime_id}.jpg'},
+            'score': f'{rnd.uniform(5, 9):.2f}',
+            'status': rnd.choice(STATUSES),
+            'episodes': episodes,
+            'episodes_aired': episodes,
+            'duration': rnd.choice((5, 12, 24, 24, 24, 100)),
+            'rating': 'pg_13',
+            'genres': [{'russian': 'Экшен'}],
+            'description': 'Описание ' * 20,
+        }
+
+    def _rate(self, rnd: random.Random, rate_id: int, anime_id: int) -> dict[str, Any]:
+        anime = self.catalog[anime_id]
+        return {
+            'id': rate_id,
+            'status': rnd.choice(RATE_STATUSES),
+            'score': rnd.randint(0, 10),
+            'episodes': rnd.randint(0, anime['episodes']),
+            'rewatches': 0,
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+            'anime': {key: anime[key] for key in ('id', 'name', 'russian', 'url', 'episodes')},
+        }
+
+    def _user(self, user_id: int) -> dict[str, Any]:
+        rates = self.rates[user_id]
+        completed = sum(1 for rate in rates if rate['status'] == 'completed')
+        return {
+            **self.users[user_id],
+            'url': f'https://shikimori.me/user{user_id}',
+            'image': {'x160': f'https://shikimori.me/system/users/x160/{user_id}.png'},
+            'sex': 'male',
+            'last_online_at': datetime.now(timezone.utc).isoformat(),
+            'stats': {'statuses': {'anime': [{'name': 'completed', 'size': completed}]}},
+        }
+
+    async def user(self, request: web.Request) -> web.Response:
+        user_id = int(request.match_info['id'])
+        if user_id not in self.users:
+            raise web.HTTPNotFound()
+        return web.json_response(self._user(user_id))
+
+    async def users_search(self, request: web.Request) -> web.Response:
+        query, limit = request.query.get('search', ''), int(request.query.get('limit', 20))
+        users = [self._user(user_id) for user_id, u in self.users.items() if query in u['nickname']][:limit]
+        return web.json_response(users)
+
+    async def whoami(self, request: web.Request) -> web.Response:
+        return web.json_response(self._user(self.rnd.choice(list(self.users))))
+
+    async def anime(self, request: web.Request) -> web.Response:
+        anime_id = int(request.match_info['id'])
+        if anime_id not in self.catalog:
+            raise web.HTTPNotFound()
+        return web.json_response(self.catalog[anime_id])
+
+    async def animes(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get('limit', 50))
+        if query := request.query.get('search', '').lower():
+            found = [a for a in self.catalog.values() if query in a['name'].lower() or query in a['russian'].lower()]
+            return web.json_response(found[:limit])
+        page = int(request.query.get('page', 1))
+        return web.json_response(list(self.catalog.values())[(page - 1) * limit:page * limit])
+
+    async def anime_rates(self, request: web.Request) -> web.Response:
+        rates = self.rates.get(int(request.match_info['id']), [])
+        if status := request.query.get('status'):
+            rates = [rate for rate in rates if rate['status'] == status]
+        page, limit = int(request.query.get('page', 1)), int(request.query.get('limit', 50))
+        return web.json_response(rates[(page - 1) * limit:page * limit])
+
+    async def oauth_token(self, request: web.Request) -> web.Response:
+        return web.json_response(self.token())
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get('/api/users/whoami', self.whoami)
+        app.router.add_get('/api/users/{id}', self.user)
+        app.router.add_get('/api/users/{id}/info', self.user)
+        app.router.add_get('/api/users', self.users_search)
+        app.router.add_get('/api/users/{id}/anime_rates', self.anime_rates)
+        app.router.add_get('/api/animes/{id}', self.anime)
+        app.router.add_get('/api/animes', self.animes)
+        app.router.add_post('/oauth/token', self.oauth_token)
+        return app
+
+
+class FakeDiscord(FakeBackend):
+    """OAuth2 token, current user and linked role connection endpoints of Discord API (v10), and the ones a bot
+    logs in and answers interactions with.
+    """
+
+    unlimited = ('/api/v10/interactions/', '/api/v10/webhooks/')  # interaction responses have no global limit
+    APPLICATION_ID = 10 ** 17 - 1
+
+    def __init__(self, latency: Latency, rps: int = 50, seed: int = 0):
+        super().__init__(latency, (TokenBucket(rps, 1), ) if rps else (), seed)
+        self.role_connections: dict[str, dict] = {}  # access token -> role connection
+        self.next_user_id = 10 ** 17
+        self.next_message_id = 10 ** 17
+        self.interaction_responses = 0
+
+    async def oauth_token(self, request: web.Request) -> web.Response:
+        return web.json_response(self.token())
+
+    async def me(self, request: web.Request) -> web.Response:
+        self.next_user_id += 1
+        return web.json_response({'user': {'id': str(self.next_user_id), 'username': f'member{self.next_user_id}'}})
+
+    async def get_role_connection(self, request: web.Request) -> web.Response:
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        return web.json_response(self.role_connections.get(token, {'metadata': {}}))
+
+    async def put_role_connection(self, request: web.Request) -> web.Response:
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        self.role_connections[token] = await request.json()
+        return web.json_response(self.role_connections[token])
+
+    @classmethod
+    def bot_user(cls) -> dict[str, Any]:
+        return {
+            'id': str(cls.APPLICATION_ID), 'username': 'benchmark', 'discriminator': '0000', 'avatar': None,
+            'bot': True, 'flags': 0, 'public_flags': 0, 'mfa_enabled': False, 'verified': True, 'locale': 'en-US',
+        }
+
+    async def bot_me(self, request: web.Request) -> web.Response:
+        return web.json_response(self.bot_user())
+
+    async def application(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'id': str(self.APPLICATION_ID), 'name': 'benchmark', 'icon': None, 'description': '',
+            'bot_public': False, 'bot_require_code_grant': False, 'owner': self.bot_user(),
+            'verify_key': '0' * 64, 'flags': 0,
+        })
+
+    async def interaction_callback(self, request: web.Request) -> web.Response:
+        await request.read()
+        self.interaction_responses += 1
+        return web.Response(status=204)
+
+    async def edit_original(self, request: web.Request) -> web.Response:
+        self.next_message_id += 1
+        return web.json_response({
+            'id': str(self.next_message_id), 'channel_id': '1', 'type': 20, 'author': self.bot_user(),
+            'content': '', 'embeds': [], 'attachments': [], 'mentions': [], 'mention_roles': [], 'components': [],
+            'mention_everyone': False, 'pinned': False, 'tts': False, 'flags': 0, 'edited_timestamp': None,
+            'timestamp': datetime.now(timezone.utc).isoformat(), **await request.json(),
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get('/api/v10/users/@me', self.bot_me)
+        app.router.add_get('/api/v10/oauth2/applications/@me', self.application)
+        app.router.add_post('/api/v10/interactions/{id}/{token}/callback', self.interaction_callback)
+        app.router.add_patch('/api/v10/webhooks/{app}/{token}/messages/@original', self.edit_original)
+        app.router.add_post('/api/v10/oauth2/token', self.oauth_token)
+        app.router.add_get('/api/v10/oauth2/@me', self.me)
+        app.router.add_get('/api/v10/users/@me/applications/{app}/role-connection', self.get_role_connection)
+        app.router.add_put('/api/v10/users/@me/applications/{app}/role-connection', self.put_role_connection)
+        return app
+
+
+class FakeBackends:
+    """Both fakes served on free local ports while inside `async with`."""
+
+    def __init__(self, shikimori_latency: Latency = Latency(), discord_latency: Latency = Latency(0.03), **shikimori):
+        self.shikimori = FakeShikimori(shikimori_latency, **shikimori)
+        self.discord = FakeDiscord(discord_latency)
+        self._runners: list[web.AppRunner] = []
+        self.shikimori_url = self.discord_url = ''
+
+    async def _serve(self, app: web.Application) -> str:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        self._runners.append(runner)
+        host, port = runner.addresses[0][:2]
+        return f'http://{host}:{port}'
+
+    async def __aenter__(self) -> FakeBackends:
+        self.shikimori_url = await self._serve(self.shikimori.app())
+        self.discord_url = await self._serve(self.discord.app())
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+
+
+def _expires_in(token: dict) -> tuple[timedelta, datetime]:
+    return timedelta(seconds=token['expires_in']), datetime.now() + timedelta(seconds=token['expires_in'])
+
+
+class FakeDLRClient:
+    """Speaks to `FakeDiscord` with the methods of `dlr_light_api.Client` used by the bot."""
+
+    def __init__(self, api: JsonApi, client_id: str = 'benchmark'):
+        self.api = api
+        self.client_id = client_id
+
+    @property
+    def oauth_url(self) -> tuple[str, str]:
+        state = secrets.token_urlsafe(16)
+        return f'{self.api.base_url}/oauth2/authorize?state={state}', state
+
+    async def _token(self, **form: str) -> DiscordToken:
+        token = await self.api.request('POST', 'oauth2/token', data=form)
+        expires_in, expires_at = _expires_in(token)
+        return DiscordToken(
+            access_token=token['access_token'], refresh_token=token['refresh_token'],
+            expires_in=expires_in, expires_at=expires_at
+        )
+
+    async def get_oauth_token(self, code: str):
+        return await self._token(grant_type='authorization_code', code=code)
+
+    async def refresh_token(self, token):
+        return await self._token(grant_type='refresh_token', refresh_token=token.refresh_token)
+
+    async def get_user_data(self, token) -> dict:
+        return await self.api.get('oauth2/@me', headers={'Authorization': f'Bearer {token.access_token}'})
+
+    async def push_metadata(self, token, metadata) -> dict:
+        return await self.api.request(
+            'PUT', f'users/@me/applications/{self.client_id}/role-connection',
+            headers={'Authorization': f'Bearer {token.access_token}'},
+            json=metadata.to_dict(),  # same payload as the real client sends
+        )
+
+
+class FakeShikiOAuthClient:
+    """Speaks to `FakeShikimori` with the OAuth methods of `shikimori_extended_api.Client` used by the bot."""
+
+    def __init__(self, api: JsonApi, oauth_url: str):
+        self.api = api
+        self.auth_url = f'{oauth_url}/oauth/authorize'
+        self._oauth = JsonApi(api.pool, oauth_url)
+
+    async def _token(self, **form: str) -> ShikiToken:
+        token = await self._oauth.request('POST', 'oauth/token', data=form)
+        expires_in, expires_at = _expires_in(token)
+        return ShikiToken(
+            access_token=token['access_token'], refresh_token=token['refresh_token'],
+            expires_in=expires_in, expires_at=expires_at
+        )
+
+    async def get_access_token(self, code: str):
+        return await self._token(grant_type='authorization_code', code=code)
+
+    async def refresh_token(self, token):
+        return await self._token(grant_type='refresh_token', refresh_token=token.refresh_token)
+
+    async def get_current_user_info(self, token) -> dict:
+        return await self.api.get('users/whoami', headers={'Authorization': f'Bearer {token.access_token}'})
@@ -0,0 +1,230 @@
+"""`ShikiCog` commands, autocompletes and `dlr_server` OAuth callbacks driven by synthetic interactions and requests,
+against local fakes of Shikimori and Discord (see `benchmarks.fakes`) and in-memory SQLite.
+
+    python -m benchmarks.harness [operations] [concurrency] [shikimori latency, ms] [shikimori rps]
+
+Reports throughput and p50/p95/p99 latency per scenario. Exit code is 1 if p99 of any scenario is over its budget
+in `BUDGETS`, so the harness can gate a deploy. `shikimori rps` 0 (default) lifts rate limits on both sides;
+with real limits (5) most of the time is waiting for the limiter.
+"""
+import asyncio
+import os
+import random
+import sys
+
+from datetime import datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable
+
+from discord.utils import utcnow
+from tortoise import Tortoise
+
+from benchmarks.fakes import FakeBackends, FakeDLRClient, FakeShikiOAuthClient, Latency
+from data.database import MODULES
+from data.models import DiscordTokenModel, ShikiTokenModel, UserModel
+
+# p99 budget in seconds, for default latency of fakes
+BUDGETS = {
+    'anime': 0.5,
+    'user': 0.5,
+    'anime autocomplete': 0.3,
+    'user autocomplete': 0.5,
+    'check_auth': 0.5,
+    'discord callback': 0.5,
+    'shikimori callback': 0.5,
+}
+USERS = 500
+QUERIES = ('naru', 'bleach', 'mono', 'gint', 'mushi', 'anime 1', 'аниме 2')
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, *_: Any, **__: Any) -> None:
+        self._done = True
+
+    async def send_message(self, *_: Any, **__: Any) -> None:
+        self._done = True
+
+
+class FakeInteraction:
+    """What handlers of `ShikiCog` use of `discord.Interaction`."""
+
+    def __init__(self, user_id: int, command: str):
+        self.user = SimpleNamespace(id=user_id)
+        self.command = SimpleNamespace(qualified_name=command)
+        self.created_at = utcnow()
+        self.response = FakeResponse()
+        self.edited: dict | None = None
+
+    async def edit_original_response(self, **kwargs: Any) -> None:
+        self.edited = kwargs
+
+
+def percentile(latencies: list[float], q: int) -> float:
+    return latencies[int(q / 100 * (len(latencies) - 1))]
+
+
+async def scenario(
+        name: str,
+        operation: Callable[[int], Awaitable[Any]],
+        operations: int,
+        concurrency: int
+) -> bool:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def timed(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = perf_counter()
+            try:
+                await operation(i)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"{name}: {e!r}")
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(operations)))
+    elapsed = perf_counter() - started
+
+    latencies.sort()
+    p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (50, 95, 99))
+    ok = p99 / 1000 <= BUDGETS[name] and not errors
+    print(
+        f"{name:>20}: {operations / elapsed:8.1f} ops/s, p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, p99 {p99:7.1f} ms, "
+        f"{errors} errors {'' if ok else '<- OVER BUDGET'}"
+    )
+    return ok
+
+
+async def seed_users() -> None:
+    expires_at = datetime.now() + timedelta(days=1)
+    token = {'access_token': 'a' * 43, 'refresh_token': 'r' * 43, 'expires_in': 86400, 'expires_at': expires_at}
+    await DiscordTokenModel.bulk_create([DiscordTokenModel(user_id=1000 + i, **token) for i in range(1, USERS + 1)])
+    await ShikiTokenModel.bulk_create([ShikiTokenModel(user_id=i, **token) for i in range(1, USERS + 1)])
+    discord_tokens = dict(await DiscordTokenModel.all().values_list('user_id', 'id'))
+    shiki_tokens = dict(await ShikiTokenModel.all().values_list('user_id', 'id'))
+    await UserModel.bulk_create([
+        UserModel(
+            discord_user_id=1000 + i, shikimori_user_id=i, shikimori_nickname=f'user{i}', anime_watched=0,
+            total_hours=0, discord_token_id=discord_tokens[1000 + i], shikimori_token_id=shiki_tokens[i],
+        )
+        for i in range(1, USERS + 1)
+    ])
+
+
+async def main(operations: int = 500, concurrency: int = 20, latency_ms: int = 50, rps: int = 0) -> None:
+    async with FakeBackends(Latency(base=latency_ms / 1000), rps=rps, rpm=rps * 18, users=USERS) as fakes:
+        # clients read these on first use, so environment goes before importing the bot
+        os.environ.update({
+            'SHIKI_BASE_URL': f'{fakes.shikimori_url}/api',
+            'DISCORD_API_URL': f'{fakes.discord_url}/api/v10',
+            'SHIKI_APPLICATION_NAME': 'benchmark', 'SHIKI_CLIENT_ID': 'benchmark', 'SHIKI_CLIENT_SECRET': 'benchmark',
+            'DLR_CLIENT_ID': 'benchmark', 'DLR_CLIENT_SECRET': 'benchmark', 'DLR_REDIRECT_URI': 'http://localhost',
+            'BOT_TOKEN': 'benchmark', 'COOKIE_SECRET': 'benchmark', 'JOB_WORKERS': '4',
+        })
+
+        from clients.http import JsonApi, get_http_pool
+        from clients.shiki import RateLimiter, TokenBucket, get_shiki_gateway
+        from cogs.shiki_commands import cog as shiki_cog
+        from cogs.shiki_commands.title_index import AnimeTitle
+        from dlr_server import main as dlr_server
+        from services.metadata import PUSH_METADATA, get_job_queue
+        from services.tokens import get_token_service
+
+        await Tortoise.init(db_url='sqlite://:memory:', modules=MODULES)
+        await Tortoise.generate_schemas()
+        await seed_users()
+
+        gateway = get_shiki_gateway()
+        gateway.client = FakeShikiOAuthClient(gateway.api, fakes.shikimori_url)  # noqa
+        if not rps:
+            gateway.limiter = RateLimiter(TokenBucket(capacity=10_000, period=1))
+        dlr_client = FakeDLRClient(JsonApi(get_http_pool(), f'{fakes.discord_url}/api/v10'))
+        shiki_cog.dlr_client = get_token_service().dlr_client = dlr_client
+        get_job_queue().handlers[PUSH_METADATA].dlr_client = dlr_client
+
+        # as if the catalog was synced already
+        shiki_cog.title_index.rebuild(
+            AnimeTitle(a['id'], a['name'], a['russian'], a['japanese'][0], float(a['score']))
+            for a in fakes.shikimori.catalog.values()
+        )
+
+        cog = shiki_cog.ShikiCog()
+        anime_autocomplete = cog.get_anime_info._params['name_or_id'].autocomplete  # noqa
+        user_autocomplete = cog.get_user_info._params['name_or_id'].autocomplete  # noqa
+        rnd = random.Random(0)
+        titles = len(fakes.shikimori.catalog)
+
+        async def anime(_: int) -> None:
+            anime_id = min(int(rnd.paretovariate(1.2)), titles)  # popular titles are asked for more often
+            await cog.get_anime_info.callback(cog, FakeInteraction(1001, 'shikimori anime'), str(anime_id))
+
+        async def user(_: int) -> None:
+            user_id = rnd.randint(1, USERS)
+            await cog.get_user_info.callback(cog, FakeInteraction(1001, 'shikimori user'), str(user_id))
+
+        async def anime_search(i: int) -> None:
+            query = rnd.choice(QUERIES)
+            await anime_autocomplete(cog, FakeInteraction(i, 'shikimori anime'), query[:rnd.randint(2, len(query))])
+
+        async def user_search(i: int) -> None:
+            await user_autocomplete(cog, FakeInteraction(i, 'shikimori user'), f'user{rnd.randint(1, USERS)}')
+
+        async def check_auth(_: int) -> None:
+            await cog.check_auth.callback(cog, FakeInteraction(1000 + rnd.randint(1, USERS), 'shikimori check_auth'))
+
+        results = [
+            await scenario('anime', anime, operations, concurrency),
+            await scenario('user', user, operations, concurrency),
+            await scenario('anime autocomplete', anime_search, operations, concurrency),
+            await scenario('user autocomplete', user_search, operations, concurrency),
+            await scenario('check_auth', check_auth, operations, concurrency),
+        ]
+
+        async with dlr_server.create_app(standalone=False).test_app() as test_app:
+            dlr_server.linked_role_client = dlr_client  # clients of the app are created when it starts
+            client = test_app.test_client()
+
+            async def discord_callback(_: int) -> None:
+                response = await client.get(
+                    '/discord-oauth-callback?state=s&code=c', headers={'Cookie': 'clientState=s'}
+                )
+                assert response.status_code == 302, response.status_code
+
+            async def shikimori_callback(_: int) -> None:
+                response = await client.get(
+                    '/shikimori-oauth-callback?code=c', headers={'Cookie': f'user_id={1000 + rnd.randint(1, USERS)}'}
+                )
+                assert response.status_code == 302, response.status_code
+
+            results.append(await scenario('discord callback', discord_callback, operations, concurrency))
+            results.append(await scenario('shikimori callback', shikimori_callback, operations, concurrency))
+
+            started = perf_counter()
+            while dlr_server.work_queue.depth or await get_job_queue().pending():
+                await asyncio.sleep(0.05)
+            print(f"{'background work':>20}: drained in {perf_counter() - started:.2f} s, "
+                  f"{dlr_server.work_queue.stats}, {get_job_queue().stats}")
+
+        print(f"{'shikimori':>20}: {fakes.shikimori.requests} requests, {fakes.shikimori.rate_limited} rate limited")
+        print(f"{'discord':>20}: {fakes.discord.requests} requests")
+        print(f"{'http pool':>20}: {get_http_pool().stats}")
+
+        await get_http_pool().close()
+        await Tortoise.close_connections()
+
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,200 @@
+"""Interactions endpoint (`dlr_server.interactions`) against gateway dispatch of the same interactions.
+
+    python -m benchmarks.interactions [interactions] [concurrency] [discord latency, ms]
+
+Synthetic `/shikimori anime` interactions, signed with a generated key, are POSTed to `/interactions` of the server;
+gateway path hands the same payloads to the command tree directly, as `discord.py` does on INTERACTION_CREATE. Both
+answer through fake Discord REST API (see `benchmarks.fakes`) and anime cache is warm, so the difference is the cost
+of the endpoint itself: signature check, request handling and waiting for the first response. Reports time to
+the first response (what Discord waits for, 3 seconds at most) and throughput up to the last edited message.
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import secrets
+import sys
+
+from time import perf_counter, time
+from typing import Any, Awaitable, Callable
+
+import discord.http
+
+from discord import Interaction
+from discord.utils import time_snowflake, utcnow
+from nacl.encoding import HexEncoder
+from nacl.signing import SigningKey
+from tortoise import Tortoise
+
+from benchmarks.fakes import FakeBackends, FakeDiscord, Latency
+from data.database import MODULES
+
+GUILD_ID = 922919845450903573  # one of guilds of `ShikiCog`
+CHANNEL_ID = 1
+COMMAND_ID = 2
+TITLES = 5000
+
+_ids = itertools.count()
+
+
+def anime_interaction(anime_id: int, user_id: int) -> dict[str, Any]:
+    now = utcnow()
+    return {
+        'type': 2,
+        'id': str(time_snowflake(now) + next(_ids) % 2 ** 22),
+        'application_id': str(FakeDiscord.APPLICATION_ID),
+        'token': secrets.token_urlsafe(48),
+        'version': 1,
+        'guild_id': str(GUILD_ID),
+        'channel_id': str(CHANNEL_ID),
+        'locale': 'ru',
+        'guild_locale': 'ru',
+        'app_permissions': '0',
+        'member': {
+            'user': {'id': str(user_id), 'username': f'member{user_id}', 'discriminator': '0000', 'avatar': None},
+            'roles': [], 'joined_at': now.isoformat(), 'deaf': False, 'mute': False, 'nick': None, 'avatar': None,
+            'premium_since': None, 'pending': False, 'permissions': '0', 'communication_disabled_until': None,
+            'flags': 0,
+        },
+        'data': {
+            'id': str(COMMAND_ID),
+            'name': 'shikimori',
+            'type': 1,
+            'guild_id': str(GUILD_ID),
+            'options': [
+                {'type': 1, 'name': 'anime', 'options': [{'type': 3, 'name': 'name_or_id', 'value': str(anime_id)}]}
+            ],
+        },
+    }
+
+
+def signed(key: SigningKey, payload: dict[str, Any]) -> tuple[bytes, dict[str, str]]:
+    body = json.dumps(payload).encode()
+    timestamp = str(int(time()))
+    signature = key.sign(timestamp.encode() + body).signature.hex()
+    return body, {
+        'Content-Type': 'application/json', 'X-Signature-Ed25519': signature, 'X-Signature-Timestamp': timestamp
+    }
+
+
+def percentile(latencies: list[float], q: int) -> float:
+    return latencies[int(q / 100 * (len(latencies) - 1))]
+
+
+async def scenario(
+        name: str,
+        operation: Callable[[int], Awaitable[Any]],
+        drained: Callable[[], Awaitable[Any]],
+        operations: int,
+        concurrency: int
+) -> None:
+    """`operation` returns once the interaction is answered, `drained` waits for handlers still running."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def timed(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = perf_counter()
+            try:
+                await operation(i)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"{name}: {e!r}")
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(operations)))
+    await drained()
+    elapsed = perf_counter() - started
+
+    latencies.sort()
+    p50, p95, p99 = (percentile(latencies, q) * 1000 for q in (50, 95, 99))
+    print(
+        f"{name:>10}: {operations / elapsed:8.1f} interactions/s, first response p50 {p50:7.1f} ms, "
+        f"p95 {p95:7.1f} ms, p99 {p99:7.1f} ms, {errors} errors"
+    )
+
+
+async def main(operations: int = 500, concurrency: int = 50, latency_ms: int = 30) -> None:
+    async with FakeBackends(discord_latency=Latency(base=latency_ms / 1000), rps=0, titles=TITLES) as fakes:
+        signing_key = SigningKey.generate()
+        # clients read these on first use, so environment goes before importing the bot
+        os.environ.update({
+            'SHIKI_BASE_URL': f'{fakes.shikimori_url}/api',
+            'DISCORD_API_URL': f'{fakes.discord_url}/api/v10',
+            'DISCORD_PUBLIC_KEY': signing_key.verify_key.encode(HexEncoder).decode(),
+            'SHIKI_APPLICATION_NAME': 'benchmark', 'SHIKI_CLIENT_ID': 'benchmark', 'SHIKI_CLIENT_SECRET': 'benchmark',
+            'DLR_CLIENT_ID': 'benchmark', 'DLR_CLIENT_SECRET': 'benchmark', 'DLR_REDIRECT_URI': 'http://localhost',
+            'BOT_TOKEN': 'benchmark', 'COOKIE_SECRET': 'benchmark',
+        })
+        discord.http.Route.BASE = f'{fakes.discord_url}/api/v10'
+
+        from main import create_bot
+        from clients.http import get_http_pool
+        from clients.shiki import RateLimiter, TokenBucket, get_shiki_gateway
+        from cogs.shiki_commands.cog import anime_cache
+        from dlr_server import interactions as endpoint
+        from dlr_server.main import create_app
+
+        await Tortoise.init(db_url='sqlite://:memory:', modules=MODULES)
+        await Tortoise.generate_schemas()
+
+        get_shiki_gateway().limiter = RateLimiter(TokenBucket(capacity=10_000, period=1))
+        bot = await create_bot(background=False)
+        bot.get_cog('ShikiCog').reload_title_index.cancel()  # lookups by id do not need the catalog
+        await bot.login(os.environ['BOT_TOKEN'])
+        endpoint.attach(bot)
+
+        rnd = random.Random(0)
+        anime_ids = [min(int(rnd.paretovariate(1.2)), TITLES) for _ in range(operations)]
+        await asyncio.gather(*(anime_cache.get(anime_id) for anime_id in set(anime_ids)))
+
+        handlers: set[asyncio.Task] = set()
+
+        async def gateway(i: int) -> None:
+            interaction = Interaction(data=anime_interaction(anime_ids[i], 1000 + i), state=bot._connection)  # noqa
+            task = asyncio.create_task(bot.tree._call(interaction))  # noqa
+            handlers.add(task)
+            task.add_done_callback(handlers.discard)
+            await endpoint._first_response(interaction, task)  # noqa
+            if not interaction.response.is_done():
+                raise TimeoutError("Interaction was not answered in time")
+
+        async def gateway_drained() -> None:
+            if handlers:
+                await asyncio.wait(handlers)
+
+        async with create_app(standalone=False).test_app() as test_app:
+            client = test_app.test_client()
+
+            body, headers = signed(signing_key, {'type': 1, 'id': '1', 'application_id': '1', 'token': 't'})
+            response = await client.post('/interactions', data=body, headers=headers)
+            assert response.status_code == 200 and await response.get_json() == {'type': 1}, "PING must be answered"
+            response = await client.post('/interactions', data=body + b' ', headers=headers)
+            assert response.status_code == 401, "Tampered request must be rejected"
+
+            async def http(i: int) -> None:
+                body, headers = signed(signing_key, anime_interaction(anime_ids[i], 1000 + i))
+                response = await client.post('/interactions', data=body, headers=headers)
+                assert response.status_code == 202, response.status_code
+
+            async def http_drained() -> None:
+                if endpoint._tasks:  # noqa
+                    await asyncio.wait(endpoint._tasks)  # noqa
+
+            await scenario('gateway', gateway, gateway_drained, operations, concurrency)
+            await scenario('http', http, http_drained, operations, concurrency)
+
+        print(f"{'discord':>10}: {fakes.discord.requests} requests, "
+              f"{fakes.discord.interaction_responses} interaction responses")
+
+        await bot.close()
+        await get_http_pool().close()
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
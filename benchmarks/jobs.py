@@ -0,0 +1,77 @@
+"""Throughput of the durable job queue by number of worker coroutines.
+
+    python -m benchmarks.jobs [users] [pushes per user]
+
+Every user gets `pushes per user` metadata pushes enqueued, deduplication must leave one push per user. The handler
+stands for Discord with `LATENCY` per push. SQLite has no row locks, so run it against MySQL to check claiming by
+concurrent processes.
+"""
+import asyncio
+import sys
+
+from datetime import timedelta
+from time import perf_counter
+
+from tortoise import Tortoise
+
+from data.models import JobModel
+from services.jobs import JobQueue, enqueue
+
+LATENCY = 0.05
+KIND = 'benchmark'
+
+
+class StubHandler:
+    def __init__(self, fail_every: int = 0):
+        self.pushed: list[int] = []
+        self.fail_every = fail_every
+        self.calls = 0
+
+    async def __call__(self, user_ids: list[int]) -> dict[int, Exception]:
+        self.calls += 1
+        await asyncio.gather(*(asyncio.sleep(LATENCY) for _ in user_ids))
+        if self.fail_every and self.calls % self.fail_every == 0:
+            return {user_id: RuntimeError('stub failure') for user_id in user_ids}
+        self.pushed.extend(user_ids)
+        return {}
+
+
+async def run(workers: int, users: int, pushes: int, fail_every: int = 0) -> None:
+    for _ in range(pushes):
+        for user_id in range(users):
+            await enqueue(KIND, user_id)
+
+    handler = StubHandler(fail_every)
+    queue = JobQueue(
+        {KIND: handler}, workers=workers, batch_size=20, retry_delay=timedelta(milliseconds=10), poll_interval=0.01
+    )
+
+    started = perf_counter()
+    queue.start()
+    while await queue.pending():
+        await asyncio.sleep(0.01)
+    elapsed = perf_counter() - started
+    await queue.stop()
+
+    assert sorted(set(handler.pushed)) == list(range(users)), "every user must be pushed"
+    assert len(handler.pushed) == users, "no duplicate pushes"
+    print(
+        f"{workers:>3} workers: {users / elapsed:8.1f} jobs/s, "
+        f"{queue.retried} retried, {handler.calls} batches, {elapsed:6.2f} s"
+    )
+
+
+async def main(users: int = 1000, pushes: int = 3) -> None:
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['data.models']})
+    await Tortoise.generate_schemas()
+
+    for workers in (1, 2, 4, 8):
+        await run(workers, users, pushes)
+    await run(4, users, pushes, fail_every=5)
+    assert not await JobModel.all().count()
+
+    await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
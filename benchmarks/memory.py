@@ -0,0 +1,48 @@
+"""Resident memory of two-process layout (`main.py` + `dlr_server/main.py`) against unified one (`unified.py`).
+
+    python -m benchmarks.memory
+
+Every layout is imported in a fresh interpreter with dummy environment (nothing connects anywhere), so it compares
+the baseline paid per process: interpreter, libraries, clients and empty caches. Caches filled at runtime come on top
+of it, once per process in two-process layout.
+"""
+import os
+import subprocess
+import sys
+
+LAYOUTS = {
+    'bot': 'import main',
+    'server': 'import dlr_server.main',
+    'unified': 'import unified',
+}
+
+DUMMY_ENV = {
+    name: 'dummy' for name in (
+        'BOT_TOKEN', 'DLR_CLIENT_ID', 'DLR_CLIENT_SECRET', 'DLR_REDIRECT_URI', 'COOKIE_SECRET',
+        'SHIKI_APPLICATION_NAME', 'SHIKI_CLIENT_ID', 'SHIKI_CLIENT_SECRET',
+        'DB_HOST', 'DB_PORT', 'DB_USER', 'DB_PASS', 'DB_NAME', 'CERT_KEY', 'CERT_FILE',
+    )
+}
+
+PRINT_RSS = '''
+with open('/proc/self/status') as status:
+    print(next(int(line.split()[1]) for line in status if line.startswith('VmRSS')))
+'''
+
+
+def rss_kb(code: str) -> int:
+    output = subprocess.check_output(
+        [sys.executable, '-c', f'{code}\n{PRINT_RSS}'], env={**os.environ, **DUMMY_ENV}, text=True
+    )
+    return int(output.split()[-1])
+
+
+def main() -> None:
+    rss = {layout: rss_kb(code) for layout, code in LAYOUTS.items()}
+    for layout, kb in rss.items():
+        print(f"{layout:>12}: {kb / 1024:7.1f} MiB")
+    print(f"{'two-process':>12}: {(rss['bot'] + rss['server']) / 1024:7.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Number of SELECT queries `check_auth`, `update` and `open_profile` make for a user, against in-memory SQLite and
+local fakes of Shikimori and Discord (see `benchmarks.fakes`).
+
+    python -m benchmarks.queries
+
+Every handler runs with cold caches, for a user with both tokens. Exit code is 1 if any of them makes more SELECTs
+than `MAX_SELECTS`: the user and both tokens must be loaded by one joined query (see `data.users.get_user`).
+"""
+import asyncio
+import functools
+import os
+import sys
+
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any
+
+from tortoise import Tortoise, connections
+
+from benchmarks.fakes import FakeBackends, FakeDLRClient, FakeShikiOAuthClient
+from benchmarks.harness import USERS, FakeInteraction, seed_users
+from data.database import MODULES
+from services.metrics import DB_METHODS
+
+MAX_SELECTS = {'check_auth': 1, 'update': 1, 'open_profile': 1}
+
+queries = Counter()
+
+
+def count_queries(connection: Any) -> None:
+    """Count queries of the connection by their first word, class of the client is patched."""
+    def counted(method):
+        @functools.wraps(method)
+        async def wrapper(self, query: str, *args: Any, **kwargs: Any) -> Any:
+            queries[query.lstrip().split(None, 1)[0].upper() if query.strip() else method.__name__] += 1
+            return await method(self, query, *args, **kwargs)
+        return wrapper
+
+    cls = type(connection)
+    for name in DB_METHODS:
+        if method := getattr(cls, name, None):
+            setattr(cls, name, counted(method))
+
+
+async def main() -> None:
+    async with FakeBackends(rps=0, users=USERS) as fakes:
+        os.environ.update({
+            'SHIKI_BASE_URL': f'{fakes.shikimori_url}/api',
+            'DISCORD_API_URL': f'{fakes.discord_url}/api/v10',
+            'SHIKI_APPLICATION_NAME': 'benchmark', 'SHIKI_CLIENT_ID': 'benchmark', 'SHIKI_CLIENT_SECRET': 'benchmark',
+            'DLR_CLIENT_ID': 'benchmark', 'DLR_CLIENT_SECRET': 'benchmark', 'DLR_REDIRECT_URI': 'http://localhost',
+            'BOT_TOKEN': 'benchmark', 'COOKIE_SECRET': 'benchmark',
+        })
+
+        from clients.http import JsonApi, get_http_pool
+        from clients.shiki import RateLimiter, TokenBucket, get_shiki_gateway
+        from cogs.ctx_commands.cog import ContextMenuCog
+        from cogs.shiki_commands import cog as shiki_cog
+        from services.metadata import PUSH_METADATA, get_job_queue
+        from services.tokens import get_token_service
+
+        await Tortoise.init(db_url='sqlite://:memory:', modules=MODULES)
+        await Tortoise.generate_schemas()
+        await seed_users()
+
+        gateway = get_shiki_gateway()
+        gateway.client = FakeShikiOAuthClient(gateway.api, fakes.shikimori_url)  # noqa
+        gateway.limiter = RateLimiter(TokenBucket(capacity=10_000, period=1))
+        dlr_client = FakeDLRClient(JsonApi(get_http_pool(), f'{fakes.discord_url}/api/v10'))
+        shiki_cog.dlr_client = get_token_service().dlr_client = dlr_client
+        get_job_queue().handlers[PUSH_METADATA].dlr_client = dlr_client
+
+        cog = shiki_cog.ShikiCog()
+        context_menu = ContextMenuCog(bot=None)  # noqa, commands are not registered
+        count_queries(connections.get('default'))
+
+        def interaction(user_id: int, command: str) -> FakeInteraction:
+            fake = FakeInteraction(user_id, command)
+            fake.guild_id = None
+            return fake
+
+        handlers = {  # different users, so no handler finds the user cached by another one
+            'check_auth': lambda: cog.check_auth.callback(cog, interaction(1001, 'shikimori check_auth')),
+            'update': lambda: cog.update.callback(cog, interaction(1002, 'shikimori update')),
+            'open_profile': lambda: context_menu.open_profile(
+                interaction(1001, 'Профиль shikimori.me'), SimpleNamespace(id=1003, mention='<@1003>')
+            ),
+        }
+
+        ok = True
+        try:
+            for name, handler in handlers.items():
+                queries.clear()
+                await handler()
+                over = queries['SELECT'] > MAX_SELECTS[name]
+                ok &= not over
+                print(f"{name:>15}: {queries['SELECT']} SELECT, {dict(queries)} {'<- OVER LIMIT' if over else ''}")
+        finally:
+            await get_http_pool().close()
+            await Tortoise.close_connections()
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
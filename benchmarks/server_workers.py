@@ -0,0 +1,160 @@
+"""Throughput of OAuth callbacks of the linked roles server with 1, 2, 4... hypercorn workers.
+
+    python -m benchmarks.server_workers [requests] [concurrency] [max workers]
+
+The server runs in a child process the way `dlr_server.main.run` runs it in production, with `SERVER_WORKERS`
+worker processes; only OAuth clients of every worker are swapped for ones talking to local fakes (see
+`benchmarks.fakes`). Database is `DB_URL` if it is set, an SQLite file otherwise. SQLite serializes writes of all
+workers, so use MySQL to see how far callbacks really scale. Load generator and fakes share one process (one core).
+"""
+import asyncio
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+
+from time import perf_counter
+from typing import Callable
+
+import aiohttp
+
+from quart import Quart
+from tortoise import Tortoise
+
+from benchmarks.fakes import FakeBackends, FakeDLRClient, FakeShikiOAuthClient
+from clients.dlr import get_discord_api
+from clients.shiki import RateLimiter, TokenBucket, get_shiki_gateway
+from data.database import MODULES
+from dlr_server import main as dlr_server
+from services.metadata import PUSH_METADATA, get_job_queue
+from services.tokens import get_token_service
+
+APPLICATION_PATH = 'benchmarks.server_workers:create_app()'
+STARTUP_TIMEOUT = 30
+
+
+def create_app() -> Quart:
+    """App of every worker, OAuth clients talk to fakes (their urls come from environment of the benchmark)."""
+    app = dlr_server.create_app()
+
+    @app.before_serving
+    async def use_fakes():  # after clients of the worker are created
+        gateway = get_shiki_gateway()
+        gateway.client = FakeShikiOAuthClient(gateway.api, os.environ['FAKE_SHIKIMORI_URL'])  # noqa
+        gateway.limiter = RateLimiter(TokenBucket(capacity=10_000, period=1))
+
+        dlr_client = FakeDLRClient(get_discord_api())
+        dlr_server.linked_role_client = get_token_service().dlr_client = dlr_client
+        get_job_queue().handlers[PUSH_METADATA].dlr_client = dlr_client
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(latencies: list[float], q: int) -> float:
+    return latencies[int(q / 100 * (len(latencies) - 1))]
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str) -> None:
+    """Until a worker answers a public route, whatever the status."""
+    started = perf_counter()
+    while True:
+        try:
+            async with session.get(f'{url}/linked-role', allow_redirects=False) as response:
+                await response.read()
+                return
+        except aiohttp.ClientError:
+            pass
+        if perf_counter() - started > STARTUP_TIMEOUT:
+            raise TimeoutError("Server did not start")
+        await asyncio.sleep(0.2)
+
+
+async def load(
+        session: aiohttp.ClientSession,
+        name: str,
+        url: str,
+        cookie: Callable[[], str],
+        requests: int,
+        concurrency: int
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore:
+            started = perf_counter()
+            try:
+                async with session.get(url, headers={'Cookie': cookie()}, allow_redirects=False) as response:
+                    await response.read()
+                    if response.status != 302:
+                        raise RuntimeError(f"Status {response.status}")
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"{name}: {e!r}")
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = perf_counter() - started
+
+    latencies.sort()
+    p50, p99 = (percentile(latencies, q) * 1000 for q in (50, 99))
+    print(f"{name:>20}: {requests / elapsed:8.1f} req/s, p50 {p50:7.1f} ms, p99 {p99:7.1f} ms, {errors} errors")
+
+
+async def main(requests: int = 2000, concurrency: int = 64, max_workers: int = os.cpu_count()) -> None:
+    async with FakeBackends(rps=0) as fakes:
+        db_url = os.environ.get('DB_URL') or f'sqlite://{tempfile.mkdtemp()}/server.sqlite3'
+        await Tortoise.init(db_url=db_url, modules=MODULES)
+        await Tortoise.generate_schemas(safe=True)
+        await Tortoise.close_connections()
+
+        port = free_port()
+        url = f'http://127.0.0.1:{port}'
+        env = {
+            **os.environ,
+            'DB_URL': db_url, 'SERVER_BIND': f'127.0.0.1:{port}', 'CERT_KEY': '', 'CERT_FILE': '',
+            'SHIKI_BASE_URL': f'{fakes.shikimori_url}/api', 'FAKE_SHIKIMORI_URL': fakes.shikimori_url,
+            'DISCORD_API_URL': f'{fakes.discord_url}/api/v10',
+            'SHIKI_APPLICATION_NAME': 'benchmark', 'SHIKI_CLIENT_ID': 'benchmark', 'SHIKI_CLIENT_SECRET': 'benchmark',
+            'DLR_CLIENT_ID': 'benchmark', 'DLR_CLIENT_SECRET': 'benchmark', 'DLR_REDIRECT_URI': 'http://localhost',
+            'BOT_TOKEN': 'benchmark', 'COOKIE_SECRET': 'benchmark',
+        }
+        rnd = random.Random(0)
+
+        workers = 1
+        while workers <= max_workers:
+            server = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', f'from dlr_server.main import run; run({APPLICATION_PATH!r})',
+                env={**env, 'SERVER_WORKERS': str(workers)},
+            )
+            try:
+                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+                    await wait_ready(session, url)
+                    print(f"{workers} worker(s):")
+                    await load(
+                        session, 'discord callback', f'{url}/discord-oauth-callback?state=s&code=c',
+                        lambda: 'clientState=s', requests, concurrency,
+                    )
+                    await load(
+                        session, 'shikimori callback', f'{url}/shikimori-oauth-callback?code=c',
+                        lambda: f'user_id={rnd.randint(10 ** 17, 10 ** 18)}', requests, concurrency,
+                    )
+            finally:
+                server.send_signal(signal.SIGINT)
+                await server.wait()
+            workers *= 2
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,72 @@
+"""Concurrent identical commands must cost one upstream call, and commands cancelled all together must cancel it.
+
+    python -m benchmarks.singleflight [concurrency]
+
+`/shikimori anime` and `/shikimori user` run through the handlers of `ShikiCog`, with synthetic interactions, against
+a local fake of Shikimori (see `benchmarks.fakes`); upstream calls are the requests the fake has answered.
+"""
+import asyncio
+import os
+import sys
+
+from time import perf_counter
+
+from benchmarks.fakes import FakeBackends
+from benchmarks.harness import FakeInteraction
+
+
+async def main(concurrency: int = 100) -> None:
+    async with FakeBackends(rps=0) as fakes:
+        # clients read these on first use, so environment goes before importing the bot
+        os.environ.update({
+            'SHIKI_BASE_URL': f'{fakes.shikimori_url}/api',
+            'DISCORD_API_URL': f'{fakes.discord_url}/api/v10',
+            'SHIKI_APPLICATION_NAME': 'benchmark', 'SHIKI_CLIENT_ID': 'benchmark', 'SHIKI_CLIENT_SECRET': 'benchmark',
+            'DLR_CLIENT_ID': 'benchmark', 'DLR_CLIENT_SECRET': 'benchmark', 'DLR_REDIRECT_URI': 'http://localhost',
+            'BOT_TOKEN': 'benchmark', 'COOKIE_SECRET': 'benchmark',
+        })
+
+        from clients.http import get_http_pool
+        from clients.shiki import RateLimiter, TokenBucket, get_shiki_gateway
+        from cogs.shiki_commands.cog import ShikiCog
+
+        gateway = get_shiki_gateway()
+        gateway.limiter = RateLimiter(TokenBucket(capacity=10_000, period=1))
+        cog = ShikiCog(background=False)  # handlers only, nothing is loaded
+
+        commands = (
+            ('shikimori anime', lambda interaction: cog.get_anime_info.callback(cog, interaction, '1')),
+            ('shikimori user', lambda interaction: cog.get_user_info.callback(cog, interaction, '1')),
+        )
+        try:
+            for name, handler in commands:
+                requests = fakes.shikimori.requests
+                interactions = [FakeInteraction(1000 + i, name) for i in range(concurrency)]
+                started = perf_counter()
+                await asyncio.gather(*(handler(interaction) for interaction in interactions))
+                elapsed = perf_counter() - started
+
+                calls = fakes.shikimori.requests - requests
+                assert calls == 1, f"{name}: expected 1 upstream call, got {calls}"
+                assert all(interaction.edited for interaction in interactions), f"{name}: not every command answered"
+                print(f"/{name}: {concurrency} concurrent commands -> {calls} upstream call in {elapsed:.3f} s")
+
+            # every command gives up (e.g. interactions expired), the shared lookup must not outlive them
+            tasks = [
+                asyncio.create_task(cog.get_user_info.callback(cog, FakeInteraction(1000 + i, 'shikimori user'), '2'))
+                for i in range(concurrency)
+            ]
+            await asyncio.sleep(fakes.shikimori.latency.base / 2)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            assert len(gateway.single_flight) == 0, "Lookup nobody waits for is still in flight"
+            print(f"/shikimori user: {concurrency} cancelled commands -> lookup cancelled")
+
+            print(gateway.single_flight.stats)
+        finally:
+            await get_http_pool().close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
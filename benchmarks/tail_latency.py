@@ -0,0 +1,145 @@
+"""Tail latency of Shikimori lookups against a local fake server with injected faults.
+
+    python -m benchmarks.tail_latency [requests] [slow share] [slow seconds]
+
+Fake server answers in `FAST` seconds, except `slow share` of requests which hang for `slow seconds`. Lookups run
+with and without hedging under a deadline; then callers with deadlines too short for any answer must not open the
+circuit breaker; then the server goes down and circuit breaker must turn failures into immediate
+`CircuitOpenError`s instead of waiting for the deadline every time. Exit code is 1 if any of `CHECKS` fails.
+"""
+import asyncio
+import random
+import sys
+
+from time import perf_counter
+
+from aiohttp import ClientResponseError, web
+
+from clients.http import HttpPool, JsonApi
+from clients.resilience import CircuitBreaker, CircuitOpenError, Hedger, deadline
+from clients.shiki import RateLimiter, ShikiGateway, TokenBucket
+
+FAST = 0.02
+DEADLINE = 1.0
+IMPATIENT_DEADLINE = FAST / 4
+PORT = 8765
+CHECKS = (
+    'hedging lowers p99',
+    'expired deadlines keep breaker closed',
+    'outage opens breaker',
+)
+
+
+class FakeShikimori:
+    def __init__(self, slow_share: float, slow: float, seed: int = 0):
+        self.slow_share = slow_share
+        self.slow = slow
+        self.down = False
+        self.rnd = random.Random(seed)
+
+    async def anime(self, request: web.Request) -> web.Response:
+        if self.down:
+            await asyncio.sleep(FAST)
+            raise web.HTTPServiceUnavailable()
+        await asyncio.sleep(self.slow if self.rnd.random() < self.slow_share else FAST)
+        return web.json_response({'id': int(request.match_info['id']), 'name': 'Naruto'})
+
+
+def percentiles(latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p = {q: latencies[int(q / 100 * (len(latencies) - 1))] * 1000 for q in (50, 95, 99)}
+    return f"p50 {p[50]:7.1f} ms, p95 {p[95]:7.1f} ms, p99 {p[99]:7.1f} ms"
+
+
+def p99(results: list[tuple[float, str]]) -> float:
+    latencies = sorted(latency for latency, _ in results)
+    return latencies[int(0.99 * (len(latencies) - 1))]
+
+
+async def lookup(gateway: ShikiGateway, anime_id: int, seconds: float = DEADLINE) -> tuple[float, str]:
+    started = perf_counter()
+    try:
+        with deadline(seconds):
+            await gateway.get_anime(anime_id)
+        outcome = 'ok'
+    except TimeoutError:
+        outcome = 'timeout'
+    except CircuitOpenError:
+        outcome = 'rejected'
+    except ClientResponseError:
+        outcome = 'error'
+    return perf_counter() - started, outcome
+
+
+async def run(
+        name: str,
+        gateway: ShikiGateway,
+        requests: int,
+        first_id: int,
+        seconds: float = DEADLINE
+) -> list[tuple[float, str]]:
+    # sequential, as users come one by one; distinct ids, so nothing is coalesced
+    results = [await lookup(gateway, anime_id, seconds) for anime_id in range(first_id, first_id + requests)]
+    outcomes = {outcome: sum(1 for _, o in results if o == outcome) for _, outcome in results}
+    print(f"{name:>12}: {percentiles([latency for latency, _ in results])}, {outcomes}")
+    return results
+
+
+def check(name: str, ok: bool) -> bool:
+    print(f"{name:>40}: {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+def make_gateway(api: JsonApi, hedging: bool) -> ShikiGateway:
+    return ShikiGateway(
+        None,  # noqa, only public lookups are made
+        RateLimiter(TokenBucket(capacity=1000, period=1)),
+        api=api,
+        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=1),
+        hedger=Hedger() if hedging else Hedger(min_delay=float('inf')),
+    )
+
+
+async def main(requests: int = 500, slow_share: float = 0.03, slow: float = 2.0) -> None:
+    fake = FakeShikimori(slow_share, slow)
+    app = web.Application()
+    app.router.add_get('/api/animes/{id}', fake.anime)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', PORT).start()
+
+    pool = HttpPool()
+    api = JsonApi(pool, f'http://127.0.0.1:{PORT}/api')
+
+    plain = await run('no hedging', make_gateway(api, hedging=False), requests, first_id=1)
+
+    hedged = make_gateway(api, hedging=True)
+    hedged_results = await run('hedged', hedged, requests, first_id=requests + 1)
+    print(f"{'':>12}  {hedged.hedger.stats}")
+
+    impatient = make_gateway(api, hedging=False)
+    impatient_results = await run(
+        'impatient', impatient, requests // 5, first_id=2 * requests + 1, seconds=IMPATIENT_DEADLINE
+    )
+    print(f"{'':>12}  {impatient.breaker.stats}")
+
+    fake.down = True
+    outage = await run('outage', hedged, requests // 5, first_id=3 * requests + 1)
+    print(f"{'':>12}  {hedged.breaker.stats}")
+
+    print(f"{'pool':>12}: {pool.stats}")
+    await pool.close()
+    await runner.cleanup()
+
+    results = [
+        check(CHECKS[0], p99(hedged_results) < p99(plain)),
+        check(CHECKS[1], impatient.breaker.opened == 0 and all(o == 'timeout' for _, o in impatient_results)),
+        check(CHECKS[2], hedged.breaker.opened > 0 and sum(o == 'rejected' for _, o in outage) > len(outage) // 2),
+    ]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    asyncio.run(main(*(f(a) for f, a in zip((int, float, float), argv))))
@@ -0,0 +1,81 @@
+"""Lookup latency of `TitleIndex` on a synthetic catalog.
+
+    python -m benchmarks.title_index [catalog size] [queries]
+"""
+import random
+import sys
+
+from time import perf_counter, perf_counter_ns
+
+from cogs.shiki_commands.title_index import AnimeTitle, TitleIndex
+
+LATIN = ['ka', 'ki', 'ku', 'ko', 'sa', 'shi', 'su', 'to', 'na', 'ni', 'no', 'ha', 'ma', 'mi', 'ra', 'ru', 'ro', 'yo']
+CYRILLIC = ['ка', 'ки', 'ку', 'ко', 'са', 'си', 'су', 'то', 'на', 'ни', 'но', 'ха', 'ма', 'ми', 'ра', 'ру', 'ро', 'ё']
+JAPANESE = ['カ', 'キ', 'ク', 'コ', 'サ', 'シ', 'ス', 'ト', 'ナ', 'ニ', 'ノ', 'ハ', 'マ', 'ミ', 'ラ', 'ル', 'ロ', 'ヨ']
+
+
+def _word(rnd: random.Random, syllables: list[str]) -> str:
+    return ''.join(rnd.choices(syllables, k=rnd.randint(2, 5)))
+
+
+def _title(rnd: random.Random, syllables: list[str], separator: str = ' ') -> str:
+    return separator.join(_word(rnd, syllables) for _ in range(rnd.randint(1, 4)))
+
+
+def make_catalog(size: int, seed: int = 0) -> list[AnimeTitle]:
+    rnd = random.Random(seed)
+    return [
+        AnimeTitle(
+            id=i,
+            name=_title(rnd, LATIN),
+            russian=_title(rnd, CYRILLIC),
+            japanese=_title(rnd, JAPANESE, separator=''),
+            score=round(rnd.uniform(0, 10), 2),
+        )
+        for i in range(1, size + 1)
+    ]
+
+
+def make_queries(catalog: list[AnimeTitle], amount: int, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(amount):
+        title = rnd.choice(catalog)
+        text = rnd.choice([title.name, title.russian, title.japanese])
+        kind = rnd.random()
+        if kind < 0.5:  # user is typing from the beginning
+            queries.append(text[:rnd.randint(1, len(text))])
+        elif kind < 0.9:  # part of the title
+            start = rnd.randint(0, max(len(text) - 3, 0))
+            queries.append(text[start:start + rnd.randint(3, 10)])
+        else:  # typo / not in catalog
+            queries.append(_word(rnd, LATIN) + 'xyz')
+    return queries
+
+
+def percentile(values: list[int], p: float) -> int:
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(size: int = 30_000, amount: int = 20_000) -> None:
+    catalog = make_catalog(size)
+
+    started = perf_counter()
+    index = TitleIndex(catalog)
+    print(f"built index of {len(index)} titles in {perf_counter() - started:.2f} s")
+
+    timings = []
+    for query in make_queries(catalog, amount):
+        started = perf_counter_ns()
+        index.search(query, limit=20)
+        timings.append(perf_counter_ns() - started)
+
+    timings.sort()
+    print(f"{amount} lookups, latency in µs:")
+    for name, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        print(f"  {name}: {percentile(timings, p) / 1000:.1f}")
+    print(f"  max: {timings[-1] / 1000:.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
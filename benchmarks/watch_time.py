@@ -0,0 +1,117 @@
+"""Full vs incremental watch time computation for a heavy user, against a stub Shikimori API.
+
+    python -m benchmarks.watch_time [titles] [changed titles] [stub rps]
+
+Stub API answers after `LATENCY` and is rate limited to `stub rps` (real Shikimori allows ~1.5 rps on average,
+90 rpm), so upstream call counts are reported together with projected time at real limits.
+"""
+import asyncio
+import random
+import sys
+
+from datetime import datetime, timezone
+from time import perf_counter
+
+from tortoise import Tortoise
+
+from clients.shiki import RateLimiter, ShikiGateway, TokenBucket
+from data.models import AnimeDurationModel, AnimeRateModel
+from services.watch_time import update_watch_time
+
+LATENCY = 0.05
+SHIKIMORI_RPS = 90 / 60
+USER_ID = 1
+
+
+class StubRequest:
+    """Mimics `client.go().users.id(1).anime_rates(page=1, limit=5000).get()` call chain."""
+
+    def __init__(self, client: 'StubClient', path: tuple = (), params: dict = None):
+        self._client, self._path, self._params = client, path, params or {}
+
+    def __getattr__(self, name: str) -> 'StubRequest':
+        return StubRequest(self._client, self._path + (name, ), self._params)
+
+    def __call__(self, *args, **kwargs) -> 'StubRequest':
+        return StubRequest(self._client, self._path + args, {**self._params, **kwargs})
+
+    async def get(self):
+        return await self._client.handle(self._path, self._params)
+
+
+class StubClient:
+    def __init__(self, titles: int, seed: int = 0):
+        self.calls = 0
+        self.rnd = random.Random(seed)
+        self.animes = {
+            i: {'id': i, 'duration': self.rnd.choice([5, 12, 24, 24, 24, 100]), 'episodes': self.rnd.randint(1, 50)}
+            for i in range(1, titles + 1)
+        }
+        self.rates = [self._rate(i, anime_id) for i, anime_id in enumerate(self.animes, start=1)]
+
+    def _rate(self, rate_id: int, anime_id: int) -> dict:
+        episodes = self.animes[anime_id]['episodes']
+        return {
+            'id': rate_id,
+            'status': 'completed',
+            'score': self.rnd.randint(0, 10),
+            'episodes': episodes,
+            'rewatches': 0,
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+            'anime': {'id': anime_id, 'episodes': episodes},
+        }
+
+    def change(self, amount: int) -> None:
+        for rate in self.rnd.sample(self.rates, amount):
+            rate['rewatches'] += 1
+            rate['updated_at'] = datetime.now(timezone.utc).isoformat()
+
+    def go(self) -> StubRequest:
+        return StubRequest(self)
+
+    async def handle(self, path: tuple, params: dict):
+        self.calls += 1
+        await asyncio.sleep(LATENCY)
+        if path[-1] == 'anime_rates':
+            start = (params['page'] - 1) * params['limit']
+            return self.rates[start:start + params['limit']]
+        if path[:2] == ('animes', 'id'):
+            return self.animes[path[2]]
+        raise NotImplementedError(path)
+
+
+async def run(gateway: ShikiGateway, client: StubClient, name: str) -> float:
+    client.calls = 0
+    started = perf_counter()
+    minutes = await update_watch_time(gateway, USER_ID)
+    elapsed = perf_counter() - started
+    print(
+        f"{name:>12}: {minutes / 60:8.1f} h, {client.calls:5} upstream calls, {elapsed:6.2f} s "
+        f"(~{client.calls / SHIKIMORI_RPS:6.0f} s at shikimori limits)"
+    )
+    return minutes
+
+
+async def main(titles: int = 3000, changed: int = 30, rps: int = 200) -> None:
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['data.models']})
+    await Tortoise.generate_schemas()
+
+    client = StubClient(titles)
+    gateway = ShikiGateway(client, RateLimiter(TokenBucket(capacity=rps, period=1)))  # noqa
+
+    full = await run(gateway, client, 'cold')
+
+    client.change(changed)
+    incremental = await run(gateway, client, 'incremental')
+
+    # what the old implementation did every time: everything from scratch
+    await AnimeRateModel.all().delete()
+    await AnimeDurationModel.all().delete()
+    assert abs(await run(gateway, client, 'full') - incremental) < 1e-6
+    assert incremental > full
+
+    await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*map(int, sys.argv[1:])))
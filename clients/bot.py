@@ -1,10 +1,65 @@
+import os
+
 from discord.ext.commands import Bot
 from discord import Guild
 
+from cogs.manage_commangs.sync import sync_changed
+
+from services.jobs import JobQueue
+from services.leaderboard import ADD_MEMBERSHIPS, leaderboards
+from services.metadata import get_job_queue
+from services.refresher import REFRESH_USER, MetadataRefresher
+from services.tokens import TokenService, get_token_service
+
+from .http import get_http_pool
+from .shiki import get_shiki_gateway
+
 
 class ShikimoriBot(Bot):
     # TODO description
 
+    token_service: TokenService = None
+    metadata_refresher: MetadataRefresher = None
+    job_queue: JobQueue = None
+
+    def __init__(self, *args, background: bool = True, **kwargs):
+        """`background=False` for workers which only handle interactions (see `dlr_server.interactions`): background
+        refreshes, job queue, command sync and anime catalog sync (see `ShikiCog`) are left to the main bot process.
+        """
+        super().__init__(*args, **kwargs)
+        self.background = background
+
+    async def setup_hook(self) -> None:
+        if not self.background:
+            return
+
+        self.token_service = get_token_service()
+        self.token_service.start()
+
+        self.metadata_refresher = MetadataRefresher(get_shiki_gateway())
+        self.metadata_refresher.start()
+
+        self.job_queue = get_job_queue()
+        # jobs of the bot process only
+        self.job_queue.handlers[REFRESH_USER] = self.metadata_refresher.refresh_users
+        self.job_queue.handlers[ADD_MEMBERSHIPS] = lambda user_ids: leaderboards.add_memberships(self.guilds, user_ids)
+        self.job_queue.start()
+
+        if os.environ.get('SYNC_COMMANDS_ON_STARTUP'):
+            # only changed scopes, so restart without command changes makes no sync requests
+            synced = await sync_changed(self.tree)
+            print(f"Commands synced on startup: {synced or 'nothing changed'}")  # TODO logging
+
+    async def close(self) -> None:
+        if self.metadata_refresher:
+            await self.metadata_refresher.stop()
+        if self.job_queue:
+            await self.job_queue.stop()
+        if self.token_service:
+            await self.token_service.stop()
+        await get_http_pool().close()
+        await super().close()
+
     async def on_ready(self) -> None:
         print(f"Logged in as {self.user} (ID: {self.user.id})")   # TODO logging
 
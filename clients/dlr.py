@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import os
+
+from functools import cache
+
+from dlr_light_api import Client as DLRClient
+from dlr_light_api.datatypes import DiscordToken
+
+from services import metrics
+
+from .http import JsonApi, get_http_pool
+
+
+@cache
+def get_dlr_client() -> DLRClient:
+    """Shared Discord linked roles client, created on first use (after environment is loaded)."""
+    client = DLRClient(
+        client_id=os.environ['DLR_CLIENT_ID'],
+        client_secret=os.environ['DLR_CLIENT_SECRET'],
+        redirect_uri=os.environ['DLR_REDIRECT_URI'],
+        discord_token=os.environ['BOT_TOKEN']
+    )
+    return metrics.instrument(client, 'discord')
+
+
+@cache
+def get_discord_api() -> JsonApi:
+    return JsonApi(get_http_pool(), os.environ.get('DISCORD_API_URL', 'https://discord.com/api/v10'))
+
+
+async def get_metadata(token: DiscordToken) -> dict:
+    """Linked role metadata of the user (empty if never pushed), over shared pool."""
+    with metrics.upstream.time('discord', 'get_metadata'):
+        role_connection = await get_discord_api().get(
+            f"users/@me/applications/{os.environ['DLR_CLIENT_ID']}/role-connection",
+            headers={'Authorization': f'Bearer {token.access_token}'},
+        )
+    return role_connection.get('metadata') or {}
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import os
+
+from functools import cache
+from typing import Any
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+from .resilience import timeout
+
+
+class HttpPool:
+    """Application-wide aiohttp session: keep-alive connections with per-host limit and cached DNS.
+
+    Session is created on first use, inside running event loop. `stats` shows how many requests reused a pooled
+    connection instead of opening a new one (TCP + TLS handshake).
+    """
+
+    def __init__(
+            self,
+            limit: int = 100,
+            limit_per_host: int = 20,
+            ttl_dns_cache: int = 300,
+            keepalive_timeout: float = 30,
+            timeout: ClientTimeout = ClientTimeout(total=30, connect=5),
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+
+        self._session: ClientSession | None = None
+
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = ClientSession(connector=connector, timeout=self.timeout, trace_configs=[self._trace()])
+        return self._session
+
+    def _trace(self) -> TraceConfig:
+        trace = TraceConfig()
+
+        async def on_request_start(*_: Any) -> None:
+            self.requests += 1
+
+        async def on_connection_create_end(*_: Any) -> None:
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(*_: Any) -> None:
+            self.connections_reused += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        connector = self._session and self._session.connector
+        in_use = len(connector._acquired) if connector else 0  # noqa, no public api for it
+        connections = self.connections_created + self.connections_reused
+        return {
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': self.connections_reused / connections if connections else 0.0,
+            'in_use': in_use,
+            'utilization': in_use / self.limit if self.limit else 0.0,
+        }
+
+
+@cache
+def get_http_pool() -> HttpPool:
+    """Shared pool, created on first use (after environment is loaded)."""
+    return HttpPool(
+        limit=int(os.environ.get('HTTP_LIMIT', 100)),
+        limit_per_host=int(os.environ.get('HTTP_LIMIT_PER_HOST', 20)),
+        ttl_dns_cache=int(os.environ.get('HTTP_DNS_TTL', 300)),
+        keepalive_timeout=float(os.environ.get('HTTP_KEEPALIVE', 30)),
+        timeout=ClientTimeout(
+            total=float(os.environ.get('HTTP_TIMEOUT', 30)),
+            connect=float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5)),
+        ),
+    )
+
+
+class ApiRequest:
+    """One step of `go()` call chain: attributes and positional arguments are path segments, keywords are query
+    params. `id(1)` is just `1`, as in `ShikiClient`.
+    """
+
+    def __init__(self, api: JsonApi, path: tuple = (), params: dict | None = None):
+        self._api, self._path, self._params = api, path, params or {}
+
+    def __getattr__(self, name: str) -> ApiRequest:
+        return ApiRequest(self._api, self._path + (name, ), self._params)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> ApiRequest:
+        return ApiRequest(self._api, self._path + args, {**self._params, **kwargs})
+
+    def id(self, value: Any) -> ApiRequest:
+        return ApiRequest(self._api, self._path + (value, ), self._params)
+
+    async def get(self) -> Any:
+        return await self._api.get('/'.join(str(segment) for segment in self._path), self._params)
+
+
+class JsonApi:
+    """JSON API over shared pool, with the same `go()` call chain as `ShikiClient`.
+
+    `go().users.id(1).anime_rates(page=1, limit=50).get()` is `GET {base_url}/users/1/anime_rates?page=1&limit=50`.
+    """
+
+    def __init__(self, pool: HttpPool, base_url: str, headers: dict[str, str] | None = None):
+        self.pool = pool
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+
+    def go(self) -> ApiRequest:
+        return ApiRequest(self)
+
+    async def get(self, path: str, params: dict | None = None, headers: dict[str, str] | None = None) -> Any:
+        return await self.request('GET', path, params=params, headers=headers)
+
+    async def request(
+            self,
+            method: str,
+            path: str,
+            params: dict | None = None,
+            headers: dict[str, str] | None = None,
+            **kwargs: Any,  # `json`, `data`, see `ClientSession.request`
+    ) -> Any:
+        async with timeout(), self.pool.session.request(
+                method,
+                f'{self.base_url}/{path.lstrip("/")}',
+                params=params,
+                headers={**self.headers, **(headers or {})},
+                raise_for_status=True,
+                **kwargs,
+        ) as response:
+            return await response.json()
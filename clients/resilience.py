@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from time import monotonic
+from typing import Any, Awaitable, Callable, Iterator
+
+_deadline: ContextVar[float | None] = ContextVar('deadline', default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left until deadline of current task, None if there is no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - monotonic()
+
+
+def expired() -> bool:
+    """Deadline of current task has passed."""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def set_deadline(seconds: float) -> Token:
+    """Deadline for current task and everything it awaits or spawns. Earlier (outer) deadline is never extended."""
+    deadline = monotonic() + seconds
+    if (outer := _deadline.get()) is not None:
+        deadline = min(deadline, outer)
+    return _deadline.set(deadline)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Tasks spawned inside are not bound by deadline of current task (work shared with other callers)."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def timeout() -> asyncio.Timeout:
+    """`async with timeout():` raises `TimeoutError` if the block is still running at deadline of current task."""
+    left = remaining()
+    return asyncio.timeout(None if left is None else max(left, 0))
+
+
+class CircuitOpenError(Exception):
+    """Upstream is considered unhealthy, the call was not made."""
+
+
+class CircuitBreaker:
+    """Fails fast while upstream is unhealthy.
+
+    Opens after `failure_threshold` consecutive failures, then every call is rejected for `reset_timeout`. After
+    that one trial call is let through (half-open): success closes the circuit, failure opens it for another
+    `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_at: float | None = None
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'open' if monotonic() - self._opened_at < self.reset_timeout else 'half-open'
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+
+        now = monotonic()
+        # trial call which never finished (e.g. cancelled) does not block the circuit forever
+        if now - self._opened_at < self.reset_timeout or (self._trial_at and now - self._trial_at < self.reset_timeout):
+            self.rejected += 1
+            return False
+
+        self._trial_at = now
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = self._trial_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._trial_at is not None or (self._opened_at is None and self._failures >= self.failure_threshold):
+            self.opened += 1
+            self._opened_at = monotonic()
+            self._trial_at = None
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {'state': self.state, 'opened': self.opened, 'rejected': self.rejected}
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful calls."""
+
+    def __init__(self, window: int = 200, min_samples: int = 50):
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """None until there are `min_samples` latencies."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[int(q * (len(latencies) - 1))]
+
+
+class Hedger:
+    """Hedged requests: if a call is slower than `quantile` of recent latencies, the same call is sent once more and
+    the first successful answer wins (the other one is cancelled). Only for idempotent calls.
+    """
+
+    def __init__(self, tracker: LatencyTracker | None = None, quantile: float = 0.95, min_delay: float = 0.05):
+        self.tracker = tracker or LatencyTracker()
+        self.quantile = quantile
+        self.min_delay = min_delay
+
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @property
+    def delay(self) -> float | None:
+        latency = self.tracker.quantile(self.quantile)
+        return None if latency is None else max(latency, self.min_delay)
+
+    async def run(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        if (delay := self.delay) is None:
+            return await func()
+
+        first = asyncio.ensure_future(func())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            self.hedged += 1
+            pending.add(asyncio.ensure_future(func()))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is not first
+                        return task.result()
+            return first.result()  # both failed, raises error of the first one
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {'delay': self.delay, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from functools import cache
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from aiohttp import ClientError, ClientResponseError
+
+from shikimori_extended_api import Client as ShikiClient
+from shikimori_extended_api.datatypes import ShikiToken
+
+from services import metrics
+
+from .http import JsonApi, get_http_pool
+from .resilience import CircuitBreaker, CircuitOpenError, Hedger, expired, no_deadline, timeout
+from .singleflight import SingleFlight
+
+REDIRECT_URI = 'https://impda.duckdns.org:500/shikimori-oauth-callback'
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # slash commands, autocomplete, oauth callbacks - somebody is waiting for an answer
+    BACKGROUND = 1  # catalog sync, watch time, bulk refreshes
+
+
+def retry_after(value: str | None, default: float) -> float:
+    """Seconds from `Retry-After` header, which is either seconds or HTTP date; `default` if it can not be parsed."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period  # tokens per second
+        self._tokens = float(capacity)
+        self._updated = monotonic()
+
+    @classmethod
+    def share(cls, budget: int, period: float, processes: int) -> TokenBucket:
+        """Bucket of one of `processes` processes spending `budget` requests per `period` together: rates add up to
+        the budget, and so do bursts of all of them at once.
+        """
+        capacity = max(budget // processes, 1)
+        return cls(capacity, period * capacity * processes / budget)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds to wait until next token is available."""
+        self._refill(now)
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self._tokens -= 1
+
+
+class RateLimiter:
+    """Hands out permits to call upstream, respecting all buckets at once.
+
+    Waiters are queued in lanes by priority; a permit always goes to the oldest waiter of the most important
+    non-empty lane, so background work only gets the capacity interactive requests leave unused.
+    """
+
+    def __init__(self, *buckets: TokenBucket):
+        self._buckets = buckets
+        self._lanes: dict[Priority, deque[asyncio.Future]] = {priority: deque() for priority in Priority}
+        self._blocked_until = 0.0
+        self._dispatcher: asyncio.Task | None = None
+
+        self._acquired = {priority: 0 for priority in Priority}
+        self._wait_total = {priority: 0.0 for priority in Priority}
+        self._wait_max = {priority: 0.0 for priority in Priority}
+        self.backoffs = 0
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        lane = self._lanes[priority]
+        lane.append(waiter)
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        started = monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in lane:
+                lane.remove(waiter)
+            raise
+
+        waited = monotonic() - started
+        self._acquired[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def back_off(self, seconds: float) -> None:
+        """Stop handing out permits for `seconds` (e.g. after 429 with Retry-After)."""
+        self.backoffs += 1
+        self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+
+    async def _dispatch(self) -> None:
+        while lane := self._next_lane():
+            now = monotonic()
+            delay = max(self._blocked_until - now, *(bucket.delay(now) for bucket in self._buckets))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # more important waiter may have arrived meanwhile
+
+            waiter = lane.popleft()
+            for bucket in self._buckets:
+                bucket.consume(now)
+            waiter.set_result(None)
+
+    def _next_lane(self) -> deque[asyncio.Future] | None:
+        for priority in Priority:
+            lane = self._lanes[priority]
+            while lane and lane[0].done():  # cancelled waiters
+                lane.popleft()
+            if lane:
+                return lane
+        return None
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            'backoffs': self.backoffs,
+            'lanes': {
+                priority.name.lower(): {
+                    'queue_depth': len(self._lanes[priority]),
+                    'acquired': self._acquired[priority],
+                    'wait_avg': self._wait_total[priority] / (self._acquired[priority] or 1),
+                    'wait_max': self._wait_max[priority],
+                }
+                for priority in Priority
+            },
+        }
+
+
+class ShikiGateway:
+    """The only way to talk to Shikimori: every call goes through shared rate limiter.
+
+    Methods mirror `ShikiClient`; anything not covered can be called with `request`. Concurrent identical lookups
+    of users and animes with the same priority are coalesced into one upstream call (see `_lookup`). Public
+    (no token) lookups go through `api`, if given, to share pooled connections (see `clients.http`); OAuth and token
+    calls always go through `client`.
+
+    Every call, waiting for rate limiter included, ends by deadline of current task (see `clients.resilience`). While
+    Shikimori keeps failing (errors and its own timeouts, not deadlines of callers), calls fail fast with
+    `CircuitOpenError`. Interactive idempotent lookups are hedged.
+    """
+
+    def __init__(
+            self,
+            client: ShikiClient,
+            limiter: RateLimiter,
+            max_retries: int = 3,
+            api: JsonApi | None = None,
+            breaker: CircuitBreaker | None = None,
+            hedger: Hedger | None = None,
+    ):
+        self.client = client
+        self.api = api or client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.hedger = hedger or Hedger()
+        self.single_flight = SingleFlight()
+
+    async def request(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            *args: Any,
+            priority: Priority = Priority.INTERACTIVE,
+            idempotent: bool = False,
+            endpoint: str | None = None,
+            **kwargs: Any
+    ) -> Any:
+        endpoint = endpoint or func.__name__
+        async with timeout():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if idempotent and priority == Priority.INTERACTIVE:
+                        return await self.hedger.run(lambda: self._call(func, args, kwargs, priority, endpoint))
+                    return await self._call(func, args, kwargs, priority, endpoint)
+                except ClientResponseError as e:
+                    if e.status != 429 or attempt == self.max_retries:
+                        raise
+                    self.limiter.back_off(retry_after(e.headers and e.headers.get('Retry-After'), 2 ** attempt))
+
+    async def _call(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            args: tuple,
+            kwargs: dict,
+            priority: Priority,
+            endpoint: str
+    ) -> Any:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Shikimori is unavailable")
+
+        await self.limiter.acquire(priority)
+        started = monotonic()
+        try:
+            with metrics.upstream.time('shikimori', endpoint):
+                result = await func(*args, **kwargs)
+        except ClientResponseError as e:
+            if e.status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # answered, so it is alive
+            raise
+        except (ClientError, TimeoutError):
+            if not expired():  # caller ran out of its own deadline, that says nothing about upstream
+                self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        self.hedger.tracker.add(monotonic() - started)
+        return result
+
+    async def _lookup(self, func: Callable[[], Awaitable[Any]], priority: Priority, endpoint: str, *key: Any) -> Any:
+        """Idempotent lookup shared by concurrent callers with the same endpoint, `key` and priority (interactive
+        callers never wait in background lane). Shared call runs without deadline of the caller which started it,
+        so it is not cut short for the others; every caller waits for it until its own deadline.
+        """
+        async with timeout():
+            with no_deadline():
+                return await self.single_flight.do(
+                    (endpoint, *key, priority),
+                    self.request, func, priority=priority, idempotent=True, endpoint=endpoint
+                )
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            'limiter': self.limiter.stats,
+            'breaker': self.breaker.stats,
+            'hedger': self.hedger.stats,
+            'single_flight': self.single_flight.stats,
+        }
+
+    @property
+    def auth_url(self) -> str:
+        return self.client.auth_url
+
+    async def get_access_token(self, code: str) -> ShikiToken:
+        return await self.request(self.client.get_access_token, code)
+
+    async def refresh_token(self, token: ShikiToken, priority: Priority = Priority.INTERACTIVE) -> ShikiToken:
+        return await self.request(self.client.refresh_token, token, priority=priority)
+
+    async def get_current_user_info(self, token: ShikiToken) -> dict:
+        return await self.request(self.client.get_current_user_info, token)
+
+    async def get_user_info(self, user_id: int, priority: Priority = Priority.INTERACTIVE) -> dict:
+        return await self._lookup(
+            lambda: self.api.go().users.id(user_id).info.get(), priority, 'get_user_info', user_id
+        )
+
+    async def get_user(self, user_id: int, priority: Priority = Priority.INTERACTIVE) -> dict:
+        """/api/users/:id, includes stats"""
+        return await self._lookup(
+            lambda: self.api.go().users.id(user_id).get(), priority, 'get_user', user_id
+        )
+
+    async def search_users(self, query: str, limit: int) -> list[dict]:
+        return await self._lookup(
+            lambda: self.api.go().users(search=query, limit=limit).get(),
+            Priority.INTERACTIVE, 'search_users', query, limit
+        )
+
+    async def get_anime(self, anime_id: int, priority: Priority = Priority.INTERACTIVE) -> dict:
+        return await self._lookup(
+            lambda: self.api.go().animes.id(anime_id).get(), priority, 'get_anime', anime_id
+        )
+
+    async def search_animes(self, query: str, limit: int) -> list[dict]:
+        return await self._lookup(
+            lambda: self.api.go().animes(search=query, limit=limit).get(),
+            Priority.INTERACTIVE, 'search_animes', query, limit
+        )
+
+    async def list_animes(self, page: int, limit: int, order: str = 'id') -> list[dict]:
+        return await self.request(
+            lambda: self.api.go().animes(page=page, limit=limit, order=order).get(),
+            priority=Priority.BACKGROUND, endpoint='list_animes'
+        )
+
+    async def get_anime_rates(
+            self,
+            user_id: int,
+            page: int,
+            limit: int,
+            status: str | None = None,
+            priority: Priority = Priority.BACKGROUND
+    ) -> list[dict]:
+        """/api/users/:id/anime_rates, only rates with `status` if it is given"""
+        params = {'page': page, 'limit': limit, **({'status': status} if status else {})}
+        return await self.request(
+            lambda: self.api.go().users.id(user_id).anime_rates(**params).get(),
+            priority=priority, idempotent=True, endpoint='get_anime_rates'
+        )
+
+
+@cache
+def get_shiki_gateway() -> ShikiGateway:
+    """Shared gateway, created on first use (after environment is loaded)."""
+    application_name = os.environ['SHIKI_APPLICATION_NAME']
+    client = ShikiClient(
+        application_name=application_name,
+        client_id=os.environ['SHIKI_CLIENT_ID'],
+        client_secret=os.environ['SHIKI_CLIENT_SECRET'],
+        redirect_uri=REDIRECT_URI
+    )
+    # https://shikimori.me/api/doc - 5rps and 90rpm per application, every process using it gets its share
+    processes = int(os.environ.get('SHIKI_PROCESSES', 1))
+    limiter = RateLimiter(
+        TokenBucket.share(int(os.environ.get('SHIKI_RPS', 5)), 1, processes),
+        TokenBucket.share(int(os.environ.get('SHIKI_RPM', 90)), 60, processes),
+    )
+    api = JsonApi(
+        get_http_pool(),
+        os.environ.get('SHIKI_BASE_URL', 'https://shikimori.me/api'),
+        headers={'User-Agent': application_name},  # required by shikimori
+    )
+    return ShikiGateway(client, limiter, api=api)
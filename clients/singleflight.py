@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one.
+
+    While a call for `key` is in flight, other callers with the same key wait for it and get the same result (or
+    exception) instead of starting their own. A caller being cancelled does not cancel the call, unless it was the
+    last one waiting for it. Nothing is cached after the call is finished.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+        self.calls = 0  # really executed
+        self.shared = 0  # answered by somebody else's call
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        if (task := self._calls.get(key)) is not None:
+            self.shared += 1
+        else:
+            task = asyncio.create_task(func(*args, **kwargs))
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self._calls[key] = task
+            self.calls += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # one of the callers being cancelled must not cancel the call for everybody else
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():  # the last caller was cancelled, nobody needs the result
+                    self._forget(key, task)
+                    task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.done() and not task.cancelled():
+            task.exception()  # mark as retrieved, all callers may be gone already
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'in_flight': len(self._calls),
+            'calls': self.calls,
+            'shared': self.shared,
+        }
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Any
+
+from discord import Interaction, InteractionResponse, InteractionType, app_commands, ui
+from discord.utils import utcnow
+
+from services import metrics
+
+KINDS = {
+    InteractionType.application_command: 'command',
+    InteractionType.autocomplete: 'autocomplete',
+    InteractionType.component: 'component',
+    InteractionType.modal_submit: 'modal',
+}
+
+
+class TimedResponse(InteractionResponse):
+    """Observes time from creation of the interaction (by discord) to its first response."""
+
+    __slots__ = ('_labels', )
+
+    def __init__(self, parent: Interaction, labels: tuple[str, str]):
+        super().__init__(parent)
+        self._labels = labels
+
+    def _observe(self) -> None:
+        metrics.time_to_defer.observe((utcnow() - self._parent.created_at).total_seconds(), *self._labels)
+
+    async def defer(self, *args: Any, **kwargs: Any) -> Any:
+        result = await super().defer(*args, **kwargs)
+        self._observe()
+        return result
+
+    async def send_message(self, *args: Any, **kwargs: Any) -> Any:
+        result = await super().send_message(*args, **kwargs)
+        self._observe()
+        return result
+
+    async def edit_message(self, *args: Any, **kwargs: Any) -> Any:
+        result = await super().edit_message(*args, **kwargs)
+        self._observe()
+        return result
+
+    async def send_modal(self, *args: Any, **kwargs: Any) -> Any:
+        result = await super().send_modal(*args, **kwargs)
+        self._observe()
+        return result
+
+    async def autocomplete(self, *args: Any, **kwargs: Any) -> Any:
+        result = await super().autocomplete(*args, **kwargs)
+        self._observe()
+        return result
+
+
+def _instrument(interaction: Interaction, name: str) -> tuple[str, str]:
+    labels = KINDS.get(interaction.type, 'other'), name
+    interaction._cs_response = TimedResponse(interaction, labels)  # noqa, `Interaction.response` is cached there
+    return labels
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """Command tree timing first response and complete handling of every app command, context menu and autocomplete
+    (see `services.metrics`).
+    """
+
+    async def _call(self, interaction: Interaction) -> None:
+        if not metrics.enabled:
+            return await super()._call(interaction)
+
+        command = interaction.command
+        labels = _instrument(interaction, command.qualified_name if command else interaction.data.get('name', ''))
+        started = perf_counter()
+        try:
+            await super()._call(interaction)
+        finally:
+            status = 'error' if interaction.command_failed else 'ok'
+            metrics.time_to_response.observe(perf_counter() - started, *labels, status)
+
+
+class InstrumentedView(ui.View):
+    """View timing its interactions like `InstrumentedTree` does, labeled by class name of the view."""
+
+    async def _scheduled_task(self, item: ui.Item, interaction: Interaction) -> None:
+        if not metrics.enabled:
+            return await super()._scheduled_task(item, interaction)
+
+        labels = _instrument(interaction, type(self).__name__)
+        with metrics.time_to_response.time(*labels):
+            await super()._scheduled_task(item, interaction)
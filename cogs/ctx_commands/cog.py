@@ -1,8 +1,11 @@
 from discord import Interaction, Member
 from discord.ext.commands import Cog, Bot
-from discord.app_commands import ContextMenu
+from discord.app_commands import AppCommandError, ContextMenu
 
-from data.models import UserModel
+from clients.resilience import CircuitOpenError
+from cogs.shiki_commands.cog import UNAVAILABLE_MESSAGE, title_index
+from cogs.shiki_commands.compare import compare_members
+from data.profiles import get_profile
 
 
 class ContextMenuCog(Cog):
@@ -21,19 +24,35 @@ class ContextMenuCog(Cog):
         open_profile_ctx_command.error(coro=self.open_profile_error)
         self.bot.tree.add_command(open_profile_ctx_command)
 
+        compare_ctx_command = ContextMenu(
+            name="Сравнить со мной",
+            callback=self.compare_with_me,
+            guild_ids=[922919845450903573, 1115512510519443458],  # TODO discord.Object
+        )
+        compare_ctx_command.error(coro=self.compare_with_me_error)
+        self.bot.tree.add_command(compare_ctx_command)
+
     async def open_profile(self, interaction: Interaction, member: Member):
-        user_data: UserModel = await UserModel.get(discord_user_id=interaction.user.id)
-        if not user_data.shikimori_user_id:
+        profile = await get_profile(member.id)
+        if not profile.shiki_id:
             return await interaction.response.send_message(
                 f"{member.mention} не связал профиль Шикимори с дискордом",
                 ephemeral=True
             )
 
         await interaction.response.send_message(
-            f"Ссылка на Шикимори профиль {member.mention}: https://shikimori.me/{user_data.shikimori_nickname}",
+            f"Ссылка на Шикимори профиль {member.mention}: https://shikimori.me/{profile.shiki_nickname}",
             suppress_embeds=True,
             ephemeral=True,
         )
 
     async def open_profile_error(self, interaction: Interaction, error):
         print(error)  # TODO logging
+
+    async def compare_with_me(self, interaction: Interaction, member: Member):
+        await compare_members(interaction, interaction.user, member, title_index)
+
+    async def compare_with_me_error(self, interaction: Interaction, error: AppCommandError):
+        print(error)  # TODO logging
+        if isinstance(error.__cause__, (TimeoutError, CircuitOpenError)):
+            await interaction.edit_original_response(content=UNAVAILABLE_MESSAGE)
@@ -1,5 +1,3 @@
-import os
-
 from discord import Interaction
 
 from discord.ext import commands
@@ -7,8 +5,7 @@ from discord.ext import commands
 from discord.app_commands import guilds, command, AppCommandError
 from discord.app_commands.checks import has_permissions
 
-from dlr_light_api import Client as DLRClient
-
+from clients.dlr import get_dlr_client
 from data.datatypes import ShikiMetadata
 
 
@@ -20,14 +17,7 @@ class ManageCog(commands.GroupCog, group_name='shikimori_manage', group_descript
     async def register_dlr_schema(self, interaction: Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)  # noqa
 
-        dlr_client = DLRClient(
-            client_id=os.environ['DLR_CLIENT_ID'],
-            client_secret=os.environ['DLR_CLIENT_SECRET'],
-            redirect_uri=os.environ['DLR_REDIRECT_URI'],
-            discord_token=os.environ['BOT_TOKEN']
-        )
-
-        response = await dlr_client.register_metadata_schema(ShikiMetadata)  # noqa
+        response = await get_dlr_client().register_metadata_schema(ShikiMetadata)  # noqa
         if response == ShikiMetadata.to_schema():
             await interaction.edit_original_response(content="Успешно обновлено!")
         else:
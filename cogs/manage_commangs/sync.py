@@ -1,27 +1,88 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from typing import Literal, Optional
+
+from discord import Object, app_commands
 from discord.ext.commands import command, Context, Cog
 from discord.app_commands.checks import has_permissions
 
+from data.models import CommandSyncModel
+
+GLOBAL_SCOPE = 0
+
+
+def tree_scopes(tree: app_commands.CommandTree) -> set[int]:
+    """Guilds with commands of their own, and global scope."""
+    guild_ids = set(tree._guild_commands) | {guild_id for _, guild_id, _ in tree._context_menus}  # noqa, no public api
+    return {GLOBAL_SCOPE} | {guild_id for guild_id in guild_ids if guild_id is not None}
+
+
+def tree_hash(tree: app_commands.CommandTree, scope: int) -> str:
+    """Stable hash of commands of the scope, as they are sent to Discord on sync."""
+    guild = Object(id=scope) if scope != GLOBAL_SCOPE else None
+    payload = sorted(
+        (c.to_dict() for c in tree.get_commands(guild=guild)),
+        key=lambda c: (c.get('type', 1), c['name'])
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+
+async def sync_changed(
+        tree: app_commands.CommandTree,
+        scopes: set[int] | None = None,
+        force: bool = False
+) -> dict[int, int]:
+    """Sync only scopes which commands changed since last sync, returns number of synced commands per synced scope.
+
+    Scopes synced before but having no commands now are synced too, to remove commands from Discord.
+    """
+    synced_before = {s.scope: s.hash for s in await CommandSyncModel.all()}
+    if scopes is None:
+        scopes = tree_scopes(tree) | set(synced_before)
+
+    synced = {}
+    for scope in sorted(scopes):
+        hash_ = tree_hash(tree, scope)
+        if not force and synced_before.get(scope) == hash_:
+            continue
+
+        commands = await tree.sync(guild=Object(id=scope) if scope != GLOBAL_SCOPE else None)
+        await CommandSyncModel.update_or_create(scope=scope, defaults={'hash': hash_})
+        synced[scope] = len(commands)
+
+    return synced
+
+
+def _report(synced: dict[int, int]) -> str:
+    if not synced:
+        return "Nothing changed, no sync needed"
+    return "\n".join(
+        f"Synced {count} commands {'globally' if scope == GLOBAL_SCOPE else f'in guild {scope}'}"
+        for scope, count in synced.items()
+    )
+
 
 class SyncCog(Cog):
     # TODO description
 
     @command()
     @has_permissions(administrator=True)
-    async def sync(self, ctx: Context) -> None:
-        fmt = await ctx.bot.tree.sync()
+    async def sync(self, ctx: Context, mode: Optional[Literal['force']] = None) -> None:
+        """`!sync` syncs changed scopes only, `!sync force` syncs all of them."""
+        synced = await sync_changed(ctx.bot.tree, force=mode == 'force')
 
-        await ctx.send(
-            f"Synced {len(fmt)} commands globally"
-        )
+        await ctx.send(_report(synced))
 
     @command(name='synchere')
     @has_permissions(administrator=True)
-    async def sync_here(self, ctx: Context) -> None:
-        fmt = await ctx.bot.tree.sync(guild=ctx.guild)
+    async def sync_here(self, ctx: Context, mode: Optional[Literal['force']] = None) -> None:
+        """`!synchere` syncs this guild if its commands changed, `!synchere force` syncs it anyway."""
+        synced = await sync_changed(ctx.bot.tree, scopes={ctx.guild.id}, force=mode == 'force')
 
-        await ctx.send(
-            f"Synced {len(fmt)} commands in {ctx.guild}"
-        )
+        await ctx.send(_report(synced))
 
     @sync.error
     async def sync_error(self, ctx: Context, error):
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+
+from datetime import datetime
+from time import monotonic
+from typing import Awaitable, Callable, NamedTuple
+
+from discord import Embed
+
+from clients.shiki import Priority
+from clients.singleflight import SingleFlight
+from data.cache import TTLCache
+
+ROOT_URL = 'https://shikimori.me'
+
+# how long anime details are considered fresh, depends on `status`
+FRESH_TTL = {
+    'released': 24 * 60 * 60,  # almost never changes
+    'ongoing': 10 * 60,  # new episodes, score changes
+    'anons': 60 * 60,
+}
+DEFAULT_FRESH_TTL = 60 * 60
+STALE_TTL = 7 * 24 * 60 * 60  # how long stale details can be shown while refreshing in background
+
+
+def field_value(text: str) -> str:
+    return text[:1024-3] + "..." if len(text) > 1024 else text
+
+
+def anime_embed(anime_info: dict) -> Embed:
+    embed = Embed(
+        title=f"{anime_info['russian']}\n{anime_info['japanese']}",
+        url=f"{ROOT_URL}{anime_info['url']}",
+    )
+    embed.set_image(url=f"{ROOT_URL}{anime_info['image']['original']}")  # original / preview (?^?)
+
+    if not (score := float(anime_info.get('score', 0))):
+        scores = anime_info.get('rates_scores_stats', [{'name': 0, 'value': 1}])
+        score = sum([int(r['name']) * int(r['value']) for r in scores]) / sum([int(r['value']) for r in scores])
+    embed.add_field(name="Оценка", value=f"{score:.2f}")
+
+    if anime_info.get('status', '') == 'released':
+        episodes = f"{anime_info.get('episodes', '-')} (завершено)"
+    else:
+        episodes = f"{anime_info.get('episodes_aired', '-')} / {anime_info.get('episodes', '-')}"
+    embed.add_field(name="Эпизоды", value=episodes)
+
+    embed.add_field(name="Длительность", value=f"{anime_info.get('duration', '-')} мин")
+
+    genres = ', '.join([g['russian'] for g in anime_info.get('genres', [])]) or "-"
+    embed.add_field(name="Жанры", value=genres)
+
+    rating = anime_info.get('rating').replace('_', '-').upper() or "-"
+    embed.add_field(name="Рейтинг", value=rating)
+
+    embed.add_field(name="Описание", value=field_value(anime_info.get('description', "-")), inline=False)
+
+    embed.set_footer(text="shikimori.me", icon_url='https://shikimori.me/favicons/favicon-192x192.png')
+    return embed
+
+
+class CachedAnime(NamedTuple):
+    fresh_until: float
+    embed: dict  # `Embed.to_dict()`, everything is already computed and formatted
+
+
+class AnimeCache:
+    """Anime details rendered into embeds.
+
+    Fresh entries are served as is. Stale entries (older than TTL for their status) are still served immediately,
+    but refreshed in background (stale-while-revalidate), so only the very first request for an anime waits for
+    Shikimori.
+    """
+
+    def __init__(self, fetch: Callable[..., Awaitable[dict]], maxsize: int = 2048):
+        self._fetch = fetch  # fetch(anime_id, priority=...)
+        self._cache = TTLCache(maxsize=maxsize)
+        self._loading = SingleFlight()
+        self._refreshes: set[asyncio.Task] = set()
+
+        self.stale_hits = 0
+
+    async def get(self, anime_id: int) -> Embed:
+        entry: CachedAnime | None = self._cache.get(anime_id)
+        if entry is None:
+            entry = await self._loading.do(anime_id, self._load, anime_id, Priority.INTERACTIVE)
+        elif entry.fresh_until < monotonic():
+            self.stale_hits += 1
+            self._refresh(anime_id)
+
+        embed = Embed.from_dict(entry.embed)
+        embed.timestamp = datetime.now()
+        return embed
+
+    def _refresh(self, anime_id: int) -> None:
+        if anime_id in self._loading:
+            return
+
+        task = asyncio.create_task(self._loading.do(anime_id, self._load, anime_id, Priority.BACKGROUND))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshed)
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Error refreshing anime: {task.exception()}")  # TODO logging, stale entry is kept
+
+    async def _load(self, anime_id: int, priority: Priority) -> CachedAnime:
+        anime_info = await self._fetch(anime_id, priority=priority)
+
+        fresh_ttl = FRESH_TTL.get(anime_info.get('status'), DEFAULT_FRESH_TTL)
+        entry = CachedAnime(fresh_until=monotonic() + fresh_ttl, embed=anime_embed(anime_info).to_dict())
+        self._cache.set(anime_id, entry, ttl=fresh_ttl + STALE_TTL)
+        return entry
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {**self._cache.stats, 'stale_hits': self.stale_hits, 'refreshing': len(self._loading)}
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Awaitable, Callable
+
+from clients.shiki import Priority
+
+from .anime import ROOT_URL
+from .title_index import TitleIndex
+
+# `None` is the whole list
+RATE_STATUSES = (None, 'watching', 'completed', 'planned', 'on_hold', 'dropped', 'rewatching')
+STATUS_NAMES = {
+    None: "Все",
+    'watching': "Смотрю",
+    'completed': "Просмотрено",
+    'planned': "Запланировано",
+    'on_hold': "Отложено",
+    'dropped': "Брошено",
+    'rewatching': "Пересматриваю",
+}
+
+
+def rate_line(rate: dict, titles: TitleIndex) -> str:
+    anime = rate['anime']
+    title = titles.get(anime['id'])
+    name = anime.get('russian') or anime.get('name') or (title and (title.russian or title.name)) or f"#{anime['id']}"
+    status = STATUS_NAMES.get(rate.get('status'), '?')
+    episodes = f"{rate.get('episodes', 0)}/{anime.get('episodes') or '?'}"
+    score = f", оценка {rate['score']}" if rate.get('score') else ""
+    return f"[{name}]({ROOT_URL}/animes/{anime['id']}) — {status}, {episodes}{score}"
+
+
+class RatesPager:
+    """Pages of user's anime rates (of one status, if given), requested from Shikimori only when needed.
+
+    At most `window` pages around the current one are kept: the one before it, and the next one, which is prefetched
+    as soon as a page is shown, so turning pages is served from memory. A user with thousands of rates costs
+    a few pages, never the whole list.
+    """
+
+    def __init__(
+            self,
+            fetch: Callable[..., Awaitable[list[dict]]],
+            shikimori_user_id: int,
+            status: str | None = None,
+            page_size: int = 10,
+            window: int = 3,
+    ):
+        self._fetch = fetch  # fetch(user_id, page=..., limit=..., status=..., priority=...)
+        self.shikimori_user_id = shikimori_user_id
+        self.status = status
+        self.page_size = page_size
+        self.window = window
+
+        self._pages: dict[int, asyncio.Task] = {}  # 1-based page number -> rates of the page
+        self.current = 1
+        self.last_page: int | None = None  # known after the first short page
+
+        self.fetched = 0
+        self.prefetch_hits = 0
+
+    def has_next(self) -> bool:
+        return self.last_page is None or self.current < self.last_page
+
+    def ready(self, number: int) -> bool:
+        """Page is in memory already, getting it makes no requests."""
+        task = self._pages.get(number)
+        return task is not None and task.done() and not task.cancelled() and not task.exception()
+
+    async def get(self, number: int) -> list[dict]:
+        if self.ready(number):
+            self.prefetch_hits += 1
+
+        self.current = number
+        rates = await asyncio.shield(self._load(number))
+        if self.has_next():
+            self._load(number + 1)
+        self._trim()
+        return rates
+
+    def _load(self, number: int) -> asyncio.Task:
+        task = self._pages.get(number)
+        if task is None or task.done() and (task.cancelled() or task.exception()):
+            task = self._pages[number] = asyncio.create_task(self._fetch_page(number))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # prefetch may never be awaited
+        return task
+
+    async def _fetch_page(self, number: int) -> list[dict]:
+        rates = await self._fetch(
+            self.shikimori_user_id, page=number, limit=self.page_size, status=self.status,
+            priority=Priority.INTERACTIVE
+        )
+        self.fetched += 1
+
+        # full page says nothing (shikimori may also return one extra rate to tell there are more)
+        if not rates and number > 1:
+            self._found_last(number - 1)
+        elif len(rates) < self.page_size:
+            self._found_last(number)
+        return rates[:self.page_size]
+
+    def _found_last(self, number: int) -> None:
+        self.last_page = number if self.last_page is None else min(self.last_page, number)
+
+    def _trim(self) -> None:
+        before = (self.window - 1) // 2
+        for number in list(self._pages):
+            if not self.current - before <= number < self.current - before + self.window:
+                self._pages.pop(number).cancel()
+
+    def close(self) -> None:
+        for task in self._pages.values():
+            task.cancel()
+        self._pages.clear()
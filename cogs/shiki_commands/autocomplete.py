@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Any, Awaitable, Callable, Hashable
+
+from discord import Interaction
+from discord.utils import utcnow
+
+from clients.resilience import CircuitOpenError
+
+RESPONSE_DEADLINE = 2.5  # discord waits 3 seconds for the first response (or autocomplete), time is left to send it
+COMMAND_DEADLINE = 10  # for deferred commands, nobody waits for an answer much longer
+
+
+def interaction_deadline(interaction: Interaction, budget: float) -> float:
+    """Seconds left from `budget` counted since interaction was created (by discord)."""
+    age = (utcnow() - interaction.created_at).total_seconds()
+    return max(budget - max(age, 0), 0.1)
+
+
+def autocomplete_key(interaction: Interaction, option: str) -> tuple[int, str | None, str]:
+    command = interaction.command.qualified_name if interaction.command else None
+    return interaction.user.id, command, option
+
+
+class AutocompleteRegistry:
+    """Keeps one in-flight lookup per key (user, command, option).
+
+    When a new autocomplete interaction arrives while the previous one for the same key is still running, the previous
+    one is cancelled: Discord shows only the latest suggestions anyway. With `debounce` the lookup waits a bit before
+    going upstream, so fast typing costs one request instead of one request per keystroke. Lookups which miss
+    deadline (see `interaction_deadline`) or hit unavailable Shikimori give `default` too: no suggestions is better
+    than failed interaction.
+    """
+
+    def __init__(self, debounce: float = 0.05):
+        self.debounce = debounce
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+        self.completed = 0
+        self.cancelled = 0
+        self.degraded = 0
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any, default: Any = None) -> Any:
+        """Run `func(*args)` for `key`, returns `default` if it was superseded by a newer call with the same key."""
+        if (previous := self._tasks.get(key)) and not previous.done():
+            previous.cancel()
+
+        task = asyncio.create_task(self._run(func, *args))
+        self._tasks[key] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():  # caller itself is cancelled, not superseded
+                raise
+            self.cancelled += 1
+            return default
+        except (TimeoutError, CircuitOpenError):
+            self.degraded += 1
+            return default
+        else:
+            self.completed += 1
+            return result
+        finally:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    async def _run(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        if self.debounce:
+            await asyncio.sleep(self.debounce)
+        return await func(*args)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'in_flight': len(self._tasks),
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'degraded': self.degraded,
+        }
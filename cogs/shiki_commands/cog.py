@@ -1,80 +1,139 @@
 # TODO get rid of globals
 
-import os
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 
 from aiohttp import ClientResponseError
-from discord import Interaction, Embed, app_commands
-from discord.app_commands import guilds, command, AppCommandError, describe
-from discord.ext import commands
+from discord import Guild, Interaction, Embed, Member, app_commands
+from discord.app_commands import guilds, command, AppCommandError, choices, describe, Choice
+from discord.ext import commands, tasks
 
-from dlr_light_api import Client as DLRClient
-from dlr_light_api.datatypes import DiscordToken
-
-from shikimori_extended_api import Client as ShikiClient
 from shikimori_extended_api.datatypes import ShikiToken
 
-from data.datatypes import ShikiMetadata
-from data.models import DiscordTokenModel, ShikiTokenModel, UserModel
-
-from .views import CheckAuthorizationView
-
-ROOT_URL = 'https://shikimori.me'
-
-
-# https://stackoverflow.com/questions/48255244/python-check-if-a-string-contains-cyrillic-characters
-def contains_cyrillic(string: str) -> bool:
-    return len(string.encode("ascii", "ignore")) < len(string)
-
-
-def field_value(text: str) -> str:
-    return text[:1024-3] + "..." if len(text) > 1024 else text
-
-
-shiki_client = ShikiClient(
-    application_name=os.environ['SHIKI_APPLICATION_NAME'],
-    client_id=os.environ['SHIKI_CLIENT_ID'],
-    client_secret=os.environ['SHIKI_CLIENT_SECRET'],
-    redirect_uri='https://impda.duckdns.org:500/shikimori-oauth-callback'
+from clients.dlr import get_dlr_client, get_metadata
+from clients.resilience import CircuitOpenError, set_deadline
+from clients.shiki import get_shiki_gateway
+from data.models import AnimeRateModel, AnimeTitleModel, CheckpointModel, DiscordTokenModel, ShikiTokenModel
+from data.profiles import get_profile, profile_cache
+from data.users import get_user
+from services import watch_time
+from services.auth_status import AuthStatus, auth_status_cache
+from services.leaderboard import STATS, leaderboards
+from services.metadata import enqueue_push, metadata_of
+from services.refresher import enqueue_refresh
+from services.stats import anime_completed
+from services.tokens import get_token_service
+
+from .anime import AnimeCache
+from .autocomplete import (
+    COMMAND_DEADLINE, RESPONSE_DEADLINE, AutocompleteRegistry, autocomplete_key, interaction_deadline
 )
+from .compare import compare_members
+from .search import SearchCache, contains_cyrillic
+from .title_index import AnimeTitle, TitleIndex
+from .views import STAT_NAMES, AnimeListView, CheckAuthorizationView, LeaderboardView
 
-dlr_client = DLRClient(
-    client_id=os.environ['DLR_CLIENT_ID'],
-    client_secret=os.environ['DLR_CLIENT_SECRET'],
-    redirect_uri=os.environ['DLR_REDIRECT_URI'],
-    discord_token=os.environ['BOT_TOKEN']
-)
+SEARCH_LIMIT = 20  # real Discord limit is 25?
+TITLES_SYNC_INTERVAL = timedelta(hours=24)
+TITLES_PAGE_SIZE = 50  # max allowed by shikimori
+TITLES_CHECKPOINT = 'title_sync'
+UNAVAILABLE_MESSAGE = "Shikimori сейчас не отвечает, попробуйте позже"
 
 
-# TODO unify ShikiToken and DiscordToken
-def shiki_token_from_model(token_model: ShikiTokenModel) -> ShikiToken:
-    return ShikiToken(
-        access_token=token_model.access_token,
-        refresh_token=token_model.refresh_token,
-        expires_in=token_model.expires_in,
-        expires_at=token_model.expires_at
-    )
+shiki_client = get_shiki_gateway()
 
+dlr_client = get_dlr_client()
+token_service = get_token_service()
 
-def discord_token_from_model(token_model: DiscordTokenModel) -> DiscordToken:
-    return DiscordToken(
-        access_token=token_model.access_token,
-        refresh_token=token_model.refresh_token,
-        expires_in=token_model.expires_in,
-        expires_at=token_model.expires_at
-    )
+search_cache = SearchCache(limit=SEARCH_LIMIT)
+title_index = TitleIndex()
+anime_cache = AnimeCache(shiki_client.get_anime)
+autocompletes = AutocompleteRegistry(debounce=0.05)
 
 
 @guilds(922919845450903573, 1115512510519443458)
 class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...'):
     # TODO description
 
+    def __init__(self, background: bool = True):
+        """`background=False` for interactions workers: the catalog is synced by the main bot process, workers only
+        read it from the database.
+        """
+        super().__init__()
+        self.background = background
+
+    async def cog_load(self) -> None:
+        await self.load_title_index()
+        if self.background:
+            self.sync_title_index.start()
+        else:
+            self.reload_title_index.start()
+
+    async def cog_unload(self) -> None:
+        self.sync_title_index.cancel()
+        self.reload_title_index.cancel()
+
+    async def load_title_index(self) -> None:
+        rows = await AnimeTitleModel.all().values_list('id', 'name', 'russian', 'japanese', 'score')
+        title_index.rebuild(AnimeTitle(*row) for row in rows)
+
+    @tasks.loop(hours=1)
+    async def sync_title_index(self) -> None:
+        """Download whole anime catalog from shikimori into `AnimeTitleModel` and rebuild local title index.
+
+        Next page to download is saved after every page, unfinished sync continues from it (after restart too).
+        """
+        checkpoint, _ = await CheckpointModel.get_or_create(name=TITLES_CHECKPOINT)
+        if checkpoint.value.get('finished'):
+            if datetime.now() - datetime.fromisoformat(checkpoint.value['finished_at']) < TITLES_SYNC_INTERVAL:
+                return
+            checkpoint.value = {'page': 1, 'finished': False}
+
+        page = checkpoint.value.get('page', 1)
+        while animes := await shiki_client.list_animes(page=page, limit=TITLES_PAGE_SIZE, order='id'):
+            synced_at = datetime.now()
+            await AnimeTitleModel.bulk_create(
+                [
+                    AnimeTitleModel(
+                        id=anime['id'],
+                        name=anime['name'],
+                        russian=anime.get('russian'),
+                        japanese=(anime.get('japanese') or [None])[0],
+                        score=float(anime.get('score') or 0),
+                        synced_at=synced_at,
+                    )
+                    for anime in animes
+                ],
+                on_conflict=['id'],
+                update_fields=['name', 'russian', 'japanese', 'score', 'synced_at'],
+            )
+            page += 1
+            checkpoint.value = {'page': page, 'finished': False}
+            await checkpoint.save()
+
+        checkpoint.value = {'page': page, 'finished': True, 'finished_at': datetime.now().isoformat()}
+        await checkpoint.save()
+        await self.load_title_index()
+
+    @sync_title_index.error
+    async def sync_title_index_error(self, error: BaseException):
+        print(error)  # TODO logging
+
+    @tasks.loop(hours=1)
+    async def reload_title_index(self) -> None:
+        """Catalog synced by the main bot process, to keep the index of a worker fresh."""
+        if self.reload_title_index.current_loop:  # loaded in `cog_load` already
+            await self.load_title_index()
+
+    @reload_title_index.error
+    async def reload_title_index_error(self, error: BaseException):
+        print(error)  # TODO logging
+
     # TODO move check authorization to token functionality
     async def check_shiki_authorization(self, shiki_token: ShikiTokenModel | ShikiToken) -> bool:
-        if isinstance(shiki_token, ShikiTokenModel):
-            shiki_token = shiki_token_from_model(shiki_token)
-
         try:
+            if isinstance(shiki_token, ShikiTokenModel):
+                shiki_token = await token_service.shiki_token(shiki_token)
             user_info = await shiki_client.get_current_user_info(shiki_token)
         except ClientResponseError:
             user_info = None
@@ -83,26 +142,43 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
 
     # TODO move check authorization to token functionality
     async def check_discord_authorization(self, discord_token: DiscordTokenModel) -> bool:
-        if isinstance(discord_token, DiscordTokenModel):
-            discord_token = discord_token_from_model(discord_token)
-
-        metadata = await dlr_client.get_metadata(discord_token)
+        try:
+            if isinstance(discord_token, DiscordTokenModel):
+                discord_token = await token_service.discord_token(discord_token)
+            metadata = await get_metadata(discord_token)
+        except ClientResponseError:
+            metadata = None
 
         return True if metadata else False
 
     def _made_message(self, shiki_auth: bool, discord_auth: bool) -> str:
         return f"{'✅' if shiki_auth else '❎'} Shikimori\n{'✅' if discord_auth else '❎'} Discord"
 
-    @command(description="Проверить авторизацию")
-    async def check_auth(self, interaction: Interaction):
-        user = await UserModel.get_or_none(discord_user_id=interaction.user.id)  # TODO preload tokens?
+    async def get_auth_status(self, discord_user_id: int) -> AuthStatus:
+        user = await get_user(discord_user_id)
         if not user:
-            return await interaction.response.send_message(self._made_message(False, False), ephemeral=True)
+            return AuthStatus(shikimori=False, discord=False)
 
-        shiki_auth = (token := await user.shikimori_token) and await self.check_shiki_authorization(token)
-        discord_auth = (token := await user.discord_token) and await self.check_discord_authorization(token)
+        async def shiki_auth() -> bool:
+            return bool((token := user.shikimori_token) and await self.check_shiki_authorization(token))
 
-        await interaction.response.send_message(self._made_message(shiki_auth, discord_auth), ephemeral=True)
+        async def discord_auth() -> bool:
+            return bool((token := user.discord_token) and await self.check_discord_authorization(token))
+
+        return AuthStatus(*await asyncio.gather(shiki_auth(), discord_auth()))
+
+    @command(description="Проверить авторизацию")
+    async def check_auth(self, interaction: Interaction):
+        status = auth_status_cache.get(interaction.user.id)
+        if status is None:
+            set_deadline(interaction_deadline(interaction, RESPONSE_DEADLINE))
+            try:
+                status = await self.get_auth_status(interaction.user.id)
+            except (TimeoutError, CircuitOpenError):
+                return await interaction.response.send_message(UNAVAILABLE_MESSAGE, ephemeral=True)  # noqa
+            auth_status_cache.set(interaction.user.id, status)
+
+        await interaction.response.send_message(self._made_message(*status), ephemeral=True)
 
     @command(name='authorize', description="Авторизоваться")
     async def authorize(self, interaction: Interaction):
@@ -115,10 +191,10 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
         )
 
     @command(name='update', description="Обновить информацию")
-    @describe(update_watch_time="Обновить время просмотра тоже (долго!)")
+    @describe(update_watch_time="Обновить время просмотра тоже (в первый раз считается в фоне)")
     async def update(self, interaction: Interaction, update_watch_time: bool = False):
         await interaction.response.defer(thinking=True, ephemeral=True)  # noqa
-        user_data = await UserModel.get_or_none(discord_user_id=interaction.user.id)
+        user_data = await get_user(interaction.user.id)
 
         if not user_data:
             return await interaction.edit_original_response(content="Пользователь не найден")  # never authorized
@@ -127,53 +203,102 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
         # so to check if user still granted access to shiki account
         # if not = do not update and delete from database
 
-        updated_shiki_user_info = await shiki_client.go().users.id(user_data.shikimori_user_id).get()
+        updated_shiki_user_info = await shiki_client.get_user(user_data.shikimori_user_id)
 
-        duration = await shiki_client.fetch_total_watch_time(updated_shiki_user_info['id']) if update_watch_time \
-            else 0  # float, minutes
+        if update_watch_time and not await AnimeRateModel.exists(shikimori_user_id=user_data.shikimori_user_id):
+            # first count requests every title of the list, it may take longer than the interaction lives
+            await enqueue_refresh(interaction.user.id)
+            await interaction.edit_original_response(content="Время просмотра считается в фоне, это займёт время")
+            update_watch_time = False
 
-        # find out amount of anime completed
-        anime_completed = 0
-        rate_groups = updated_shiki_user_info['stats']['statuses']['anime']
-        for rate_group in rate_groups:
-            if rate_group['name'] == 'completed':
-                anime_completed = rate_group['size']
-                break
+        if update_watch_time:
+            total_hours = int(await watch_time.update_watch_time(shiki_client, updated_shiki_user_info['id']) // 60)
+        else:
+            total_hours = user_data.total_hours
 
         # update data in database
-        user_data = await user_data.update_from_dict({
+        await user_data.update_from_dict({
             'shikimori_nickname': updated_shiki_user_info['nickname'],
-            'anime_watched': anime_completed,
-            'total_hours': duration,
-        })
-
-        discord_token_data = await DiscordTokenModel.get_or_none(user_id=interaction.user.id)
-        if not discord_token_data:
-            return interaction.edit_original_response(content="Нет привязки дискорда, обновление невозможно")
-
-        # convert from database format to `DiscordToken`
-        discord_token = discord_token_from_model(discord_token_data)
-        if discord_token.is_expired:  # update token if expired and save new one in database
-            discord_token = await dlr_client.refresh_token(discord_token)
-            await discord_token_data.update_from_dict({
-                'access_token': discord_token.access_token,
-                'refresh_token': discord_token.refresh_token,
-                'expires_in': int(discord_token.expires_in.total_seconds()),
-                'expires_at': discord_token.expires_at,
-            })
-
-        # create metadata and push it to discord server
-        metadata = ShikiMetadata(
-            platform_username=user_data.shikimori_nickname,
-            titles_watched=user_data.anime_watched,
-            hours_watching=user_data.total_hours
-        )
-        await dlr_client.push_metadata(discord_token, metadata)
+            'anime_watched': anime_completed(updated_shiki_user_info),
+            'total_hours': total_hours,
+            'refreshed_at': datetime.now(),
+        }).save()
+        profile_cache.put_user(interaction.user.id, user_data)
+        leaderboards.update_user(user_data)
+        if interaction.guild_id:
+            await leaderboards.add_member(interaction.guild_id, user_data)  # may have linked after joining the guild
+
+        if not user_data.discord_token:
+            return await interaction.edit_original_response(content="Нет привязки дискорда, обновление невозможно")
+
+        # normally token is already refreshed by token service
+        discord_token = await token_service.discord_token(user_data.discord_token)
+
+        # push metadata to discord server, if it fails - job queue will retry
+        try:
+            await dlr_client.push_metadata(discord_token, metadata_of(user_data))
+        except Exception as e:
+            print(f"Error pushing metadata of {interaction.user.id}, retrying in background: {e}")  # TODO logging
+            await enqueue_push(interaction.user.id)
+
+    @command(name='leaderboard', description="Рейтинг участников сервера")
+    @describe(stat="По чему составить рейтинг")
+    @choices(stat=[Choice(name=STAT_NAMES[stat], value=stat) for stat in STATS])
+    async def leaderboard(self, interaction: Interaction, stat: str = STATS[0]):
+        if not interaction.guild_id:
+            return await interaction.response.send_message("Рейтинг есть только на серверах", ephemeral=True)  # noqa
+
+        await interaction.response.defer(thinking=True)  # noqa
+        board = await leaderboards.board(interaction.guild_id)
+        view = LeaderboardView(board, stat, interaction.user.id)
+        await interaction.edit_original_response(embed=view.embed(), view=view)
+
+    @command(name='list', description="Показать список аниме пользователя")
+    @describe(member="Чей список показать (по умолчанию ваш)")
+    async def anime_list(self, interaction: Interaction, member: Member | None = None):
+        member = member or interaction.user
+        profile = await get_profile(member.id)
+        if not profile.shiki_id:
+            return await interaction.response.send_message(  # noqa
+                f"{member.mention} не связал профиль Шикимори с дискордом", ephemeral=True
+            )
+
+        await interaction.response.defer(thinking=True)  # noqa
+        set_deadline(interaction_deadline(interaction, COMMAND_DEADLINE))
+
+        view = AnimeListView(shiki_client.get_anime_rates, profile.shiki_id, profile.shiki_nickname, title_index)
+        await interaction.edit_original_response(embed=await view.embed(), view=view)
+
+    @command(name='compare', description="Сравнить списки аниме двух пользователей")
+    @describe(first="Первый пользователь", second="Второй пользователь (по умолчанию вы)")
+    async def compare(self, interaction: Interaction, first: Member, second: Member | None = None):
+        await compare_members(interaction, first, second or interaction.user, title_index)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: Guild):
+        await leaderboards.sync_guilds([guild])
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: Guild):
+        await leaderboards.sync_guilds([guild])
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: Guild):
+        await leaderboards.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: Member):
+        await leaderboards.add_member(member.guild.id, await get_user(member.id, with_tokens=False))
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: Member):
+        await leaderboards.remove_member(member.guild.id, member.id)
 
     @command(name='user', description="Показать информацию о пользователе")
     async def get_user_info(self, interaction: Interaction, name_or_id: str):
         """/api/users/:id/info or /api/users?search=:nickname"""
         await interaction.response.defer(thinking=True)
+        set_deadline(interaction_deadline(interaction, COMMAND_DEADLINE))
 
         shiki_id = int(name_or_id)
         user_info = await shiki_client.get_user_info(shiki_id)
@@ -202,73 +327,75 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
     async def name_or_id_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
         global shiki_client
 
+        set_deadline(interaction_deadline(interaction, RESPONSE_DEADLINE))
+        key = autocomplete_key(interaction, 'name_or_id')
+
         if current.isdigit():
-            user = await shiki_client.get_user_info(int(current))
-            return [app_commands.Choice(name=user['nickname'], value=str(user['id'])), ]
+            user = await autocompletes.run(key, shiki_client.get_user_info, int(current))
+            return [app_commands.Choice(name=user['nickname'], value=str(user['id'])), ] if user else []
 
         if len(current) < 3:
             return []
 
-        users = await shiki_client.go().users(search=current.lower(), limit=20).get()  # real Discord limit is 25?
+        users = search_cache.get('users', current, fields=('nickname', ))
+        if users is None:
+            users = await autocompletes.run(key, self._search_users, current, default=[])
+
         return [app_commands.Choice(name=user['nickname'], value=str(user['id'])) for user in users]
 
     @command(name='anime', description="Показать информацию об аниме")
     async def get_anime_info(self, interaction: Interaction, name_or_id: str):
         """/api/animes/:id or /api/animes?search=:name"""
         await interaction.response.defer(thinking=True)
+        set_deadline(interaction_deadline(interaction, COMMAND_DEADLINE))
 
         anime_id = int(name_or_id)
 
-        anime_info = await shiki_client.get_anime(anime_id)
-
-        embed = Embed(
-            title=f"{anime_info['russian']}\n{anime_info['japanese']}",
-            url=f"{ROOT_URL}{anime_info['url']}",
-            timestamp=datetime.now(),
-        )
-        embed.set_image(url=f"{ROOT_URL}{anime_info['image']['original']}")  # original / preview (?^?)
-
-        if not (score := float(anime_info.get('score', 0))):
-            scores = anime_info.get('rates_scores_stats', [{'name': 0, 'value': 1}])
-            score = sum([int(r['name']) * int(r['value']) for r in scores]) / sum([int(r['value']) for r in scores])
-        embed.add_field(name="Оценка", value=f"{score:.2f}")
-
-        if anime_info.get('status', '') == 'released':
-            episodes = f"{anime_info.get('episodes', '-')} (завершено)"
-        else:
-            episodes = f"{anime_info.get('episodes_aired', '-')} / {anime_info.get('episodes', '-')}"
-        embed.add_field(name="Эпизоды", value=episodes)
-
-        embed.add_field(name="Длительность", value=f"{anime_info.get('duration', '-')} мин")
-
-        genres = ', '.join([g['russian'] for g in anime_info.get('genres', [])]) or "-"
-        embed.add_field(name="Жанры", value=genres)
-
-        rating = anime_info.get('rating').replace('_', '-').upper() or "-"
-        embed.add_field(name="Рейтинг", value=rating)
-
-        embed.add_field(name="Описание", value=field_value(anime_info.get('description', "-")), inline=False)
-
-        embed.set_footer(text="shikimori.me", icon_url='https://shikimori.me/favicons/favicon-192x192.png')
+        embed = await anime_cache.get(anime_id)
         await interaction.edit_original_response(embed=embed)
 
     @get_anime_info.autocomplete('name_or_id')
     async def name_or_id_autocomplete(self, interaction: Interaction, current: str) -> list[app_commands.Choice[str]]:
         global shiki_client
 
+        set_deadline(interaction_deadline(interaction, RESPONSE_DEADLINE))
+        key = autocomplete_key(interaction, 'name_or_id')
+
         if current.isdigit():
-            user = await shiki_client.get_anime(int(current))
-            return [app_commands.Choice(name=user['russian'], value=str(user['id'])), ]
+            if anime := title_index.get(int(current)):
+                return [app_commands.Choice(name=anime.russian or anime.name, value=str(anime.id)), ]
+
+            user = await autocompletes.run(key, shiki_client.get_anime, int(current))
+            return [app_commands.Choice(name=user['russian'], value=str(user['id'])), ] if user else []
+
+        if titles := title_index.search(current, limit=SEARCH_LIMIT):
+            if contains_cyrillic(current):
+                return [app_commands.Choice(name=t.russian or t.name, value=str(t.id)) for t in titles]
+            else:
+                return [app_commands.Choice(name=t.name, value=str(t.id)) for t in titles]
 
         if len(current) < 3:
             return []
 
-        animes = await shiki_client.go().animes(search=current.lower(), limit=20).get()  # real Discord limit is 25?
+        animes = search_cache.get('animes', current, fields=('name', 'russian'))
+        if animes is None:
+            animes = await autocompletes.run(key, self._search_animes, current, default=[])
+
         if contains_cyrillic(current):
             return [app_commands.Choice(name=anime['russian'], value=str(anime['id'])) for anime in animes]
         else:
             return [app_commands.Choice(name=anime['name'], value=str(anime['id'])) for anime in animes]
 
+    async def _search_users(self, query: str) -> list[dict]:
+        users = await shiki_client.search_users(query.lower(), limit=SEARCH_LIMIT)
+        search_cache.set('users', query, users)
+        return users
+
+    async def _search_animes(self, query: str) -> list[dict]:
+        animes = await shiki_client.search_animes(query.lower(), limit=SEARCH_LIMIT)
+        search_cache.set('animes', query, animes)
+        return animes
+
     @authorize.error
     async def authorize_error(self, interaction: Interaction, error: AppCommandError):
         print(error)
@@ -277,6 +404,22 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
     async def update_error(self, interaction: Interaction, error: AppCommandError):
         print(error)
 
+    @anime_list.error
+    async def anime_list_error(self, interaction: Interaction, error: AppCommandError):
+        print(error)  # TODO logging
+        if isinstance(error.__cause__, (TimeoutError, CircuitOpenError)):
+            await interaction.edit_original_response(content=UNAVAILABLE_MESSAGE)
+
+    @compare.error
+    async def compare_error(self, interaction: Interaction, error: AppCommandError):
+        print(error)  # TODO logging
+        if isinstance(error.__cause__, (TimeoutError, CircuitOpenError)):
+            await interaction.edit_original_response(content=UNAVAILABLE_MESSAGE)
+
+    @leaderboard.error
+    async def leaderboard_error(self, interaction: Interaction, error: AppCommandError):
+        print(error)  # TODO logging
+
     @check_auth.error
     async def check_auth_error(self, interaction: Interaction, error: AppCommandError):
         print(error)  # TODO logging
@@ -284,7 +427,11 @@ class ShikiCog(commands.GroupCog, group_name='shikimori', group_description='...
     @get_user_info.error
     async def get_user_info_error(self, interaction: Interaction, error: AppCommandError):
         print(error)  # TODO logging
+        if isinstance(error.__cause__, (TimeoutError, CircuitOpenError)):
+            await interaction.edit_original_response(content=UNAVAILABLE_MESSAGE)
 
     @get_anime_info.error
     async def get_anime_info_error(self, interaction: Interaction, error: AppCommandError):
         print(error)  # TODO logging
+        if isinstance(error.__cause__, (TimeoutError, CircuitOpenError)):
+            await interaction.edit_original_response(content=UNAVAILABLE_MESSAGE)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+
+from discord import Embed, Interaction, Member, User
+
+from clients.resilience import set_deadline
+from data.datatypes import UserProfile
+from data.profiles import get_profile
+from services.compare import Comparison, get_comparisons
+
+from .anime import ROOT_URL
+from .autocomplete import COMMAND_DEADLINE, interaction_deadline
+from .title_index import TitleIndex
+
+
+def comparison_embed(first: UserProfile, second: UserProfile, result: Comparison, titles: TitleIndex) -> Embed:
+    embed = Embed(title=f"{first.shiki_nickname} и {second.shiki_nickname}")
+
+    embed.add_field(
+        name="Общие тайтлы",
+        value=f"{result.shared} из {result.first_total} / {result.second_total} ({result.similarity:.0%} совпадения)",
+        inline=False,
+    )
+
+    if result.correlation is None:
+        correlation = f"Мало общих оценок ({result.scored})"
+    else:
+        correlation = f"{result.correlation:+.2f} по {result.scored} общим оценкам"
+    embed.add_field(name="Корреляция оценок", value=correlation, inline=False)
+
+    favorites = []
+    for anime_id in result.favorites:
+        title = titles.get(anime_id)
+        name = title and (title.russian or title.name) or f"#{anime_id}"
+        favorites.append(f"[{name}]({ROOT_URL}/animes/{anime_id})")
+    embed.add_field(name="Общие любимые", value='\n'.join(favorites) or "-", inline=False)
+
+    embed.set_footer(text="shikimori.me", icon_url='https://shikimori.me/favicons/favicon-192x192.png')
+    return embed
+
+
+async def compare_members(interaction: Interaction, first: Member | User, second: Member | User, titles: TitleIndex):
+    """Handler of `/shikimori compare` and of the context menu action."""
+    if first.id == second.id:
+        return await interaction.response.send_message("Нужны два разных пользователя", ephemeral=True)  # noqa
+
+    profiles = await asyncio.gather(get_profile(first.id), get_profile(second.id))
+    for member, profile in zip((first, second), profiles):
+        if not profile.shiki_id:
+            return await interaction.response.send_message(  # noqa
+                f"{member.mention} не связал профиль Шикимори с дискордом", ephemeral=True
+            )
+
+    await interaction.response.defer(thinking=True)  # noqa
+    set_deadline(interaction_deadline(interaction, COMMAND_DEADLINE))
+
+    result = await get_comparisons().compare(profiles[0].shiki_id, profiles[1].shiki_id)
+    await interaction.edit_original_response(embed=comparison_embed(*profiles, result, titles))
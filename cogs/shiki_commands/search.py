@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from data.cache import TTLCache
+
+
+# https://stackoverflow.com/questions/48255244/python-check-if-a-string-contains-cyrillic-characters
+def contains_cyrillic(string: str) -> bool:
+    return len(string.encode("ascii", "ignore")) < len(string)
+
+
+class SearchCache:
+    """Cache of autocomplete search results.
+
+    Results are keyed by search kind ('animes', 'users'), script of the query (cyrillic / latin) and normalized
+    query. If there is no entry for the query itself, but there is a cached result for one of its prefixes and that
+    result was not truncated by `limit`, it is filtered locally instead of asking Shikimori again:
+    "nar" -> "naru" needs only one request.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 600, limit: int = 20, min_length: int = 3):
+        self.limit = limit  # same `limit` must be used for upstream search, otherwise truncation is unknown
+        self.min_length = min_length
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    @staticmethod
+    def _key(kind: str, query: str) -> tuple[str, str, str]:
+        return kind, 'cyrillic' if contains_cyrillic(query) else 'latin', query
+
+    def get(self, kind: str, query: str, fields: tuple[str, ...]) -> list[dict] | None:
+        """Cached results for `query` or `None`. `fields` are used to filter results of a shorter prefix."""
+        query = self.normalize(query)
+
+        results = self._cache.peek(self._key(kind, query))
+        if results is not None:
+            self._cache.get(self._key(kind, query))  # refresh LRU position
+            self.hits += 1
+            return results
+
+        for end in range(len(query) - 1, self.min_length - 1, -1):
+            cached = self._cache.peek(self._key(kind, query[:end]))
+            if cached is None:
+                continue
+            if len(cached) >= self.limit:  # truncated, there may be matches which are not in the list
+                break
+
+            results = [r for r in cached if any(query in (r.get(field) or '').lower() for field in fields)]
+            self._cache.set(self._key(kind, query), results)
+            self.prefix_hits += 1
+            return results
+
+        self.misses += 1
+        return None
+
+    def set(self, kind: str, query: str, results: list[dict]) -> None:
+        self._cache.set(self._key(kind, self.normalize(query)), results)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'hits': self.hits,
+            'prefix_hits': self.prefix_hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'evictions': self._cache.evictions,
+        }
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import heapq
+
+from bisect import bisect_left
+from typing import Iterable, NamedTuple
+
+
+class AnimeTitle(NamedTuple):
+    id: int
+    name: str
+    russian: str | None = None
+    japanese: str | None = None
+    score: float = 0
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """In-memory search index over `name`, `russian` and `japanese` titles of anime.
+
+    Titles are ranked by score once, on `rebuild`, so every lookup only walks as much of the index as it needs to
+    find `limit` best matches. Titles starting with the query go first (sorted prefix list + precomputed top lists
+    for 1-3 characters), then titles containing the query (trigram postings, checked for a real substring).
+    The index is immutable between `rebuild` calls, so it can be rebuilt by a background job and swapped in at once.
+    """
+
+    TOP_DEPTH = 25  # length of precomputed top lists for short prefixes, must be >= any `limit` used
+    PREFIX_SCAN = 500  # max amount of titles checked in the sorted prefix list for one query
+
+    def __init__(self, titles: Iterable[AnimeTitle] = ()):
+        self._ranked: list[AnimeTitle] = []  # by score, position in this list is a "rank"
+        self._haystacks: list[str] = []  # rank -> all normalized titles joined by newline
+        self._ranks: dict[int, int] = {}  # id -> rank
+        self._trigrams: dict[str, list[int]] = {}  # trigram -> sorted ranks
+        self._short: dict[str, list[int]] = {}  # 1-3 characters prefix -> best ranks
+        self._prefixes: list[tuple[str, int]] = []  # sorted (normalized title, rank)
+
+        self.rebuild(titles)
+
+    def __len__(self) -> int:
+        return len(self._ranked)
+
+    def __contains__(self, anime_id: int) -> bool:
+        return anime_id in self._ranks
+
+    def get(self, anime_id: int) -> AnimeTitle | None:
+        rank = self._ranks.get(anime_id)
+        return None if rank is None else self._ranked[rank]
+
+    def rebuild(self, titles: Iterable[AnimeTitle]) -> None:
+        ranked = sorted({t.id: t for t in titles}.values(), key=lambda t: (-t.score, t.id))
+        keys = [tuple({normalize(t) for t in (title.name, title.russian, title.japanese) if t}) for title in ranked]
+
+        all_trigrams: dict[str, list[int]] = {}
+        short: dict[str, list[int]] = {}
+        prefixes: list[tuple[str, int]] = []
+
+        for rank, title_keys in enumerate(keys):  # ranks are increasing, so all lists are sorted
+            for trigram in {trigram for key in title_keys for trigram in trigrams(key)}:
+                all_trigrams.setdefault(trigram, []).append(rank)
+
+            for prefix in {key[:length] for key in title_keys for length in (1, 2, 3)}:
+                best = short.setdefault(prefix, [])
+                if len(best) < self.TOP_DEPTH:
+                    best.append(rank)
+
+            prefixes.extend((key, rank) for key in title_keys)
+
+        prefixes.sort()
+
+        # swap everything at once, searches in progress will see either old or new index
+        self._ranked, self._ranks = ranked, {t.id: rank for rank, t in enumerate(ranked)}
+        self._haystacks = ['\n'.join(title_keys) for title_keys in keys]
+        self._trigrams, self._short, self._prefixes = all_trigrams, short, prefixes
+
+    def search(self, query: str, limit: int = 20) -> list[AnimeTitle]:
+        query = normalize(query)
+        if not query:
+            return []
+
+        found = self._search_prefix(query, limit)
+        if len(found) < limit and len(query) >= 3:
+            found.extend(self._search_substring(query, limit - len(found), exclude=set(found)))
+
+        ranked = self._ranked
+        return [ranked[rank] for rank in found]
+
+    def _search_prefix(self, query: str, limit: int) -> list[int]:
+        if len(query) <= 3:
+            return self._short.get(query, [])[:limit]
+
+        found = set()
+        prefixes = self._prefixes
+        start = bisect_left(prefixes, (query, 0))
+        for position in range(start, min(len(prefixes), start + self.PREFIX_SCAN)):
+            key, rank = prefixes[position]
+            if not key.startswith(query):
+                break
+            found.add(rank)
+
+        return heapq.nsmallest(limit, found)
+
+    def _search_substring(self, query: str, limit: int, exclude: set[int]) -> list[int]:
+        postings = []
+        for trigram in trigrams(query):
+            ranks = self._trigrams.get(trigram)
+            if not ranks:
+                return []
+            postings.append(ranks)
+
+        # walk the shortest postings list from the best rank; trigrams may match in different places,
+        # so check for a real substring
+        found = []
+        haystacks = self._haystacks
+        for rank in min(postings, key=len):
+            if query in haystacks[rank] and rank not in exclude:
+                found.append(rank)
+                if len(found) >= limit:
+                    break
+
+        return found
@@ -1,24 +1,27 @@
-from discord import Interaction, ui, TextStyle
+from discord import ButtonStyle, Embed, Interaction, ui, TextStyle
 from discord.ui import Item
-from shikimori_extended_api.datatypes import ShikiToken
 
-from data.models import UserModel, ShikiTokenModel
+from clients.tree import InstrumentedView
+from data.profiles import get_profile
+from services.leaderboard import STATS, GuildLeaderboard
 
+from .anime import ROOT_URL
+from .anime_list import RATE_STATUSES, STATUS_NAMES, RatesPager, rate_line
+from .title_index import TitleIndex
 
-class CheckAuthorizationView(ui.View):
+STAT_NAMES = {'anime_watched': "Просмотрено аниме", 'total_hours': "Часов просмотра"}
+
+
+class CheckAuthorizationView(InstrumentedView):
     @ui.button(label="Проверить авторизацию")
     async def check_button(self, interaction: Interaction, button) -> None:
         # check if there is a fresh token in DB. If so: authorized
-        user: UserModel = await UserModel.get_or_none(discord_user_id=interaction.user.id)  # noqa
-        # shiki_id = shiki_users_vault.get(interaction.user.id).shiki_id
-        token_data: ShikiTokenModel = await user.shikimori_token
-        token = ShikiToken(
-            access_token=token_data.access_token,
-            refresh_token=token_data.refresh_token,
-            expires_in=token_data.expires_in,
-            expires_at=token_data.expires_at
-        )
-        if token and not token.is_expired:
+        # tokens are refreshed ahead of expiry by token service, expired one means refresh is not possible anymore
+        profile = await get_profile(interaction.user.id)
+        if not profile.is_shiki_authorized:  # cached profile may be older than authorization, check database
+            profile = await get_profile(interaction.user.id, refresh=True)
+
+        if profile.is_shiki_authorized:
             await interaction.response.send_message("Авторизован!", ephemeral=True)
         else:
             await interaction.response.send_message("Не авторизован!", ephemeral=True)
@@ -35,7 +38,7 @@ class AuthCodeModal(ui.Modal, title="Код авторизации"):
         self.stop()
 
 
-class AuthorizeView(ui.View):
+class AuthorizeView(InstrumentedView):
     def __init__(self):
         super().__init__()
         self.auth_code = None
@@ -49,3 +52,129 @@ class AuthorizeView(ui.View):
         self.stop()
 
     # TODO abort button
+
+
+class LeaderboardView(InstrumentedView):
+    """Guild leaderboard, only the shown page is rendered (a slice of sorted aggregates, see `GuildLeaderboard`)."""
+
+    PAGE_SIZE = 10
+
+    def __init__(self, board: GuildLeaderboard, stat: str, viewer_id: int):
+        super().__init__(timeout=5 * 60)
+        self.board = board
+        self.stat = stat
+        self.viewer_id = viewer_id
+        self.page = 0
+        self._update_buttons()
+
+    @property
+    def pages(self) -> int:
+        return max((len(self.board) + self.PAGE_SIZE - 1) // self.PAGE_SIZE, 1)
+
+    def embed(self) -> Embed:
+        offset = self.page * self.PAGE_SIZE
+        lines = [
+            f"**{offset + i}.** <@{entry.discord_user_id}> "
+            f"([{entry.shikimori_nickname}](https://shikimori.me/{entry.shikimori_nickname})) — "
+            f"{getattr(entry, self.stat)}"
+            for i, entry in enumerate(self.board.page(self.stat, offset, self.PAGE_SIZE), start=1)
+        ]
+        embed = Embed(title=STAT_NAMES[self.stat], description='\n'.join(lines) or "Пока никого нет")
+
+        rank = self.board.rank(self.stat, self.viewer_id)
+        footer = f"Страница {self.page + 1}/{self.pages}"
+        embed.set_footer(text=f"{footer} • Ваше место: {rank}" if rank else footer)
+        return embed
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+        self.switch_stat.label = STAT_NAMES[STATS[(STATS.index(self.stat) + 1) % len(STATS)]]
+
+    async def _show(self, interaction: Interaction) -> None:
+        self.page = min(self.page, self.pages - 1)  # board may have shrunk since last page
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @ui.button(label="◀", style=ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, button) -> None:
+        self.page -= 1
+        await self._show(interaction)
+
+    @ui.button(label="▶", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button) -> None:
+        self.page += 1
+        await self._show(interaction)
+
+    @ui.button(label="Сменить рейтинг", style=ButtonStyle.primary)
+    async def switch_stat(self, interaction: Interaction, button) -> None:
+        self.stat = STATS[(STATS.index(self.stat) + 1) % len(STATS)]
+        self.page = 0
+        await self._show(interaction)
+
+    async def on_error(self, interaction: Interaction, error: Exception, item: Item[any], /) -> None:
+        print(error)  # TODO logging
+
+
+class AnimeListView(InstrumentedView):
+    """Anime list of a user page by page, filtered by status; pages come from `RatesPager`."""
+
+    def __init__(self, fetch, shikimori_user_id: int, nickname: str, titles: TitleIndex):
+        super().__init__(timeout=10 * 60)
+        self.fetch = fetch
+        self.shikimori_user_id = shikimori_user_id
+        self.nickname = nickname
+        self.titles = titles
+        self.pager = RatesPager(fetch, shikimori_user_id)
+        self.page = 1
+
+    async def embed(self) -> Embed:
+        rates = await self.pager.get(self.page)
+        if not rates and self.page > 1:  # end of the list was not known before
+            self.page = self.pager.last_page or self.page - 1
+            rates = await self.pager.get(self.page)
+
+        offset = (self.page - 1) * self.pager.page_size
+        lines = [f"**{offset + i}.** {rate_line(rate, self.titles)}" for i, rate in enumerate(rates, start=1)]
+        embed = Embed(
+            title=f"{self.nickname}: {STATUS_NAMES[self.pager.status]}",
+            url=f"{ROOT_URL}/{self.nickname}/list/anime",
+            description='\n'.join(lines) or "Список пуст",
+        )
+        embed.set_footer(text=f"Страница {self.page}")
+
+        self.previous_page.disabled = self.page == 1
+        self.next_page.disabled = not self.pager.has_next()
+        self.switch_status.label = f"Фильтр: {STATUS_NAMES[self.pager.status]}"
+        return embed
+
+    async def _show(self, interaction: Interaction) -> None:
+        if self.pager.ready(self.page):  # prefetched, answer at once
+            return await interaction.response.edit_message(embed=await self.embed(), view=self)
+
+        await interaction.response.defer()
+        await interaction.edit_original_response(embed=await self.embed(), view=self)
+
+    @ui.button(label="◀", style=ButtonStyle.secondary, disabled=True)
+    async def previous_page(self, interaction: Interaction, button) -> None:
+        self.page -= 1
+        await self._show(interaction)
+
+    @ui.button(label="▶", style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button) -> None:
+        self.page += 1
+        await self._show(interaction)
+
+    @ui.button(label="Фильтр", style=ButtonStyle.primary)
+    async def switch_status(self, interaction: Interaction, button) -> None:
+        status = RATE_STATUSES[(RATE_STATUSES.index(self.pager.status) + 1) % len(RATE_STATUSES)]
+        self.pager.close()
+        self.pager = RatesPager(self.fetch, self.shikimori_user_id, status=status)
+        self.page = 1
+        await self._show(interaction)
+
+    async def on_timeout(self) -> None:
+        self.pager.close()
+
+    async def on_error(self, interaction: Interaction, error: Exception, item: Item[any], /) -> None:
+        print(error)  # TODO logging
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import os
+
+from tortoise import Tortoise, connections
+
+from services import metrics
+
+MODULES = {'models': ['data.models']}
+
+
+def db_url() -> str:
+    """Database url from environment (must be loaded): `DB_URL` as is (e.g. sqlite for local runs), or MySQL one."""
+    if url := os.environ.get('DB_URL'):
+        return url
+
+    host = os.environ['DB_HOST']
+    port = os.environ['DB_PORT']
+    user = os.environ['DB_USER']
+    password = os.environ['DB_PASS']
+    name = os.environ['DB_NAME']
+    return f'mysql://{user}:{password}@{host}:{port}/{name}'
+
+
+async def init_db() -> None:
+    await Tortoise.init(db_url=db_url(), modules=MODULES)
+    metrics.instrument_db(connections.get('default'))
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from dlr_light_api.datatypes import MetadataField, MetadataType, Metadata
 from pydantic import BaseModel
 
@@ -9,6 +11,16 @@ class ShikiUser(BaseModel):
     total_hours: int = 0
 
 
+class UserProfile(ShikiUser):
+    discord_user_id: int
+    shiki_token_expires_at: datetime = None
+    discord_token_expires_at: datetime = None
+
+    @property
+    def is_shiki_authorized(self) -> bool:
+        return self.shiki_token_expires_at is not None and self.shiki_token_expires_at > datetime.now()
+
+
 class ShikiMetadata(Metadata):
     platform_name: str = 'shikimori.me'
     titles_watched = MetadataField(MetadataType.INT_GTE, 'аниме просмотрено', 'или больше тайтлов')
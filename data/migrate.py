@@ -0,0 +1,170 @@
+"""Upgrade of a database created before unique indexes and new tables, run once with the bot and the server stopped.
+
+    python -m data.migrate
+
+Upserts (`data.users`) rely on unique indexes of `users.discord_user_id` and `*tokens.user_id`: without them every
+OAuth callback inserts one more row. Old databases have duplicates already, which would block adding the indexes,
+so they are merged first:
+- tokens: the newest row of a user is kept, users are pointed to it;
+- users: the newest row of a discord user is kept, empty fields of it are filled from older rows, guild
+  memberships are moved to it.
+
+Then the indexes are added. Missing columns of old tables are added before that, and missing tables are created
+(`generate_schemas`, safe). Every step checks the current state, so running it again changes nothing.
+"""
+from __future__ import annotations
+
+import asyncio
+
+from collections import defaultdict
+from typing import Any
+
+from dotenv import load_dotenv
+from tortoise import Tortoise, connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from .database import MODULES, db_url
+from .models import DiscordTokenModel, GuildMemberModel, ShikiTokenModel, TokenModel, UserModel
+
+# table -> column -> definition, for tables which existed before the column was added
+COLUMNS = {
+    'users': {'refreshed_at': 'DATETIME(6) NULL'},
+    'discordtokens': {'invalid': 'BOOL NOT NULL DEFAULT 0'},
+    'shikimoritokens': {'invalid': 'BOOL NOT NULL DEFAULT 0'},
+}
+INDEXES = {
+    'users': ['refreshed_at'],
+}
+UNIQUE = {
+    'users': 'discord_user_id',
+    'discordtokens': 'user_id',
+    'shikimoritokens': 'user_id',
+}
+USER_FIELDS = (
+    'shikimori_user_id', 'shikimori_nickname', 'anime_watched', 'total_hours', 'refreshed_at',
+    'discord_token_id', 'shikimori_token_id',
+)
+
+
+async def columns(connection: BaseDBAsyncClient, table: str) -> set[str]:
+    """Columns of the table, empty if there is no such table."""
+    if connection.capabilities.dialect == 'sqlite':
+        rows = await connection.execute_query_dict(f"PRAGMA table_info({table})")
+    else:
+        rows = await connection.execute_query_dict(
+            f"SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '{table}'"
+        )
+    return {row['name'] for row in rows}
+
+
+async def indexed(connection: BaseDBAsyncClient, table: str, unique: bool = False) -> set[str]:
+    """Columns of the table having an index of their own (unique one, if `unique`)."""
+    if connection.capabilities.dialect == 'sqlite':
+        result = set()
+        for index in await connection.execute_query_dict(f"PRAGMA index_list({table})"):
+            if unique and not index['unique']:
+                continue
+            index_columns = await connection.execute_query_dict(f"PRAGMA index_info('{index['name']}')")
+            if len(index_columns) == 1:
+                result.add(index_columns[0]['name'])
+        return result
+
+    rows = await connection.execute_query_dict(
+        f"SELECT INDEX_NAME AS index_name, COLUMN_NAME AS name, NON_UNIQUE AS non_unique "
+        f"FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '{table}'"
+    )
+    index_columns = defaultdict(list)
+    for row in rows:
+        if not (unique and row['non_unique']):
+            index_columns[row['index_name']].append(row['name'])
+    return {names[0] for names in index_columns.values() if len(names) == 1}
+
+
+async def add_columns(connection: BaseDBAsyncClient) -> None:
+    for table, definitions in COLUMNS.items():
+        if not (existing := await columns(connection, table)):
+            continue  # created by `generate_schemas` with all columns
+        for column, definition in definitions.items():
+            if column not in existing:
+                await connection.execute_script(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                print(f"Added {table}.{column}")
+        for column in INDEXES.get(table, ()):
+            if column not in await indexed(connection, table):
+                await connection.execute_script(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+                print(f"Added index of {table}.{column}")
+
+
+async def merge_tokens(model: type[TokenModel], user_field: str) -> None:
+    rows = await model.all().order_by('id').values_list('id', 'user_id')
+    ids_of = defaultdict(list)
+    for pk, user_id in rows:
+        ids_of[user_id].append(pk)
+
+    merged = 0
+    for ids in ids_of.values():
+        if len(ids) < 2:
+            continue
+        kept, duplicates = ids[-1], ids[:-1]  # newest one was written by the last authorization
+        await UserModel.filter(**{f'{user_field}__in': duplicates}).update(**{user_field: kept})
+        await model.filter(id__in=duplicates).delete()
+        merged += len(duplicates)
+    print(f"{model._meta.db_table}: {merged} duplicates merged")  # noqa
+
+
+async def merge_users() -> None:
+    rows = await UserModel.all().order_by('id').values('id', 'discord_user_id', *USER_FIELDS)
+    rows_of: dict[int, list[dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        rows_of[row['discord_user_id']].append(row)
+
+    merged = 0
+    for duplicates in rows_of.values():
+        if len(duplicates) < 2:
+            continue
+        *duplicates, kept = duplicates
+        fields = {}
+        for name in USER_FIELDS:
+            older = [row[name] for row in duplicates if row[name] is not None]
+            if kept[name] is None and older:
+                fields[name] = older[-1]
+        if fields:
+            await UserModel.filter(id=kept['id']).update(**fields)
+
+        duplicate_ids = [row['id'] for row in duplicates]
+        guilds = await GuildMemberModel.filter(user_id__in=duplicate_ids).values_list('guild_id', flat=True)
+        await GuildMemberModel.filter(user_id__in=duplicate_ids).delete()
+        await GuildMemberModel.bulk_create(
+            [GuildMemberModel(guild_id=guild_id, user_id=kept['id']) for guild_id in set(guilds)],
+            ignore_conflicts=True,
+        )
+        await UserModel.filter(id__in=duplicate_ids).delete()
+        merged += len(duplicate_ids)
+    print(f"users: {merged} duplicates merged")
+
+
+async def add_unique_indexes(connection: BaseDBAsyncClient) -> None:
+    for table, column in UNIQUE.items():
+        if column not in await indexed(connection, table, unique=True):
+            await connection.execute_script(f"CREATE UNIQUE INDEX uid_{table}_{column} ON {table} ({column})")
+            print(f"Added unique index of {table}.{column}")
+
+
+async def migrate() -> None:
+    await Tortoise.init(db_url=db_url(), modules=MODULES)
+    connection = connections.get('default')
+    try:
+        await add_columns(connection)
+        await Tortoise.generate_schemas(safe=True)
+
+        await merge_tokens(DiscordTokenModel, 'discord_token_id')
+        await merge_tokens(ShikiTokenModel, 'shikimori_token_id')
+        await merge_users()
+        await add_unique_indexes(connection)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    asyncio.run(migrate())
@@ -9,11 +9,12 @@ from tortoise import fields, Tortoise, run_async
 
 
 class TokenModel(Model):
-    user_id = fields.BigIntField()
+    user_id = fields.BigIntField(unique=True)
     access_token = fields.CharField(max_length=60)
     refresh_token = fields.CharField(max_length=60)
     expires_in = fields.IntField()
     expires_at = fields.data.DatetimeField()
+    invalid = fields.BooleanField(default=False)  # refresh was rejected for good, user has to authorize again
 
     def __str__(self):
         return f"{self.__name__}<{self.user_id}>"
@@ -22,6 +23,9 @@ class TokenModel(Model):
     def is_expired(self):
         return datetime.now() > self.expires_at
 
+    class Meta:
+        abstract = True
+
 
 class DiscordTokenModel(TokenModel):
     class Meta:
@@ -34,12 +38,13 @@ class ShikiTokenModel(TokenModel):
 
 
 class UserModel(Model):
-    discord_user_id = fields.BigIntField()
+    discord_user_id = fields.BigIntField(unique=True)
     shikimori_user_id = fields.IntField(null=True)
 
     shikimori_nickname = fields.CharField(max_length=255, null=True)  # TODO find out max length
     anime_watched = fields.IntField(null=True)
     total_hours = fields.IntField(null=True)
+    refreshed_at = fields.data.DatetimeField(null=True, index=True)  # last refresh of stats (or attempt to)
 
     discord_token = fields.ForeignKeyField('models.DiscordTokenModel', null=True)
     shikimori_token = fields.ForeignKeyField('models.ShikiTokenModel', null=True)
@@ -51,6 +56,109 @@ class UserModel(Model):
         table = 'users'
 
 
+class AnimeTitleModel(Model):
+    id = fields.IntField(pk=True)  # same as shikimori anime id
+    name = fields.CharField(max_length=255)
+    russian = fields.CharField(max_length=255, null=True)
+    japanese = fields.CharField(max_length=255, null=True)
+    score = fields.FloatField(default=0)
+    synced_at = fields.data.DatetimeField(index=True)
+
+    def __str__(self):
+        return f"AnimeTitle<{self.id}>"
+
+    class Meta:
+        table = 'animetitles'
+
+
+class AnimeRateModel(Model):
+    """Last known state of user's anime rate, used to recompute watch time only for changed rates."""
+    id = fields.IntField(pk=True)  # same as shikimori user rate id
+    shikimori_user_id = fields.IntField(index=True)
+    anime_id = fields.IntField()
+    status = fields.CharField(max_length=16)
+    score = fields.IntField(default=0)
+    episodes = fields.IntField(default=0)
+    rewatches = fields.IntField(default=0)
+    updated_at = fields.data.DatetimeField()
+    minutes = fields.FloatField(default=0)  # contribution of this rate to total watch time
+
+    def __str__(self):
+        return f"AnimeRate<{self.id}>"
+
+    class Meta:
+        table = 'animerates'
+
+
+class AnimeDurationModel(Model):
+    id = fields.IntField(pk=True)  # same as shikimori anime id
+    duration = fields.IntField()  # minutes per episode
+    episodes = fields.IntField()
+
+    def __str__(self):
+        return f"AnimeDuration<{self.id}>"
+
+    class Meta:
+        table = 'animedurations'
+
+
+class CheckpointModel(Model):
+    """Progress of long-running background jobs, to continue after restart."""
+    name = fields.CharField(max_length=64, pk=True)
+    value = fields.JSONField(default=dict)
+    updated_at = fields.data.DatetimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Checkpoint<{self.name}>"
+
+    class Meta:
+        table = 'checkpoints'
+
+
+class CommandSyncModel(Model):
+    """Hash of application commands last synced to Discord, per scope (guild id, 0 for global commands)."""
+    scope = fields.BigIntField(pk=True, generated=False)
+    hash = fields.CharField(max_length=64)
+    synced_at = fields.data.DatetimeField(auto_now=True)
+
+    def __str__(self):
+        return f"CommandSync<{self.scope}>"
+
+    class Meta:
+        table = 'commandsyncs'
+
+
+class JobModel(Model):
+    """Pending background job, one per kind and user (see `services.jobs`)."""
+    kind = fields.CharField(max_length=32)
+    user_id = fields.BigIntField()
+    enqueued_at = fields.data.DatetimeField()  # to detect job enqueued again while it was running
+    run_at = fields.data.DatetimeField(index=True)
+    locked_until = fields.data.DatetimeField(null=True)  # claimed by a worker, claim expires if worker died
+    attempts = fields.IntField(default=0)
+    last_error = fields.TextField(null=True)
+
+    def __str__(self):
+        return f"Job<{self.kind}, {self.user_id}>"
+
+    class Meta:
+        table = 'jobs'
+        unique_together = (('kind', 'user_id'),)
+
+
+class GuildMemberModel(Model):
+    """Linked user being a member of a guild, for guild leaderboards (see `services.leaderboard`)."""
+    guild_id = fields.BigIntField(index=True)
+    user = fields.ForeignKeyField('models.UserModel', related_name='guilds', on_delete=fields.CASCADE)
+
+    def __str__(self):
+        return f"GuildMember<{self.guild_id}, {self.user_id}>"  # noqa
+
+    class Meta:
+        table = 'guildmembers'
+        unique_together = (('guild_id', 'user'),)
+
+
 # import dotenv
 # dotenv.load_dotenv('../.env')
 #
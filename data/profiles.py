@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import os
+
+from .cache import TTLCache
+from .datatypes import UserProfile
+from .models import UserModel
+from .users import get_user
+
+
+def profile_from_user(discord_user_id: int, user: UserModel | None) -> UserProfile:
+    """Profile of the user, empty one (`shiki_id` is 0) if user is not in database."""
+    if not user:
+        return UserProfile(discord_user_id=discord_user_id)
+
+    return UserProfile(
+        discord_user_id=discord_user_id,
+        shiki_id=user.shikimori_user_id or 0,
+        shiki_nickname=user.shikimori_nickname or '',
+        anime_watched=user.anime_watched or 0,
+        total_hours=user.total_hours or 0,
+        shiki_token_expires_at=user.shikimori_token and user.shikimori_token.expires_at,
+        discord_token_expires_at=user.discord_token and user.discord_token.expires_at,
+    )
+
+
+class ProfileCache:
+    """Write-through cache of user profiles by discord user id.
+
+    Everything which changes a user in database must `put` new state here (or `invalidate` it). Users not linked
+    to shikimori are cached too, but for shorter time: they may authorize from the other process (OAuth callbacks),
+    unless the server runs in the same process (see `unified.py`).
+    """
+
+    def __init__(self, maxsize: int | None = None, ttl: float | None = None, negative_ttl: float = 60):
+        """`maxsize` and `ttl` default to `PROFILE_CACHE_SIZE` and `PROFILE_CACHE_TTL`, read on first use (after
+        environment is loaded, the module is imported before that).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: TTLCache | None = None
+
+    @property
+    def _cache(self) -> TTLCache:
+        if self._entries is None:
+            if self.maxsize is None:
+                self.maxsize = int(os.environ.get('PROFILE_CACHE_SIZE', 10_000))
+            if self.ttl is None:
+                self.ttl = float(os.environ.get('PROFILE_CACHE_TTL', 30 * 60))
+            self._entries = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        return self._entries
+
+    def get(self, discord_user_id: int) -> UserProfile | None:
+        return self._cache.get(discord_user_id)
+
+    def put(self, profile: UserProfile) -> UserProfile:
+        self._cache.set(profile.discord_user_id, profile, ttl=None if profile.shiki_id else self.negative_ttl)
+        return profile
+
+    def put_user(self, discord_user_id: int, user: UserModel | None) -> UserProfile:
+        """`user` must be loaded with tokens (see `get_user`)."""
+        return self.put(profile_from_user(discord_user_id, user))
+
+    def invalidate(self, discord_user_id: int) -> None:
+        self._cache.pop(discord_user_id)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats
+
+
+profile_cache = ProfileCache()
+
+
+async def get_profile(discord_user_id: int, refresh: bool = False) -> UserProfile:
+    """Profile from cache, or from database if it is not cached (or `refresh` is requested)."""
+    if not refresh and (profile := profile_cache.get(discord_user_id)):
+        return profile
+    return profile_cache.put_user(discord_user_id, await get_user(discord_user_id))
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import Any
+
+from .models import TokenModel, UserModel
+
+
+async def get_user(discord_user_id: int, with_tokens: bool = True) -> UserModel | None:
+    """User by unique `discord_user_id`, with both tokens loaded by the same query (LEFT JOIN)."""
+    query = UserModel.filter(discord_user_id=discord_user_id)
+    if with_tokens:
+        query = query.select_related('discord_token', 'shikimori_token')
+    return await query.first()
+
+
+async def upsert_users(users: list[dict[str, Any]], fields: list[str]) -> None:
+    """Insert or update users by `discord_user_id` in one statement.
+
+    Every dict must contain `discord_user_id` and all of `fields`, only `fields` are updated for existing users.
+    """
+    await UserModel.bulk_create(
+        [UserModel(**user) for user in users],
+        on_conflict=['discord_user_id'],
+        update_fields=fields,
+    )
+
+
+async def upsert_user(discord_user_id: int, **fields: Any) -> None:
+    await upsert_users([{'discord_user_id': discord_user_id, **fields}], list(fields))
+
+
+async def upsert_token(model: type[TokenModel], user_id: int, token_fields: dict[str, Any]) -> None:
+    """Insert or update token of the user in one statement (see `services.tokens.token_to_dict`)."""
+    await model.bulk_create(
+        [model(user_id=user_id, **token_fields)],
+        on_conflict=['user_id'],
+        update_fields=list(token_fields),
+    )
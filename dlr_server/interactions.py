@@ -0,0 +1,129 @@
+"""Interactions over HTTP: Discord POSTs interactions to `/interactions` instead of sending them through the gateway.
+
+Enabled by `DISCORD_PUBLIC_KEY` (public key of the application). Interactions are dispatched to the command tree of
+the same bot (`ShikiCog` and others), so any number of stateless workers can run behind a load balancer: each one
+logs in over REST only and never opens a gateway connection. Set "Interactions Endpoint URL" of the application to
+this route to switch Discord to it (then the gateway does not receive interactions anymore).
+
+Interactions are dispatched by type the way gateway dispatch does it (`ConnectionState.parse_interaction_create`):
+commands and autocompletes go to the tree, button/select presses and modal submits to views of the bot. Handlers
+answer with `interaction.response` through Discord REST API as usual; the HTTP request is answered with 202 once the
+first response was sent (or handling finished), within Discord's 3 seconds.
+
+Views (`LeaderboardView`, `AnimeListView`, `CheckAuthorizationView`...) live in memory of the worker which sent
+them, a press reaching another worker finds no view and fails. With several workers the load balancer must route
+interactions of one message to one worker (sticky routing, e.g. hashing `message.id` of component payloads and
+`id` of the rest), until views are made persistent with state encoded in `custom_id`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+
+from discord import Interaction
+from nacl.exceptions import BadSignatureError
+from nacl.signing import VerifyKey
+from quart import Blueprint, Response, request
+
+from clients.bot import ShikimoriBot
+
+PING = 1
+APPLICATION_COMMAND = 2
+MESSAGE_COMPONENT = 3
+AUTOCOMPLETE = 4
+MODAL_SUBMIT = 5
+PONG = 1
+RESPONSE_TIMEOUT = 2.8  # discord fails interaction not answered within 3 seconds
+
+blueprint = Blueprint('interactions', __name__)
+
+_bot: ShikimoriBot | None = None
+_verify_key: VerifyKey | None = None
+_tasks: set[asyncio.Task] = set()
+
+
+def attach(bot: ShikimoriBot) -> None:
+    """Dispatch interactions to the bot (running one in unified mode, REST-only one in worker mode)."""
+    global _bot
+    _bot = bot
+
+
+def verify_key() -> VerifyKey | None:
+    global _verify_key
+    if _verify_key is None and (public_key := os.environ.get('DISCORD_PUBLIC_KEY')):
+        _verify_key = VerifyKey(bytes.fromhex(public_key))
+    return _verify_key
+
+
+def verify(key: VerifyKey, signature: str, timestamp: str, body: bytes) -> bool:
+    try:
+        key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+        return True
+    except (BadSignatureError, ValueError):
+        return False
+
+
+@blueprint.route('/interactions', methods=['POST'])
+async def interactions():
+    if (key := verify_key()) is None or _bot is None:
+        return Response("Interactions endpoint is disabled", status=404)
+
+    body = await request.get_data()
+    signature = request.headers.get('X-Signature-Ed25519', '')
+    timestamp = request.headers.get('X-Signature-Timestamp', '')
+    if not verify(key, signature, timestamp, body):
+        return Response("Invalid request signature", status=401)
+
+    payload = json.loads(body)
+    if payload['type'] == PING:
+        return {'type': PONG}
+
+    interaction, task = dispatch(payload)
+    await _first_response(interaction, task)
+    return Response(status=202)
+
+
+def dispatch(payload: dict) -> tuple[Interaction, asyncio.Task | None]:
+    """Same as gateway dispatch does; returns the task of command handler (views schedule their callbacks)."""
+    state = _bot._connection  # noqa
+    interaction = Interaction(data=payload, state=state)
+    task = None
+
+    if payload['type'] in (APPLICATION_COMMAND, AUTOCOMPLETE):
+        task = asyncio.create_task(_bot.tree._call(interaction))  # noqa
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    elif payload['type'] == MESSAGE_COMPONENT:
+        data = payload['data']
+        state._view_store.dispatch_view(data['component_type'], data['custom_id'], interaction)  # noqa
+    elif payload['type'] == MODAL_SUBMIT:
+        data = payload['data']
+        state._view_store.dispatch_modal(data['custom_id'], interaction, data['components'])  # noqa
+
+    state.dispatch('interaction', interaction)
+    return interaction, task
+
+
+async def _first_response(interaction: Interaction, task: asyncio.Task | None, poll: float = 0.005) -> None:
+    deadline = asyncio.get_running_loop().time() + RESPONSE_TIMEOUT
+    while not (task and task.done()) and not interaction.response.is_done():
+        if asyncio.get_running_loop().time() > deadline:
+            return
+        await asyncio.sleep(poll)
+
+
+async def start_worker() -> None:
+    """Bot of an interactions worker: commands only, REST only."""
+    from main import create_bot  # loads environment
+
+    bot = await create_bot(background=False)
+    await bot.login(os.environ['BOT_TOKEN'])
+    attach(bot)
+
+
+async def stop_worker() -> None:
+    if _tasks:
+        await asyncio.wait(_tasks, timeout=RESPONSE_TIMEOUT)
+    if _bot is not None and _bot.background is False:
+        await _bot.close()
@@ -1,47 +1,54 @@
 import asyncio
+import importlib.util
 import os
 
-from quart import Quart, redirect, request, Response, make_response
-from quart.sessions import SecureCookieSessionInterface
+from dlr_light_api import Client as DLRClient
+from quart import Blueprint, Quart, redirect, request, Response, make_response
 
+import hypercorn.run
 from hypercorn import Config
-from hypercorn.asyncio import serve
 
-import tortoise.contrib.quart
+from tortoise import Tortoise
 
-from data.models import DiscordTokenModel, ShikiTokenModel, UserModel
-from data.datatypes import ShikiMetadata
+from data.database import init_db
+from data.models import DiscordTokenModel, ShikiTokenModel
+from data.profiles import profile_cache
+from data.users import get_user, upsert_token, upsert_user
 
-from shikimori_extended_api import Client as ShikiClient
-from dlr_light_api.datatypes import DiscordToken
-from dlr_light_api import Client
+from clients.dlr import get_dlr_client
+from clients.http import get_http_pool
+from clients.shiki import ShikiGateway, get_shiki_gateway
+from services import metrics
+from services.auth_status import auth_status_cache
+from services.jobs import JobQueue
+from services.leaderboard import enqueue_memberships, leaderboards
+from services.metadata import enqueue_push, get_job_queue
+from services.stats import anime_completed
+from services.tokens import token_to_dict
+from services.work_queue import WorkQueue
+
+from . import interactions
 
 import dotenv
 dotenv.load_dotenv()
-
-app = Quart(__name__)
-app.secret_key = os.environ.get('COOKIE_SECRET')
-session_serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+metrics.configure()
 
 REDIRECT_URL = 'https://discord.com/app'
+APPLICATION_PATH = 'dlr_server.main:create_app()'  # every hypercorn worker creates its own app
+
+routes = Blueprint('linked_roles', __name__)
+
+# set by `start_worker` in every worker process, nothing is connected at import time
+linked_role_client: DLRClient | None = None
 
+shiki_client: ShikiGateway | None = None
 
-linked_role_client = Client(
-    client_id=os.environ['DLR_CLIENT_ID'],
-    client_secret=os.environ['DLR_CLIENT_SECRET'],
-    redirect_uri=os.environ['DLR_REDIRECT_URI'],
-    discord_token=os.environ['BOT_TOKEN']
-)
+work_queue: WorkQueue | None = None
 
-shiki_client = ShikiClient(
-    application_name=os.environ['SHIKI_APPLICATION_NAME'],
-    client_id=os.environ['SHIKI_CLIENT_ID'],
-    client_secret=os.environ['SHIKI_CLIENT_SECRET'],
-    redirect_uri='https://impda.duckdns.org:500/shikimori-oauth-callback'
-)
+job_queue: JobQueue | None = None
 
 
-@app.route('/linked-role')
+@routes.route('/linked-role')
 async def linked_role():
     global linked_role_client
 
@@ -53,7 +60,7 @@ async def linked_role():
     return response
 
 
-@app.route('/discord-oauth-callback')
+@routes.route('/discord-oauth-callback')
 async def discord_oauth_callback():
     global linked_role_client
 
@@ -68,80 +75,36 @@ async def discord_oauth_callback():
         user_data = await linked_role_client.get_user_data(token)
         user_id = int(user_data['user']['id'])
 
-        token_data, _ = await DiscordTokenModel.update_or_create(
-            user_id=user_id,
-            defaults={
-                'access_token': token.access_token,
-                'refresh_token': token.refresh_token,
-                'expires_in': int(token.expires_in.total_seconds()),
-                'expires_at': token.expires_at,
-            }
-        )
-        await UserModel.update_or_create(
-            discord_user_id=user_id,
-            defaults={'discord_token_id': token_data.pk}
-        )
-
-        try:
-            await _update_metadata(user_id)  # must provide metadata to Discord!  # TODO flask.g
-        except Exception as e:
-            # if metadata not updated properly - just log it  # TODO logging
-            print('Error updating metadata after discord oauth callback:', e)
+        # only token is saved before redirect, everything else is done by work queue
+        await upsert_token(DiscordTokenModel, user_id, token_to_dict(token))
+        work_queue.submit(_after_discord_authorization, user_id)
 
         return redirect(REDIRECT_URL)
     except Exception as e:
         return Response(str(e), status=500)
 
 
-# @app.route('/update-metadata', methods=['POST'])
+async def _after_discord_authorization(discord_user_id: int):
+    token_data = await DiscordTokenModel.get(user_id=discord_user_id)
+    await upsert_user(discord_user_id, discord_token_id=token_data.pk)
+    auth_status_cache.invalidate(discord_user_id)
+    profile_cache.put_user(discord_user_id, await get_user(discord_user_id))  # read by the bot in unified mode
+
+    await enqueue_push(discord_user_id)  # must provide metadata to Discord!
+
+
+# @routes.route('/update-metadata', methods=['POST'])
 # async def update_metadata():
 #     try:
 #         user_id = int(request.form['userId'])
-#         await _update_metadata(user_id)
+#         await enqueue_push(user_id)
 #
 #         return Response(status=204)
 #     except Exception as e:
 #         return Response(str(e), status=500)
 
 
-async def _update_metadata(discord_user_id: int):
-    global linked_role_client
-
-    user_data = await UserModel.get_or_none(discord_user_id=discord_user_id)
-    if not user_data:
-        raise KeyError(f"Error updating the user: no user with id {discord_user_id} found.")
-
-    token_data = await user_data.discord_token
-    if not token_data:
-        raise KeyError(f"Error updating the user: user {discord_user_id} doesnt have Discord token.")
-
-    token = DiscordToken(  # TODO replace by function
-        user_id=token_data.user_id,
-        access_token=token_data.access_token,
-        refresh_token=token_data.refresh_token,
-        expires_in=token_data.expires_in,
-        expires_at=token_data.expires_at
-    )
-
-    if token.is_expired:
-        token = await linked_role_client.refresh_token(token)
-        await token_data.update_from_dict({
-            'access_token': token.access_token,
-            'refresh_token': token.refresh_token,
-            'expires_in': int(token.expires_in.total_seconds()),
-            'expires_at': token.expires_at,
-        })
-
-    metadata = ShikiMetadata(
-        platform_username=user_data.shikimori_nickname,
-        titles_watched=user_data.anime_watched,
-        hours_watching=user_data.total_hours
-    )
-
-    await linked_role_client.push_metadata(token, metadata)
-
-
-@app.route('/shikimori-auth')
+@routes.route('/shikimori-auth')
 async def shikimori_auth():
     # this path is redirecting to shiki auth page
     discord_user_id = request.args.get('user_id')  # TODO: change to userId
@@ -151,7 +114,7 @@ async def shikimori_auth():
     return response
 
 
-@app.route('/shikimori-oauth-callback')
+@routes.route('/shikimori-oauth-callback')
 async def shikimori_oauth_callback():
     global shiki_client
 
@@ -162,58 +125,145 @@ async def shikimori_oauth_callback():
     except Exception as e:
         return Response(str(e), status=500)
     else:
-        shiki_token_data, _ = await ShikiTokenModel.update_or_create(
-            user_id=user_info['id'],
-            defaults={
-                'access_token': token.access_token,
-                'refresh_token': token.refresh_token,
-                'expires_in': token.expires_in.total_seconds(),
-                'expires_at': token.expires_at
-            }
-        )
-
-        additional_data = await shiki_client.go().users.id(272747).get()
-
-        # find out amount of anime completed
-        anime_completed = 0
-        rate_groups = additional_data['stats']['statuses']['anime']
-        for rate_group in rate_groups:
-            if rate_group['name'] == 'completed':
-                anime_completed = rate_group['size']
-                break
-
         discord_user_id = int(request.cookies.get('user_id'))  # TODO: change to userId
-        await UserModel.update_or_create(
-            discord_user_id=discord_user_id,
-            defaults={
-                'shikimori_user_id': user_info['id'],
-                'shikimori_nickname': user_info['nickname'],
-                'shikimori_token_id': shiki_token_data.pk,
-                'anime_watched': anime_completed
-            }
-        )
-
-        # TODO try to fix ugly code (2x try-except blocks)
-        try:
-            await _update_metadata(discord_user_id)  # must provide metadata to Discord!
-        except Exception as e:
-            # if metadata not updated properly - just log it  # TODO logging
-            print('Error updating metadata after shikimori oauth callback:', e)
+
+        # only token is saved before redirect, everything else is done by work queue
+        await upsert_token(ShikiTokenModel, user_info['id'], token_to_dict(token))
+        work_queue.submit(_after_shikimori_authorization, discord_user_id, user_info['id'], user_info['nickname'])
 
     return redirect("https://shikimori.me/")  # TODO get rid of hardcode
 
 
-HOST = os.environ['DB_HOST']
-PORT = os.environ['DB_PORT']
-USER = os.environ['DB_USER']
-PASS = os.environ['DB_PASS']
-NAME = os.environ['DB_NAME']
+async def _after_shikimori_authorization(discord_user_id: int, shikimori_user_id: int, shikimori_nickname: str):
+    token_data = await ShikiTokenModel.get(user_id=shikimori_user_id)
+    shiki_user_info = await shiki_client.get_user(shikimori_user_id)
+
+    await upsert_user(
+        discord_user_id,
+        shikimori_user_id=shikimori_user_id,
+        shikimori_nickname=shikimori_nickname,
+        shikimori_token_id=token_data.pk,
+        anime_watched=anime_completed(shiki_user_info),
+    )
+    auth_status_cache.invalidate(discord_user_id)
+    user = await get_user(discord_user_id)
+    profile_cache.put_user(discord_user_id, user)  # read by the bot in unified mode
+    leaderboards.update_user(user)
+
+    await enqueue_push(discord_user_id)
+    await enqueue_memberships(discord_user_id)
+
+
+@routes.route('/work-queue')
+async def work_queue_stats():
+    if not metrics.enabled:  # internal state, only for whoever scrapes metrics
+        return Response("Metrics are disabled", status=404)
+    return {**work_queue.stats, 'jobs': {**job_queue.stats, 'pending': await job_queue.pending()}}
+
+
+@routes.route('/metrics')
+async def prometheus_metrics():
+    if not metrics.enabled:
+        return Response("Metrics are disabled", status=404)
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4')
+
+
+@routes.route('/http-pool')
+async def http_pool_stats():
+    if not metrics.enabled:
+        return Response("Metrics are disabled", status=404)
+    return get_http_pool().stats
+
 
-tortoise.contrib.quart.register_tortoise(
-    app,
-    db_url=f'mysql://{USER}:{PASS}@{HOST}:{PORT}/{NAME}',
-    modules={"models": ["data.models"]},
-)
+async def start_worker(standalone: bool) -> None:
+    """Clients and queues of this worker, `standalone` one has its own database connection too."""
+    global linked_role_client, shiki_client, work_queue, job_queue
+
+    if standalone:
+        asyncio.get_running_loop().set_exception_handler(_exception_handler)
+        await init_db()
+
+    linked_role_client = get_dlr_client()
+    shiki_client = get_shiki_gateway()
+    work_queue = WorkQueue(workers=4)
+    job_queue = get_job_queue()
+
+    work_queue.start()
+    job_queue.start()
+
+
+async def stop_worker(standalone: bool) -> None:
+    await job_queue.stop()
+    await work_queue.stop()
+    await get_http_pool().close()
+
+    if standalone:
+        await Tortoise.close_connections()
+
+
+def create_app(standalone: bool = True) -> Quart:
+    """Linked roles server.
+
+    Clients, queues, HTTP pool and database connection are created when serving starts and closed when it stops, so
+    every hypercorn worker (process) has its own. In unified mode (`standalone=False`, see `unified.py`) database and
+    the bot of interactions endpoint come from the running bot; standalone server logs in a REST-only bot for the
+    endpoint, if it is enabled.
+    """
+    app = Quart(__name__)
+    app.secret_key = os.environ.get('COOKIE_SECRET')
+    app.register_blueprint(routes)
+    app.register_blueprint(interactions.blueprint)
+
+    with_bot = standalone and bool(os.environ.get('DISCORD_PUBLIC_KEY'))
+
+    @app.before_serving
+    async def startup():
+        await start_worker(standalone)
+        if with_bot:
+            await interactions.start_worker()
+
+    @app.after_serving
+    async def shutdown():
+        if with_bot:
+            await interactions.stop_worker()
+        await stop_worker(standalone)
+
+    return app
+
+
+def worker_class() -> str:
+    """Event loop of workers: uvloop if `SERVER_UVLOOP` is set and it is installed."""
+    if not os.environ.get('SERVER_UVLOOP'):
+        return 'asyncio'
+    if importlib.util.find_spec('uvloop') is None:
+        print("uvloop is not installed, asyncio event loop is used")  # TODO logging
+        return 'asyncio'
+    return 'uvloop'
+
+
+def hypercorn_config() -> Config:
+    """With `SERVER_WORKERS` > 1 every worker has its own queues and metrics: `/work-queue` and `/metrics` report
+    the worker which answered the request.
+
+    Every worker has its own Shikimori rate limiter too, so `SHIKI_PROCESSES` must count all processes using the
+    application: `SERVER_WORKERS` + 1 with the bot run by `main.py`, 1 for `unified.py`. Each of them gets that share
+    of `SHIKI_RPS` and `SHIKI_RPM` (see `clients.shiki.get_shiki_gateway`).
+    """
+    config = Config()
+    config.bind = [os.environ.get('SERVER_BIND', '0.0.0.0:5000')]
+    config.keyfile = os.environ.get('CERT_KEY') or None  # plain HTTP without certificate, e.g. behind a proxy
+    config.certfile = os.environ.get('CERT_FILE') or None
+    config.workers = int(os.environ.get('SERVER_WORKERS', 1))
+    config.worker_class = worker_class()
+    config.application_path = APPLICATION_PATH
+    return config
+
+
+def run(application_path: str = APPLICATION_PATH) -> None:
+    """Serve with `SERVER_WORKERS` worker processes, sharing the listening socket; signals stop them gracefully."""
+    config = hypercorn_config()
+    config.application_path = application_path
+    hypercorn.run.run(config)
 
 
 # to silence SSL errors
@@ -226,23 +276,5 @@ def _exception_handler(loop, context):
         loop.default_exception_handler(context)
 
 
-shutdown_event = asyncio.Event()
-
-
-def _signal_handler(*_: any) -> None:
-    shutdown_event.set()
-
-
 if __name__ == '__main__':
-    config = Config()
-    config.bind = ['0.0.0.0:5000']
-    config.keyfile = os.environ['CERT_KEY']
-    config.certfile = os.environ['CERT_FILE']
-
-    loop = asyncio.get_event_loop()
-    loop.set_exception_handler(_exception_handler)
-    # loop.add_signal_handler(signal.SIGTERM, _signal_handler)
-
-    loop.run_until_complete(serve(app, config, shutdown_trigger=lambda: asyncio.Future()))
-
-    # app.run(host='0.0.0.0', port=5000, debug=True)
+    run()
@@ -6,28 +6,21 @@ import discord
 from tortoise import connections, Tortoise
 
 from clients.bot import ShikimoriBot
+from clients.tree import InstrumentedTree
+from services import metrics
 
 from dotenv import load_dotenv
 load_dotenv()
+metrics.configure()
 
 from cogs.shiki_commands.cog import ShikiCog
 from cogs.ctx_commands.cog import ContextMenuCog
 from cogs.manage_commangs.sync import SyncCog
 from cogs.manage_commangs.cog import ManageCog
+from data.database import init_db
 
 
-async def main():
-    HOST = os.environ['DB_HOST']
-    PORT = os.environ['DB_PORT']
-    USER = os.environ['DB_USER']
-    PASS = os.environ['DB_PASS']
-    NAME = os.environ['DB_NAME']
-
-    await Tortoise.init(
-        db_url=f'mysql://{USER}:{PASS}@{HOST}:{PORT}/{NAME}',
-        modules={"models": ["data.models"]},
-    )
-
+async def create_bot(background: bool = True) -> ShikimoriBot:
     intents = discord.Intents.default()
     intents.message_content = True
     intents.members = True
@@ -36,10 +29,12 @@ async def main():
         command_prefix="!",
         intents=intents,
         status=discord.Status.idle,
-        activity=discord.Game(name='/shikimori')
+        activity=discord.Game(name='/shikimori'),
+        tree_cls=InstrumentedTree,
+        background=background,
     )
 
-    await my_bot.add_cog(ShikiCog())
+    await my_bot.add_cog(ShikiCog(background=background))
 
     await my_bot.add_cog(ContextMenuCog(bot=my_bot))
 
@@ -47,10 +42,22 @@ async def main():
 
     await my_bot.add_cog(SyncCog())
 
+    return my_bot
+
+
+async def main():
+    await init_db()
+
+    my_bot = await create_bot()
+    # the linked roles server runs in another process, its `/metrics` does not see histograms of the bot
+    exporter = await metrics.serve(os.environ.get('METRICS_BIND', '127.0.0.1:9100')) if metrics.enabled else None
+
     try:
         await my_bot.start(os.environ['BOT_TOKEN'])
     except KeyboardInterrupt:
         await my_bot.close()
+        if exporter:
+            await exporter.cleanup()
         await Tortoise.close_connections()
 
 
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from data.cache import TTLCache
+
+
+class AuthStatus(NamedTuple):
+    shikimori: bool
+    discord: bool
+
+
+class AuthStatusCache:
+    """Results of authorization checks by discord user id.
+
+    Positive results live longer than negative ones: a user who is not authorized yet is likely to authorize soon.
+    OAuth callbacks invalidate entry of the user, so new authorization is seen at once.
+    """
+
+    def __init__(self, positive_ttl: float = 10 * 60, negative_ttl: float = 30, maxsize: int = 10_000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, discord_user_id: int) -> AuthStatus | None:
+        return self._cache.get(discord_user_id)
+
+    def set(self, discord_user_id: int, status: AuthStatus) -> None:
+        self._cache.set(discord_user_id, status, ttl=self.positive_ttl if all(status) else self.negative_ttl)
+
+    def invalidate(self, discord_user_id: int) -> None:
+        self._cache.pop(discord_user_id)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats
+
+
+auth_status_cache = AuthStatusCache()
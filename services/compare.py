@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+
+from functools import cache
+from typing import NamedTuple
+
+import numpy as np
+
+from clients.shiki import Priority, ShikiGateway, get_shiki_gateway
+from clients.singleflight import SingleFlight
+from data.cache import TTLCache
+from data.models import AnimeRateModel
+
+from .watch_time import fetch_anime_rates, snapshot_version
+
+FAVORITE_SCORE = 9  # both users scored the title at least this
+FAVORITES_LIMIT = 5
+MIN_SCORED = 3  # scored titles in common needed for correlation
+
+
+class RateVectors(NamedTuple):
+    """Rates of one user (except planned ones) as arrays: anime ids in ascending order and scores (0 is not scored)."""
+    ids: np.ndarray
+    scores: np.ndarray
+    version: int  # `snapshot_version` the arrays were built from
+
+
+class Comparison(NamedTuple):
+    first_total: int
+    second_total: int
+    shared: int
+    similarity: float  # Jaccard index of the lists
+    correlation: float | None  # Pearson, over titles scored by both; None if there are too few of them
+    scored: int
+    favorites: list[int]  # anime ids, best scored by both first
+
+    def swapped(self) -> Comparison:
+        return self._replace(first_total=self.second_total, second_total=self.first_total)
+
+
+def rate_vectors(rows: list[tuple[int, int]], version: int) -> RateVectors:
+    """`rows` are `(anime_id, score)` sorted by anime id, one per anime."""
+    array = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return RateVectors(np.ascontiguousarray(array[:, 0]), array[:, 1].astype(np.int16), version)
+
+
+def compare_vectors(first: RateVectors, second: RateVectors) -> Comparison:
+    shared, i, j = np.intersect1d(first.ids, second.ids, assume_unique=True, return_indices=True)
+    first_scores, second_scores = first.scores[i], second.scores[j]
+
+    scored = (first_scores > 0) & (second_scores > 0)
+    x, y = first_scores[scored], second_scores[scored]
+    correlation = None
+    if len(x) >= MIN_SCORED and x.std() and y.std():
+        correlation = float(np.corrcoef(x, y)[0, 1])
+
+    favorite = (first_scores >= FAVORITE_SCORE) & (second_scores >= FAVORITE_SCORE)
+    best_first = np.argsort(-(first_scores[favorite] + second_scores[favorite]), kind='stable')
+    favorites = shared[favorite][best_first][:FAVORITES_LIMIT]
+
+    union = len(first.ids) + len(second.ids) - len(shared)
+    return Comparison(
+        first_total=len(first.ids),
+        second_total=len(second.ids),
+        shared=len(shared),
+        similarity=len(shared) / union if union else 0.0,
+        correlation=correlation,
+        scored=len(x),
+        favorites=favorites.tolist(),
+    )
+
+
+class Comparisons:
+    """Comparisons of anime lists of two users, on arrays (see `RateVectors`), not on per-title lookups.
+
+    Rates come from the snapshot saved by watch time updates (`AnimeRateModel`), so they are as fresh as the last
+    update of the user: a refresher sweep (once per `MetadataRefresher.interval`) or `/shikimori update`. Users
+    without a snapshot are requested from Shikimori. Arrays of users and results for pairs are cached by
+    `snapshot_version` of both users, so they are recomputed as soon as a watch time update of this process changes
+    either list; versions are kept per process, so changes seen by another process (and changes of lists requested
+    from Shikimori) are picked up after `ttl` seconds. A comparison is at most `ttl` older than the snapshot.
+    """
+
+    def __init__(self, gateway: ShikiGateway, maxsize: int = 1024, ttl: float = 30 * 60):
+        self.gateway = gateway
+        self._vectors = TTLCache(maxsize=maxsize, ttl=ttl)  # shikimori user id -> RateVectors
+        self._results = TTLCache(maxsize=maxsize * 4, ttl=ttl)  # (first, second, versions...) -> Comparison
+        self._loading = SingleFlight()
+
+    async def compare(self, first_id: int, second_id: int) -> Comparison:
+        low, high = sorted((first_id, second_id))
+        key = (low, high, snapshot_version(low), snapshot_version(high))
+        if (result := self._results.get(key)) is None:
+            first, second = await self.vectors(low), await self.vectors(high)
+            result = compare_vectors(first, second)
+            self._results.set(key, result)
+        return result if first_id <= second_id else result.swapped()
+
+    async def vectors(self, shikimori_user_id: int) -> RateVectors:
+        vectors: RateVectors | None = self._vectors.get(shikimori_user_id)
+        if vectors is None or vectors.version != snapshot_version(shikimori_user_id):
+            vectors = await self._loading.do(shikimori_user_id, self._load, shikimori_user_id)
+        return vectors
+
+    async def _load(self, shikimori_user_id: int) -> RateVectors:
+        version = snapshot_version(shikimori_user_id)
+        snapshot = await (
+            AnimeRateModel
+            .filter(shikimori_user_id=shikimori_user_id)
+            .order_by('anime_id')
+            .values_list('anime_id', 'score', 'status')
+        )
+        if snapshot:
+            rows = [(anime_id, score) for anime_id, score, status in snapshot if status != 'planned']
+        else:  # watch time was never counted (or the list is empty)
+            rates = await fetch_anime_rates(self.gateway, shikimori_user_id, priority=Priority.INTERACTIVE)
+            rows = sorted((rate['anime']['id'], rate['score']) for rate in rates if rate['status'] != 'planned')
+
+        vectors = rate_vectors(rows, version)
+        self._vectors.set(shikimori_user_id, vectors)
+        return vectors
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {'users': len(self._vectors), 'pairs': len(self._results), 'loading': len(self._loading)}
+
+
+@cache
+def get_comparisons() -> Comparisons:
+    return Comparisons(get_shiki_gateway(), ttl=float(os.environ.get('COMPARE_CACHE_TTL', 30 * 60)))
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from data.models import JobModel
+
+# handles jobs of one kind in a batch: user ids -> error for every failed user
+Handler = Callable[[list[int]], Awaitable[dict[int, Exception]]]
+
+
+async def enqueue(kind: str, user_id: int, delay: timedelta = timedelta()) -> None:
+    """Schedule job of `kind` for the user. Pending job of the same user is replaced, so the latest one wins."""
+    now = datetime.now()
+    await JobModel.bulk_create(
+        [JobModel(kind=kind, user_id=user_id, enqueued_at=now, run_at=now + delay)],
+        on_conflict=['kind', 'user_id'],
+        update_fields=['enqueued_at', 'run_at', 'attempts', 'last_error'],
+    )
+
+
+class JobQueue:
+    """Durable queue of per-user jobs (`jobs` table), any number of processes can run it at the same time.
+
+    Every worker claims a batch of due jobs with `SELECT ... FOR UPDATE SKIP LOCKED` and leases it for `lease`, so
+    workers never take the same job; jobs of a worker which died are due again when their lease expires. Failed jobs
+    are retried after `retry_delay * 2 ** attempts` and stay in the table after `max_attempts` (until enqueued again).
+    """
+
+    def __init__(
+            self,
+            handlers: dict[str, Handler],
+            workers: int = 4,
+            batch_size: int = 50,
+            max_attempts: int = 8,
+            retry_delay: timedelta = timedelta(seconds=10),
+            lease: timedelta = timedelta(minutes=5),
+            poll_interval: float = 1.0,
+    ):
+        self.handlers = handlers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._tasks: list[asyncio.Task] = []
+
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop workers, jobs they were running are taken again after lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                jobs = await self.claim()
+                if jobs:
+                    await self.run(jobs)
+            except Exception as e:
+                print(f"Error running jobs: {e}")  # TODO logging
+                jobs = []
+
+            if len(jobs) < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def claim(self) -> list[JobModel]:
+        now = datetime.now()
+        async with in_transaction() as connection:
+            jobs = await (
+                JobModel
+                .filter(kind__in=list(self.handlers), run_at__lte=now, attempts__lt=self.max_attempts)
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+                .order_by('run_at')
+                .limit(self.batch_size)
+                .select_for_update(skip_locked=True)
+                .using_db(connection)
+            )
+            if jobs:
+                await (
+                    JobModel
+                    .filter(id__in=[job.id for job in jobs])
+                    .using_db(connection)
+                    .update(locked_until=now + self.lease)
+                )
+        return jobs
+
+    async def run(self, jobs: list[JobModel]) -> None:
+        by_kind: dict[str, list[JobModel]] = defaultdict(list)
+        for job in jobs:
+            by_kind[job.kind].append(job)
+
+        for kind, kind_jobs in by_kind.items():
+            try:
+                errors = await self.handlers[kind]([job.user_id for job in kind_jobs])
+            except Exception as e:
+                errors = {job.user_id: e for job in kind_jobs}
+
+            done = [job for job in kind_jobs if job.user_id not in errors]
+            if done:
+                # job enqueued again while running is not deleted, just released to run once more
+                await JobModel.filter(
+                    Q(*(Q(id=job.id, enqueued_at=job.enqueued_at) for job in done), join_type=Q.OR)
+                ).delete()
+                await JobModel.filter(id__in=[job.id for job in done]).update(locked_until=None)
+                self.processed += len(done)
+
+            for job in kind_jobs:
+                if job.user_id in errors:
+                    await self._retry_later(job, errors[job.user_id])
+
+    async def _retry_later(self, job: JobModel, error: Exception) -> None:
+        job.attempts += 1
+        job.run_at = datetime.now() + self.retry_delay * 2 ** (job.attempts - 1)
+        job.locked_until = None
+        job.last_error = repr(error)
+        # job enqueued again while running keeps its fresh schedule and attempts, just released (as in `run`)
+        if not await JobModel.filter(id=job.id, enqueued_at=job.enqueued_at).update(
+                attempts=job.attempts, run_at=job.run_at, locked_until=None, last_error=job.last_error
+        ):
+            await JobModel.filter(id=job.id).update(locked_until=None)
+            return
+
+        if job.attempts < self.max_attempts:
+            self.retried += 1
+        else:
+            self.failed += 1
+            print(f"Job {job} failed: {error!r}")  # TODO logging
+
+    async def pending(self) -> int:
+        return await JobModel.filter(kind__in=list(self.handlers), attempts__lt=self.max_attempts).count()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'workers': len(self._tasks),
+            'processed': self.processed,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
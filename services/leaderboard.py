@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import os
+
+from bisect import bisect_left, insort
+from time import monotonic
+from typing import Iterable, NamedTuple
+
+from discord import Guild
+
+from clients.singleflight import SingleFlight
+from data.models import GuildMemberModel, UserModel
+
+from . import jobs
+
+STATS = ('anime_watched', 'total_hours')
+ADD_MEMBERSHIPS = 'add_memberships'
+LINKED_USERS_TTL = 60  # guilds becoming available at once (every guild on start) share one list of linked users
+
+
+async def enqueue_memberships(discord_user_id: int) -> None:
+    """Put newly linked user on boards of guilds the bot shares with them, by job queue of the bot (it has member
+    cache of the guilds, see `Leaderboards.add_memberships`).
+    """
+    await jobs.enqueue(ADD_MEMBERSHIPS, discord_user_id)
+
+
+class Entry(NamedTuple):
+    discord_user_id: int
+    shikimori_nickname: str
+    anime_watched: int
+    total_hours: int
+
+
+def entry_of(user: UserModel) -> Entry:
+    return Entry(user.discord_user_id, user.shikimori_nickname or '', user.anime_watched or 0, user.total_hours or 0)
+
+
+class GuildLeaderboard:
+    """Linked members of one guild, sorted by every stat of `STATS`.
+
+    Every stat keeps a sorted list of `(-value, discord user id)`, so a page is a slice and rank of a user is a binary
+    search; changing stats of a user moves only their keys.
+    """
+
+    def __init__(self, entries: Iterable[Entry] = ()):
+        self.entries: dict[int, Entry] = {entry.discord_user_id: entry for entry in entries}
+        self._sorted: dict[str, list[tuple[int, int]]] = {
+            stat: sorted((-getattr(entry, stat), user_id) for user_id, entry in self.entries.items())
+            for stat in STATS
+        }
+        self.loaded_at = monotonic()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, discord_user_id: int) -> bool:
+        return discord_user_id in self.entries
+
+    def put(self, entry: Entry) -> None:
+        self.remove(entry.discord_user_id)
+        self.entries[entry.discord_user_id] = entry
+        for stat, keys in self._sorted.items():
+            insort(keys, (-getattr(entry, stat), entry.discord_user_id))
+
+    def remove(self, discord_user_id: int) -> None:
+        if (entry := self.entries.pop(discord_user_id, None)) is None:
+            return
+        for stat, keys in self._sorted.items():
+            del keys[bisect_left(keys, (-getattr(entry, stat), discord_user_id))]
+
+    def page(self, stat: str, offset: int, limit: int) -> list[Entry]:
+        return [self.entries[user_id] for _, user_id in self._sorted[stat][offset:offset + limit]]
+
+    def rank(self, stat: str, discord_user_id: int) -> int | None:
+        """1-based rank, members with equal value share it; None if the user is not on the board."""
+        if (entry := self.entries.get(discord_user_id)) is None:
+            return None
+        return bisect_left(self._sorted[stat], (-getattr(entry, stat), )) + 1
+
+
+class Leaderboards:
+    """Leaderboards of guilds, by linked members stored in `GuildMemberModel`.
+
+    Board of a guild is loaded on first request, by one query over linked members of that guild only, and then kept
+    up to date in place: everything which changes stats of a user must `update_user` (as with `profile_cache`), and
+    membership changes go through `add_member`/`remove_member` (and `add_memberships` for users who just linked
+    their profile). Stats changed by the other process (OAuth callbacks,
+    unless the server runs in the same process) are picked up when the board is reloaded after `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float | None = None):
+        """`ttl` defaults to `LEADERBOARD_TTL`, read on first use (after environment is loaded)."""
+        self._ttl = ttl
+
+        self._boards: dict[int, GuildLeaderboard] = {}
+        self._guilds_of: dict[int, set[int]] = {}  # discord user id -> guilds with loaded boards
+        self._loading = SingleFlight()
+        self._linked: list[tuple[int, int]] | None = None  # (pk, discord user id) of linked users
+        self._linked_at = 0.0
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is None:
+            self._ttl = float(os.environ.get('LEADERBOARD_TTL', 30 * 60))
+        return self._ttl
+
+    async def board(self, guild_id: int) -> GuildLeaderboard:
+        board = self._boards.get(guild_id)
+        if board is None or monotonic() - board.loaded_at > self.ttl:
+            board = await self._loading.do(guild_id, self._load, guild_id)
+        return board
+
+    async def _load(self, guild_id: int) -> GuildLeaderboard:
+        rows = await (
+            GuildMemberModel
+            .filter(guild_id=guild_id, user__shikimori_user_id__isnull=False)
+            .values_list('user__discord_user_id', 'user__shikimori_nickname', 'user__anime_watched', 'user__total_hours')
+        )
+        board = GuildLeaderboard(Entry(user_id, nickname or '', watched or 0, hours or 0)
+                                 for user_id, nickname, watched, hours in rows)
+
+        self._forget(guild_id)
+        self._boards[guild_id] = board
+        for user_id in board.entries:
+            self._guilds_of.setdefault(user_id, set()).add(guild_id)
+        return board
+
+    def _forget(self, guild_id: int) -> None:
+        if (board := self._boards.pop(guild_id, None)) is None:
+            return
+        for user_id in board.entries:
+            if guilds := self._guilds_of.get(user_id):
+                guilds.discard(guild_id)
+                if not guilds:
+                    del self._guilds_of[user_id]
+
+    def update_user(self, user: UserModel) -> None:
+        """New stats of the user, on every loaded board the user is on."""
+        if not user or not user.shikimori_user_id:
+            return
+        entry = entry_of(user)
+        for guild_id in self._guilds_of.get(user.discord_user_id, ()):
+            self._boards[guild_id].put(entry)
+
+    async def add_member(self, guild_id: int, user: UserModel) -> None:
+        if not user or not user.shikimori_user_id:
+            return  # only linked users are on boards
+        await GuildMemberModel.bulk_create([GuildMemberModel(guild_id=guild_id, user_id=user.pk)], ignore_conflicts=True)
+        if (board := self._boards.get(guild_id)) is not None:
+            board.put(entry_of(user))
+            self._guilds_of.setdefault(user.discord_user_id, set()).add(guild_id)
+
+    async def add_memberships(self, guilds: Iterable[Guild], discord_user_ids: list[int]) -> dict[int, Exception]:
+        """Job handler of `ADD_MEMBERSHIPS`: linked users are added to every guild of `guilds` they are members of."""
+        users = await UserModel.filter(discord_user_id__in=discord_user_ids, shikimori_user_id__isnull=False)
+        for guild in guilds:
+            for user in users:
+                if guild.get_member(user.discord_user_id):
+                    await self.add_member(guild.id, user)
+        return {}
+
+    async def remove_member(self, guild_id: int, discord_user_id: int) -> None:
+        await GuildMemberModel.filter(guild_id=guild_id, user__discord_user_id=discord_user_id).delete()
+        if (board := self._boards.get(guild_id)) is not None:
+            board.remove(discord_user_id)
+            if guilds := self._guilds_of.get(discord_user_id):
+                guilds.discard(guild_id)
+
+    async def sync_guilds(self, guilds: Iterable[Guild]) -> None:
+        """Reconcile stored membership with member cache of `guilds` (on start and when the bot joins a guild).
+
+        Only linked users are looked up in member cache, members of the guild are never iterated. The list of them is
+        shared by syncs within `LINKED_USERS_TTL`, so only users on it are removed (not ones who linked since).
+        """
+        linked = await self._linked_users()
+        known = {pk for pk, _ in linked}
+        for guild in guilds:
+            members = {pk for pk, discord_user_id in linked if guild.get_member(discord_user_id)}
+            stored = set(await GuildMemberModel.filter(guild_id=guild.id).values_list('user_id', flat=True))
+
+            if added := members - stored:
+                await GuildMemberModel.bulk_create(
+                    [GuildMemberModel(guild_id=guild.id, user_id=pk) for pk in added], ignore_conflicts=True
+                )
+            if removed := (stored - members) & known:
+                await GuildMemberModel.filter(guild_id=guild.id, user_id__in=removed).delete()
+            if added or removed:
+                self._forget(guild.id)  # loaded again on next request
+
+    async def _linked_users(self) -> list[tuple[int, int]]:
+        if self._linked is None or monotonic() - self._linked_at > LINKED_USERS_TTL:
+            self._linked = await self._loading.do('linked', self._load_linked_users)
+        return self._linked
+
+    async def _load_linked_users(self) -> list[tuple[int, int]]:
+        linked = await UserModel.filter(shikimori_user_id__isnull=False).values_list('id', 'discord_user_id')
+        self._linked_at = monotonic()
+        return linked
+
+    async def remove_guild(self, guild_id: int) -> None:
+        await GuildMemberModel.filter(guild_id=guild_id).delete()
+        self._forget(guild_id)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'guilds': len(self._boards),
+            'entries': sum(len(board) for board in self._boards.values()),
+            'loading': len(self._loading),
+        }
+
+
+leaderboards = Leaderboards()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from functools import cache
+
+from dlr_light_api import Client as DLRClient
+
+from clients.dlr import get_dlr_client
+from data.datatypes import ShikiMetadata
+from data.models import UserModel
+
+from . import jobs
+from .tokens import TokenService, get_token_service
+
+PUSH_METADATA = 'push_metadata'
+
+
+def metadata_of(user: UserModel) -> ShikiMetadata:
+    return ShikiMetadata(
+        platform_username=user.shikimori_nickname,
+        titles_watched=user.anime_watched or 0,
+        hours_watching=user.total_hours or 0
+    )
+
+
+async def enqueue_push(discord_user_id: int) -> None:
+    """Push linked role metadata of the user to Discord, as it is in database at the moment job runs."""
+    await jobs.enqueue(PUSH_METADATA, discord_user_id)
+
+
+class MetadataPusher:
+    """Job handler pushing metadata of a batch of users, with at most `concurrency` requests to Discord at a time."""
+
+    def __init__(self, dlr_client: DLRClient, token_service: TokenService, concurrency: int = 8):
+        self.dlr_client = dlr_client
+        self.token_service = token_service
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __call__(self, discord_user_ids: list[int]) -> dict[int, Exception]:
+        users = await UserModel.filter(discord_user_id__in=discord_user_ids).select_related('discord_token')
+        results = await asyncio.gather(*(self.push(user) for user in users), return_exceptions=True)
+        return {user.discord_user_id: e for user, e in zip(users, results) if isinstance(e, Exception)}
+
+    async def push(self, user: UserModel) -> None:
+        if not user.discord_token:
+            return  # discord is not linked yet, metadata is pushed after linking
+
+        async with self._semaphore:
+            token = await self.token_service.discord_token(user.discord_token)
+            await self.dlr_client.push_metadata(token, metadata_of(user))
+
+
+@cache
+def get_job_queue() -> jobs.JobQueue:
+    """Job queue of this process, `JOB_WORKERS=0` to leave jobs to other processes."""
+    return jobs.JobQueue(
+        {PUSH_METADATA: MetadataPusher(get_dlr_client(), get_token_service())},
+        workers=int(os.environ.get('JOB_WORKERS', 4)),
+    )
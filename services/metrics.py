@@ -0,0 +1,170 @@
+"""Latency histograms in Prometheus text format.
+
+Disabled unless `METRICS` is set in environment: then every `timer` is a shared no-op context manager and nothing
+is wrapped, so instrumented code costs one attribute lookup.
+
+Histograms live in memory of the process recording them. The linked roles server serves its own at `/metrics`
+(in unified mode the bot's too); the bot running as a separate process (`main.py`) serves them with `serve` at
+`METRICS_BIND`. With `SERVER_WORKERS` > 1 every worker has its own histograms, and `/metrics` (as `/work-queue`)
+reports only the worker which answered the scrape: scrape each worker directly or run one worker per port.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+
+from bisect import bisect_left
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Any, ContextManager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+enabled = bool(os.environ.get('METRICS'))
+
+_noop = nullcontext()
+
+
+def configure() -> None:
+    """Read `METRICS` again, after environment is loaded (clients instrumented before keep their state)."""
+    global enabled
+    enabled = bool(os.environ.get('METRICS'))
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, seconds)] += 1  # last bucket index is +Inf
+        series[-2] += seconds
+        series[-1] += 1
+
+    def time(self, *labels: str) -> ContextManager:
+        return _Timer(self, labels) if enabled else _noop
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, series in self._series.items():
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, labels)]
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series[:-2]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{{{",".join([*pairs, le])}}} {cumulative}')
+            label_set = f'{{{",".join(pairs)}}}' if pairs else ''
+            lines.append(f'{self.name}_sum{label_set} {series[-2]}')
+            lines.append(f'{self.name}_count{label_set} {series[-1]}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: tuple[str, ...]):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self) -> None:
+        self.started = perf_counter()
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        self.histogram.observe(perf_counter() - self.started, *self.labels, 'error' if exc_type else 'ok')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_histograms: dict[str, Histogram] = {}
+
+
+def histogram(name: str, description: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    if name not in _histograms:
+        _histograms[name] = Histogram(name, description, labels, buckets)
+    return _histograms[name]
+
+
+def render() -> str:
+    return '\n'.join(line for h in _histograms.values() for line in h.render()) + '\n'
+
+
+async def serve(bind: str) -> web.AppRunner:
+    """`GET /metrics` at `bind` (`host:port`), for a process without web server of its own; cleanup runner to stop."""
+    async def handler(_: web.Request) -> web.Response:
+        return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    host, port = bind.rsplit(':', 1)
+    await web.TCPSite(runner, host, int(port)).start()
+    return runner
+
+
+# `time()` adds `status` label ('ok' or 'error') as the last one, first responses are observed directly
+time_to_defer = histogram(
+    'interaction_first_response_seconds', "Time from interaction creation to first response (defer, message)",
+    ('kind', 'name'),
+)
+time_to_response = histogram(
+    'interaction_handling_seconds', "Time to handle interaction completely", ('kind', 'name', 'status'),
+)
+upstream = histogram(
+    'upstream_request_seconds', "Duration of requests to Shikimori and Discord APIs", ('service', 'endpoint', 'status'),
+)
+db_query = histogram('db_query_seconds', "Duration of database queries", ('operation', 'status'))
+
+
+def instrument(client: Any, service: str) -> Any:
+    """Client whose coroutine methods are timed as `upstream` requests, the client itself if metrics are disabled."""
+    return _InstrumentedClient(client, service) if enabled else client
+
+
+class _InstrumentedClient:
+    def __init__(self, client: Any, service: str):
+        self._client = client
+        self._service = service
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            with upstream.time(self._service, name):
+                return await attribute(*args, **kwargs)
+        return timed
+
+
+DB_METHODS = ('execute_query', 'execute_query_dict', 'execute_insert', 'execute_many', 'execute_script')
+
+
+def instrument_db(connection: Any) -> None:
+    """Time queries of the connection (and transactions of it): class of the client is patched, once."""
+    if not enabled or getattr(type(connection), '_instrumented', False):
+        return
+
+    def timed(method):
+        @functools.wraps(method)
+        async def wrapper(self, query: str, *args: Any, **kwargs: Any) -> Any:
+            with db_query.time(query.lstrip().split(None, 1)[0].upper() if query.strip() else method.__name__):
+                return await method(self, query, *args, **kwargs)
+        return wrapper
+
+    cls = type(connection)
+    for name in DB_METHODS:
+        if method := getattr(cls, name, None):
+            setattr(cls, name, timed(method))
+    cls._instrumented = True
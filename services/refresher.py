@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+
+from datetime import datetime, timedelta
+from time import monotonic
+
+from tortoise.expressions import Q
+
+from clients.shiki import Priority, ShikiGateway
+from data.models import CheckpointModel, UserModel
+from data.profiles import profile_cache
+
+from . import jobs, watch_time
+from .leaderboard import leaderboards
+from .metadata import enqueue_push
+from .stats import anime_completed
+
+REFRESH_USER = 'refresh_user'
+
+
+async def enqueue_refresh(discord_user_id: int) -> None:
+    """Refresh stats of the user, watch time included, by the job queue of the bot (see `refresh_users`)."""
+    await jobs.enqueue(REFRESH_USER, discord_user_id)
+
+
+class MetadataRefresher:
+    """Periodically refreshes Shikimori stats of all users and enqueues push of them to Discord as linked role metadata.
+
+    Every sweep walks users in pages, the most stale first (never refreshed, then by `refreshed_at`). A user is
+    refreshed once per sweep: after restart the sweep continues from checkpoint and skips users refreshed after its
+    start. All Shikimori calls go through background lane of the gateway, so users of the bot are not affected.
+    """
+
+    CHECKPOINT = 'metadata_refresh'
+
+    def __init__(
+            self,
+            gateway: ShikiGateway,
+            interval: timedelta = timedelta(hours=24),
+            page_size: int = 100,
+            concurrency: int = 4,
+            update_watch_time: bool = True,
+    ):
+        self.gateway = gateway
+        self.interval = interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.update_watch_time = update_watch_time
+
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                started_at = await self.sweep()
+            except Exception as e:
+                print(f"Error refreshing metadata: {e}")  # TODO logging
+                started_at = datetime.now()
+
+            await asyncio.sleep(max((started_at + self.interval - datetime.now()).total_seconds(), 60))
+
+    async def sweep(self) -> datetime:
+        """Refresh all users not refreshed since start of current sweep, returns start of the sweep."""
+        checkpoint, _ = await CheckpointModel.get_or_create(name=self.CHECKPOINT)
+        if checkpoint.value.get('finished', True):
+            last_started = checkpoint.value.get('started_at')
+            if last_started and datetime.now() - datetime.fromisoformat(last_started) < self.interval:
+                return datetime.fromisoformat(last_started)
+
+            checkpoint.value = {'started_at': datetime.now().isoformat(), 'finished': False, 'refreshed': 0, 'failed': 0}
+            await checkpoint.save()
+
+        started_at = datetime.fromisoformat(checkpoint.value['started_at'])
+        semaphore = asyncio.Semaphore(self.concurrency)
+        processed, timer = 0, monotonic()
+
+        while users := await (
+                UserModel
+                .filter(Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=started_at), shikimori_user_id__isnull=False)
+                .order_by('refreshed_at', 'id')
+                .limit(self.page_size)
+        ):
+            results = await asyncio.gather(*(self._refresh_with(semaphore, user) for user in users))
+
+            checkpoint.value['refreshed'] += sum(results)
+            checkpoint.value['failed'] += len(results) - sum(results)
+            await checkpoint.save()
+
+            processed += len(users)
+            speed = processed / (monotonic() - timer)
+            print(f"Metadata refresh: {processed} users, {speed:.2f} users/s")  # TODO logging
+
+        checkpoint.value['finished'] = True
+        await checkpoint.save()
+        return started_at
+
+    async def _refresh_with(self, semaphore: asyncio.Semaphore, user: UserModel) -> bool:
+        async with semaphore:
+            return await self.refresh_user(user)
+
+    async def refresh_users(self, discord_user_ids: list[int]) -> dict[int, Exception]:
+        """Job handler of `REFRESH_USER`: watch time is updated even if sweeps do not update it."""
+        users = await UserModel.filter(discord_user_id__in=discord_user_ids)
+        results = await asyncio.gather(*(self.refresh_user(user, update_watch_time=True) for user in users))
+        return {
+            user.discord_user_id: RuntimeError("Refresh failed") for user, refreshed in zip(users, results)
+            if not refreshed
+        }
+
+    async def refresh_user(self, user: UserModel, update_watch_time: bool | None = None) -> bool:
+        if not user.shikimori_user_id:
+            return True  # nothing to refresh (not selected by sweeps, they would never pass it)
+
+        try:
+            shiki_user_info = await self.gateway.get_user(user.shikimori_user_id, priority=Priority.BACKGROUND)
+            user.shikimori_nickname = shiki_user_info['nickname']
+            user.anime_watched = anime_completed(shiki_user_info)
+            if self.update_watch_time if update_watch_time is None else update_watch_time:
+                user.total_hours = int(await watch_time.update_watch_time(self.gateway, user.shikimori_user_id) // 60)
+            refreshed = True
+        except Exception as e:
+            print(f"Error refreshing user {user.discord_user_id}: {e}")  # TODO logging
+            refreshed = False
+
+        # failed users are tried again only in next sweep
+        user.refreshed_at = datetime.now()
+        await user.save(update_fields=['shikimori_nickname', 'anime_watched', 'total_hours', 'refreshed_at'])
+        profile_cache.invalidate(user.discord_user_id)
+        leaderboards.update_user(user)
+
+        if refreshed and user.discord_token_id:
+            await enqueue_push(user.discord_user_id)
+        return refreshed
@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+
+def anime_completed(shiki_user_info: dict) -> int:
+    """Amount of anime completed, from /api/users/:id stats."""
+    rate_groups = shiki_user_info['stats']['statuses']['anime']
+    for rate_group in rate_groups:
+        if rate_group['name'] == 'completed':
+            return rate_group['size']
+    return 0
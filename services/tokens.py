@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+
+from datetime import datetime, timedelta
+from functools import cache
+
+from aiohttp import ClientResponseError
+from dlr_light_api import Client as DLRClient
+from dlr_light_api.datatypes import DiscordToken
+from shikimori_extended_api.datatypes import ShikiToken
+
+from clients.dlr import get_dlr_client
+from clients.shiki import Priority, ShikiGateway, get_shiki_gateway
+from clients.singleflight import SingleFlight
+from data.models import DiscordTokenModel, ShikiTokenModel, TokenModel
+
+TOKEN_FIELDS = ['access_token', 'refresh_token', 'expires_in', 'expires_at', 'invalid']
+# invalid_grant: refresh token was revoked or used already; 401 is invalid_client, credentials of the application
+# are wrong and the token itself may be fine
+PERMANENT_STATUSES = (400, )
+
+
+# TODO unify ShikiToken and DiscordToken
+def shiki_token_from_model(token_model: ShikiTokenModel) -> ShikiToken:
+    return ShikiToken(
+        access_token=token_model.access_token,
+        refresh_token=token_model.refresh_token,
+        expires_in=token_model.expires_in,
+        expires_at=token_model.expires_at
+    )
+
+
+def discord_token_from_model(token_model: DiscordTokenModel) -> DiscordToken:
+    return DiscordToken(
+        access_token=token_model.access_token,
+        refresh_token=token_model.refresh_token,
+        expires_in=token_model.expires_in,
+        expires_at=token_model.expires_at
+    )
+
+
+def token_to_dict(token: ShikiToken | DiscordToken) -> dict:
+    """Fields of token model, to save token to database."""
+    return {
+        'access_token': token.access_token,
+        'refresh_token': token.refresh_token,
+        'expires_in': int(token.expires_in.total_seconds()),
+        'expires_at': token.expires_at,
+        'invalid': False,
+    }
+
+
+def is_permanent(error: BaseException) -> bool:
+    """Refresh token was rejected, retrying it can not help."""
+    if isinstance(error, ClientResponseError) and error.status in PERMANENT_STATUSES:
+        return True
+    return 'invalid_grant' in str(error)
+
+
+class TokenService:
+    """Keeps Discord and Shikimori tokens fresh.
+
+    Background sweep refreshes tokens which are going to expire within `refresh_ahead`, so handlers get a valid token
+    straight from database. If a handler still meets an expired token, it is refreshed in place; only one refresh per
+    user is ever in flight, concurrent callers share its result (refresh token is single use!). Token whose refresh
+    is rejected (see `is_permanent`) is marked invalid and never refreshed again, until the user authorizes again.
+    """
+
+    def __init__(
+            self,
+            shiki: ShikiGateway,
+            dlr_client: DLRClient,
+            refresh_ahead: timedelta = timedelta(minutes=30),
+            sweep_interval: timedelta = timedelta(minutes=5),
+            batch_size: int = 100,
+    ):
+        self.shiki = shiki
+        self.dlr_client = dlr_client
+        self.refresh_ahead = refresh_ahead
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+
+        self._refreshing = SingleFlight()
+        self._task: asyncio.Task | None = None
+
+        self.refreshed = 0
+        self.failed = 0
+
+    async def discord_token(self, token_data: DiscordTokenModel) -> DiscordToken:
+        token = discord_token_from_model(token_data)
+        if token.is_expired:
+            token = await self._refresh(token_data)
+        return token
+
+    async def shiki_token(self, token_data: ShikiTokenModel) -> ShikiToken:
+        token = shiki_token_from_model(token_data)
+        if token.is_expired:
+            token = await self._refresh(token_data)
+        return token
+
+    async def get_discord_token(self, discord_user_id: int) -> DiscordToken | None:
+        token_data = await DiscordTokenModel.get_or_none(user_id=discord_user_id)
+        return token_data and await self.discord_token(token_data)
+
+    async def _refresh(
+            self,
+            token_data: TokenModel,
+            save: bool = True,
+            priority: Priority = Priority.INTERACTIVE
+    ) -> ShikiToken | DiscordToken:
+        key = (type(token_data).__name__, token_data.user_id)
+        old_refresh_token = token_data.refresh_token
+        try:
+            token = await self._refreshing.do(key, self._refresh_token, token_data, priority)
+        except Exception as e:
+            # only the token which was rejected: another process may have refreshed it (or the user authorized again)
+            # in the meantime, then the rejected refresh token was just used already
+            if is_permanent(e) and await type(token_data).filter(
+                    pk=token_data.pk, refresh_token=old_refresh_token
+            ).update(invalid=True):
+                token_data.invalid = True
+            raise
+        token_data.update_from_dict(token_to_dict(token))
+        if save:
+            await token_data.save(update_fields=TOKEN_FIELDS)
+        return token
+
+    async def _refresh_token(self, token_data: TokenModel, priority: Priority) -> ShikiToken | DiscordToken:
+        if isinstance(token_data, DiscordTokenModel):
+            return await self.dlr_client.refresh_token(discord_token_from_model(token_data))
+        return await self.shiki.refresh_token(shiki_token_from_model(token_data), priority=priority)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Error refreshing tokens: {e}")  # TODO logging
+            await asyncio.sleep(self.sweep_interval.total_seconds())
+
+    async def sweep(self) -> None:
+        """Refresh all tokens expiring soon, saving them to database in batches."""
+        expiring_before = datetime.now() + self.refresh_ahead
+        for model in (DiscordTokenModel, ShikiTokenModel):
+            offset = 0
+            while batch := await (
+                    model
+                    .filter(expires_at__lt=expiring_before, invalid=False)
+                    .order_by('id')
+                    .offset(offset)
+                    .limit(self.batch_size)
+            ):
+                results = await asyncio.gather(
+                    *(self._refresh(t, save=False, priority=Priority.BACKGROUND) for t in batch),
+                    return_exceptions=True
+                )
+
+                refreshed = [t for t, result in zip(batch, results) if not isinstance(result, BaseException)]
+                if refreshed:
+                    await model.bulk_update(refreshed, fields=TOKEN_FIELDS)
+
+                self.refreshed += len(refreshed)
+                self.failed += len(batch) - len(refreshed)
+                # failed ones are still expiring, skip them; invalid ones are not selected anymore
+                offset += sum(1 for r in results if isinstance(r, BaseException) and not is_permanent(r))
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {'refreshed': self.refreshed, 'failed': self.failed, 'in_flight': len(self._refreshing)}
+
+
+@cache
+def get_token_service() -> TokenService:
+    return TokenService(get_shiki_gateway(), get_dlr_client())
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+
+from datetime import datetime
+
+from clients.shiki import Priority, ShikiGateway
+from data.models import AnimeDurationModel, AnimeRateModel
+
+RATES_PAGE_SIZE = 5000  # max allowed by shikimori
+DURATIONS_BATCH = 50  # anime requested at a time, every batch is saved as soon as it arrives
+
+# bumped when saved rates of a user change, results computed from them (see `services.compare`) are recomputed then
+_snapshot_versions: dict[int, int] = {}
+
+
+def snapshot_version(shikimori_user_id: int) -> int:
+    return _snapshot_versions.get(shikimori_user_id, 0)
+
+
+def _rate_changed(snapshot: AnimeRateModel | None, rate: dict) -> bool:
+    return snapshot is None or (snapshot.status, snapshot.episodes, snapshot.rewatches, snapshot.score) != (
+        rate['status'], rate['episodes'], rate['rewatches'], rate['score']
+    )
+
+
+def _rate_minutes(rate: dict, duration: AnimeDurationModel) -> float:
+    return duration.duration * (rate['episodes'] + rate['rewatches'] * duration.episodes)
+
+
+async def fetch_anime_rates(
+        gateway: ShikiGateway,
+        shikimori_user_id: int,
+        priority: Priority = Priority.BACKGROUND
+) -> list[dict]:
+    rates, page = [], 1
+    while True:
+        rates_page = await gateway.get_anime_rates(
+            shikimori_user_id, page=page, limit=RATES_PAGE_SIZE, priority=priority
+        )
+        rates.extend(rates_page)
+        if len(rates_page) < RATES_PAGE_SIZE:
+            return rates
+        page += 1
+
+
+async def get_durations(gateway: ShikiGateway, anime_ids: set[int]) -> dict[int, AnimeDurationModel]:
+    """Durations from shared cache table, missing ones are requested from shikimori and saved.
+
+    Missing anime are requested in batches of `DURATIONS_BATCH`, each batch is saved before the next one is
+    requested, so work done before a failure or restart is kept. Anime which could not be requested are left out.
+    """
+    durations = {d.id: d for d in await AnimeDurationModel.filter(id__in=list(anime_ids))} if anime_ids else {}
+
+    missing = sorted(anime_ids - durations.keys())
+    for start in range(0, len(missing), DURATIONS_BATCH):
+        batch = missing[start:start + DURATIONS_BATCH]
+        animes = await asyncio.gather(
+            *(gateway.get_anime(i, priority=Priority.BACKGROUND) for i in batch), return_exceptions=True
+        )
+        new_durations = [
+            AnimeDurationModel(
+                id=anime['id'],
+                duration=anime.get('duration') or 0,
+                episodes=anime.get('episodes') or anime.get('episodes_aired') or 0,
+            )
+            for anime in animes if isinstance(anime, dict)
+        ]
+        if failed := len(batch) - len(new_durations):
+            print(f"Durations of {failed} anime could not be requested")  # TODO logging
+        if new_durations:
+            await AnimeDurationModel.bulk_create(
+                new_durations, on_conflict=['id'], update_fields=['duration', 'episodes']
+            )
+            durations.update({d.id: d for d in new_durations})
+
+    return durations
+
+
+async def update_watch_time(gateway: ShikiGateway, shikimori_user_id: int) -> float:
+    """Total watch time of the user in minutes.
+
+    Rates are compared with a snapshot saved during previous run, only new and changed rates are recalculated
+    (and only for them durations can be requested from shikimori), unchanged ones use saved values. Rates of anime
+    whose duration could not be requested are not saved, they are recalculated on next run.
+    """
+    rates = await fetch_anime_rates(gateway, shikimori_user_id)
+    snapshot = {r.id: r for r in await AnimeRateModel.filter(shikimori_user_id=shikimori_user_id)}
+
+    changed = [rate for rate in rates if _rate_changed(snapshot.get(rate['id']), rate)]
+    removed = snapshot.keys() - {rate['id'] for rate in rates}
+
+    durations = await get_durations(gateway, {rate['anime']['id'] for rate in changed})
+    changed = [rate for rate in changed if rate['anime']['id'] in durations]
+    updated = [
+        AnimeRateModel(
+            id=rate['id'],
+            shikimori_user_id=shikimori_user_id,
+            anime_id=rate['anime']['id'],
+            status=rate['status'],
+            score=rate['score'],
+            episodes=rate['episodes'],
+            rewatches=rate['rewatches'],
+            updated_at=datetime.fromisoformat(rate['updated_at']),
+            minutes=_rate_minutes(rate, durations[rate['anime']['id']]),
+        )
+        for rate in changed
+    ]
+
+    if updated:
+        await AnimeRateModel.bulk_create(
+            updated,
+            on_conflict=['id'],
+            update_fields=['status', 'score', 'episodes', 'rewatches', 'updated_at', 'minutes'],
+            batch_size=500,
+        )
+    if removed:
+        await AnimeRateModel.filter(id__in=list(removed)).delete()
+    if updated or removed:
+        _snapshot_versions[shikimori_user_id] = snapshot_version(shikimori_user_id) + 1
+
+    unchanged = snapshot.keys() - removed - {r.id for r in updated}
+    return sum(snapshot[i].minutes for i in unchanged) + sum(r.minutes for r in updated)
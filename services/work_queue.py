@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+
+from typing import Any, Awaitable, Callable, NamedTuple
+
+
+class Job(NamedTuple):
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    attempt: int = 0
+
+
+class WorkQueue:
+    """In-process queue of async jobs, processed by `workers` coroutines.
+
+    Failed jobs are put back after `retry_delay * 2 ** attempt` seconds, up to `max_retries` times. Jobs are lost
+    if the process dies, so only work which can be redone later (e.g. by background refresh) belongs here.
+    """
+
+    def __init__(self, workers: int = 4, max_retries: int = 3, retry_delay: float = 1.0):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._retries: set[asyncio.TimerHandle] = set()
+
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> None:
+        self._queue.put_nowait(Job(func, args, kwargs))
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Wait up to `timeout` seconds for queued jobs to finish, then stop workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Work queue stopped with {self.depth} unfinished jobs")  # TODO logging
+
+        for handle in self._retries:
+            handle.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await job.func(*job.args, **job.kwargs)
+                self.processed += 1
+            except Exception as e:
+                if job.attempt < self.max_retries:
+                    self.retried += 1
+                    self._retry_later(job._replace(attempt=job.attempt + 1))
+                else:
+                    self.failed += 1
+                    print(f"Job {job.func.__name__}{job.args} failed: {e}")  # TODO logging
+            finally:
+                self._queue.task_done()
+
+    def _retry_later(self, job: Job) -> None:
+        def put_back():
+            self._retries.discard(handle)
+            self._queue.put_nowait(job)
+
+        handle = asyncio.get_running_loop().call_later(self.retry_delay * 2 ** (job.attempt - 1), put_back)
+        self._retries.add(handle)
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting to be processed, including ones waiting for retry."""
+        return self._queue.qsize() + len(self._retries)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'depth': self.depth,
+            'workers': len(self._tasks),
+            'processed': self.processed,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
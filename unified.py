@@ -0,0 +1,40 @@
+"""Bot and linked roles server in one process, on one event loop.
+
+Both share database pool, Shikimori/Discord clients, job queues and caches (profiles, authorization statuses), so
+OAuth callbacks warm the caches the bot reads from. Run `main.py` and `dlr_server/main.py` for two processes instead.
+"""
+import asyncio
+import os
+
+from hypercorn.asyncio import serve
+from tortoise import Tortoise
+
+from main import create_bot  # loads environment
+from data.database import init_db
+from dlr_server import interactions
+from dlr_server.main import create_app, hypercorn_config, _exception_handler
+
+
+async def main():
+    asyncio.get_running_loop().set_exception_handler(_exception_handler)
+    await init_db()
+
+    my_bot = await create_bot()
+    interactions.attach(my_bot)  # if interactions endpoint is enabled
+
+    shutdown_event = asyncio.Event()
+    server = asyncio.create_task(  # one worker, hypercorn_config().workers only applies to `dlr_server.main.run`
+        serve(create_app(standalone=False), hypercorn_config(), shutdown_trigger=shutdown_event.wait)  # noqa
+    )
+
+    try:
+        await my_bot.start(os.environ['BOT_TOKEN'])
+    finally:
+        shutdown_event.set()
+        await server
+        await my_bot.close()
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())